@@ -1,109 +1,93 @@
+import argparse
+import sys
 import pandas as pd
-import glob
-from functions import get_device_location, get_hour_averages, puget_air_reformat, reformat, concat_df, \
-    get_10min_averages, get_averages
+from calibration import CALIBRATED_SUFFIX, apply_calibration, load_coefficients, mark_applied, recalibrate_results
+from assembly import assemble_frames
+from incremental import pacific_dates, run_incremental, save_watermarks
+from pipeline import RESULT_FILES, device_file, run_pipeline
+from preprocessing import puget_air_reformat, concat_df
+from registry import USERS_FILE, processed_devices
+from rollup import TOTALS_DATASET
+from storage import RESULTS_DIR, delete_results, load_results, result_columns, write_results
+from timestamps import to_wall_time
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preprocess raw sensor logs into averaged result files")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (default: all cores, 1: run serially)")
+    parser.add_argument("--csv", action="store_true", help="also write the averages as CSV files")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only process rows appended to the device logs since the previous incremental run")
+    parser.add_argument("--chunk-mb", type=int, default=None,
+                        help="stream each log in chunks of this many MB to bound memory (default: read logs whole)")
+    parser.add_argument("--recalibrate", action="store_true",
+                        help="only rewrite the calibrated columns of results written with older coefficients")
+    args = parser.parse_args()
+    if args.recalibrate:
+        print("Recalibrated: " + str(recalibrate_results(list(RESULT_FILES))))
+        sys.exit(0)
     # files = glob.glob("D:/UW/AeroSpec - Sensor Network/2020 Wildfire Data/Wildfire 2020/*")
     # print(files)
-    devices = []
-    df_users = pd.read_excel(
-        "D:/UW/AeroSpec - Sensor Network/2020 Wildfire/Data/Device Locations and Users Split.xlsx", engine='openpyxl')
-    for device in df_users["In"].dropna():
-        if device == "Beta-04":
-            continue
-        if device == "Beta-13":
-            devices.append(device + "(MEB IN)")
-        else:
-            devices.append(device)
-    for device in df_users["Out"].dropna():
-        if device in devices or device == "Beta-15":
-            continue
-        if device == "Beta-08":
-            devices.append(device + "(MEB)")
-        else:
-            devices.append(device)
-    devices.append("Breakout-02")
-    print(devices)
-    remains = ["Breakout-01", "Breakout-09", "Breakout-10", "Breakout-11"]
-    for remain in remains:
-        devices.append(remain)
-    for puget in ["Puget-Bellevue", "Puget-LakeForestPark", "Puget-Seattle 10th and Weller"]:
-        devices.append(puget)
+    df_users = pd.read_excel(USERS_FILE, engine='openpyxl')
+    # Devices (and their raw file names) come from the users sheet plus devices.json
+    devices = processed_devices(df_users)
 
-    finals_hour = []
-    finals_10min = []
-    finals_10sec = []
-    breakouts = []
     pugets = []
-    dfs = []
-    fileloc = "D://UW//AeroSpec - Sensor Network//2020 Wildfire//Wildfire 2020 Raw Data//" + devices[0] + ".txt"
     print(devices)
     ### Reformat all data files ###
-    for device in devices:
-        if "Puget" in device:
-            fileloc = "D://UW//AeroSpec - Sensor Network//2020 Wildfire//Wildfire 2020 Raw Data//" + device + ".csv"
-        else:
-            fileloc = "D://UW//AeroSpec - Sensor Network//2020 Wildfire//Wildfire 2020 Raw Data//" + device + ".txt"
+    filelocs = [device_file(device) for device in devices if "Puget" not in device]
+    puget_filelocs = [device_file(device) for device in devices if "Puget" in device]
+    if args.incremental:
+        # Only rows appended since the previous run are read; the touched device-day partitions are rewritten
+        run_incremental(filelocs, freqs=list(RESULT_FILES))
+        sys.exit(0)
+    # Every frequency is computed from a single read of each raw file; the bucket totals and watermarks are kept so
+    # a later --incremental run continues from this one
+    calibration = load_coefficients()
+    chunk_bytes = None if args.chunk_mb is None else args.chunk_mb * 2 ** 20
+    if chunk_bytes is not None:
+        # Streamed logs are written to the result store day by day instead of being collected here, so memory
+        # stays bounded by the chunk size
+        for name in list(RESULT_FILES) + [TOTALS_DATASET]:
+            delete_results(name)
+    watermarks = {}
+    finals = run_pipeline(filelocs, freqs=list(RESULT_FILES), workers=args.workers, chunk_bytes=chunk_bytes,
+                          watermarks=watermarks, results_dir=RESULTS_DIR, calibration=calibration)
+    if chunk_bytes is None:
+        df_columns = finals["10Min"][0].columns
+    else:
+        df_columns = [column for column in result_columns("10Min") if not column.endswith(CALIBRATED_SUFFIX)]
+    for fileloc in puget_filelocs:
         print(fileloc)
-        if 'Wildfire Dataset' in fileloc:
-            continue
-        if 'Beta' in fileloc:
-            df = pd.read_csv(fileloc, dtype='a', sep=',', names=['Date', 'Time',
-                                                                 'Battery', 'Fix', 'Latitude', 'Longitude', 'Dp>0.3',
-                                                                 'Dp>0.5', 'Dp>1.0', 'Dp>2.5', 'Dp>5.0', 'Dp>10.0',
-                                                                 'PM1_Std', 'PM2.5_Std', 'PM10_Std',
-                                                                 'PM1_Env', 'PM2.5_Env', 'PM10_Env', 'Temp(C)', 'RH(%)',
-                                                                 'P(hPa)', 'Alti(m)'])
-            df.drop(['Temp(C)', 'RH(%)', 'P(hPa)', 'Alti(m)'], axis=1, inplace=True)
-        elif 'Breakout' in fileloc:
-            df = pd.read_csv(fileloc, dtype='a', sep=',', names=['Date', 'Time',
-                                                                 'Battery', 'Fix', 'Latitude', 'Longitude', 'Dp>0.3',
-                                                                 'Dp>0.5', 'Dp>1.0', 'Dp>2.5', 'Dp>5.0', 'Dp>10.0',
-                                                                 'PM1_Std', 'PM2.5_Std', 'PM10_Std',
-                                                                 'PM1_Env', 'PM2.5_Env', 'PM10_Env'])
-        elif 'Puget' in fileloc:
-            # df_columns = finals_hour[0].columns
-            df_columns = finals_10min[0].columns
-            # df_columns = finals_hour[0].columns
-            df = pd.read_csv(fileloc, skiprows=9, names=['PT DateTime', 'PM2.5_Std'])
-            df_final = puget_air_reformat(df, fileloc, df_columns)
-            pugets.append(df_final)
-            continue
-        df.drop([1], inplace=True)
-        for column in df.columns:
-            df[column] = df[column].str.strip()
-        device_name, df = get_device_location(df)
-        df = reformat(df, device_name)
-        # df_final_hour = get_averages(df, "hour")
-        df_final_10min = get_averages(df, "10Min")
-        # df_final_10sec = get_averages(df, "10S")
-        # finals_hour.append(df_final_hour)
-        finals_10min.append(df_final_10min)
-        # finals_10sec.append(df_final_10sec)
-        # if 'Beta' in fileloc:
-        #     betas.append(df_final)
-        # elif 'Breakout' in fileloc:
-        #     breakouts.append(df_final)
+        df = pd.read_csv(fileloc, skiprows=9, names=['PT DateTime', 'PM2.5_Std'])
+        df_final = puget_air_reformat(df, fileloc, df_columns)
+        pugets.append(df_final)
     ################################
 
-    ### Concatenate all dataframes to a single df, then save to one csv file ##
-    # df_hour = concat_df(finals_hour)
-    df_10min = concat_df(finals_10min)
-    # df_10sec = concat_df(finals_10sec)
-    # df_betas = concat_df(betas)
-    # df_breakouts = concat_df(breakouts)
-
-    # df_final = pd.concat([df_betas, df_breakouts])
-
-    for i in range(len(pugets)):
-        # df_hour = pd.concat([df_hour, pugets[i]])
-        df_10min = pd.concat([df_10min, pugets[i]])
-        # df_10sec = pd.concat([df_10sec, pugets[i]])
-    #
-    # df_hour.to_csv("Results/1_HourAverage2.csv", index=False)
-    df_10min.to_csv("Results/2_10MinAverage.csv", index=False)
-    # df_10sec.to_csv("Results/3_10SecAverage.csv", index=False)
+    ### Concatenate all dataframes to a single df, then save to one csv file per frequency ##
+    # Puget frames are aligned to the device frames' columns (missing particle columns read 0, as in
+    # puget_air_reformat) and appended in the same single concatenation
+    # Calibrated columns (e.g. PM2.5_Env_Cal) are written once from the active version of calibrations.json
+    for freq, result_file in RESULT_FILES.items():
+        if chunk_bytes is None:
+            df_final = apply_calibration(assemble_frames(finals[freq] + pugets, fill_value=0), calibration)
+            # Parquet datasets (partitioned by device and day) are what the notebooks load with load_results
+            write_results(df_final, freq)
+        else:
+            # The device days are stored already: only the Puget partitions are added
+            if pugets:
+                df_pugets = apply_calibration(assemble_frames(pugets, fill_value=0), calibration)
+                write_results(df_pugets, freq, partitions=set(zip(df_pugets['Device Name'],
+                                                                  pacific_dates(df_pugets['PT DateTime']))))
+            df_final = load_results(freq) if args.csv else None
+        if args.csv:
+            # CSV files keep the Pacific wall-clock time
+            df_final["PT DateTime"] = to_wall_time(df_final["PT DateTime"])
+            df_final.to_csv(result_file, index=False)
+    if chunk_bytes is None:
+        write_results(assemble_frames(finals[TOTALS_DATASET]), TOTALS_DATASET)
+    save_watermarks(watermarks)
+    mark_applied(list(RESULT_FILES), calibration)
 
     # df_betas.to_csv('Results/Betas10.csv', index=False)
     # df_breakouts.to_csv('Results/Breakouts10.csv', index=False)
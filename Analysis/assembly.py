@@ -0,0 +1,65 @@
+"""
+This .py file contains the helpers that assemble per-device/per-ratio DataFrames into a single table.
+"""
+import numpy as np
+import pandas as pd
+
+
+def target_columns(dfs: list):
+    """
+    Find the column layout of the assembled table: the first frame's columns followed by any columns that
+    only appear in later frames
+    :param dfs: list of DataFrames
+    :return columns: list
+    """
+    columns = list(dfs[0].columns)
+    seen = set(columns)
+    for df in dfs[1:]:
+        for column in df.columns:
+            if column not in seen:
+                columns.append(column)
+                seen.add(column)
+    return columns
+
+
+def assemble_frames(dfs: list, columns=None, fill_value=np.nan, ignore_index=False):
+    """
+    Concatenate a list of DataFrames with one allocation. Frames missing some of the target columns are padded
+    with fill_value before the single concatenation (NaN like pd.concat; 0 only where a caller wants the Puget
+    padding); column order follows the first frame.
+    :param dfs: list of DataFrames
+    :param columns: list (target column layout; defaults to target_columns(dfs))
+    :param fill_value: value of padded columns (NaN by default)
+    :param ignore_index: bool (renumber rows 0..n-1 instead of keeping the frames' indices)
+    :return df: DataFrame (assembled table)
+    """
+    dfs = [df for df in dfs if df is not None]
+    if len(dfs) == 0:
+        return pd.DataFrame(columns=columns)
+    if columns is None:
+        columns = target_columns(dfs)
+    aligned = []
+    for df in dfs:
+        missing = [column for column in columns if column not in df.columns]
+        if missing:
+            df = df.assign(**{column: fill_value for column in missing})
+        if list(df.columns) != columns:
+            df = df[columns]
+        aligned.append(df)
+    return pd.concat(aligned, ignore_index=ignore_index, sort=False)
+
+
+def copy_volume(sizes: list):
+    """
+    Bytes copied when assembling frames of the given sizes, by repeated concatenation onto an accumulator
+    (the former concat_df) and by a single concatenation
+    :param sizes: list of frame sizes in bytes
+    :return repeated: int
+    :return single: int
+    """
+    repeated = 0
+    accumulated = 0
+    for size in sizes:
+        accumulated += size
+        repeated += accumulated
+    return repeated, accumulated
@@ -0,0 +1,57 @@
+"""
+Benchmark of the peak memory of one long device log: read whole, streamed in chunks with the averages collected in
+memory, and streamed in chunks with every closed day written to the result store (Analysis.py --chunk-mb).
+Peak memory is measured with tracemalloc (numpy and pandas buffers; pyarrow's own pool is not traced).
+Run from the Analysis folder: python benchmarks/bench_chunked.py [--days 10] [--period 2] [--chunk-mb 8]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from pipeline import process_device
+from rollup import ROLLUP_FREQUENCIES
+from synthetic import START, outdoor_profile, write_device_log
+
+
+def measure(function):
+    """
+    Run a step once and record its time and traced peak memory
+    :param function: callable
+    :return seconds: float
+    :return peak: float (MB)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return seconds, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peak memory of whole-file and chunked reads of one long log")
+    parser.add_argument("--days", type=float, default=10.0)
+    parser.add_argument("--period", type=int, default=2, help="seconds between records")
+    parser.add_argument("--chunk-mb", type=int, default=8)
+    args = parser.parse_args()
+    chunk_bytes = args.chunk_mb * 2 ** 20
+    with tempfile.TemporaryDirectory() as folder:
+        fileloc = os.path.join(folder, "Beta-01.txt")
+        rows = write_device_log(fileloc, "Beta-01", outdoor_profile(START, args.days, np.random.default_rng(0)),
+                                "In", days=args.days, period=args.period)
+        print("Beta-01: %d rows, %.0f MB" % (rows, os.path.getsize(fileloc) / 2 ** 20))
+        steps = [("whole file", lambda: process_device(fileloc, ROLLUP_FREQUENCIES)),
+                 ("chunks, averages in memory", lambda: process_device(fileloc, ROLLUP_FREQUENCIES, chunk_bytes)),
+                 ("chunks, days written to the store",
+                  lambda: process_device(fileloc, ROLLUP_FREQUENCIES, chunk_bytes, results_dir=os.path.join(
+                      folder, "Results")))]
+        for name, step in steps:
+            seconds, peak = measure(step)
+            print("%s: %.2f s, peak %.0f MB" % (name, seconds, peak))
@@ -0,0 +1,59 @@
+"""
+Benchmark of assembling per-device frames: repeated concatenation onto an accumulator (the former concat_df)
+against the single concatenation of assembly.assemble_frames.
+Run from the Analysis folder: python benchmarks/bench_concat.py
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from assembly import assemble_frames, copy_volume
+
+
+def make_frames(n_devices: int, n_rows: int):
+    """
+    Build per-device frames shaped like the 10-minute averages
+    :param n_devices: int
+    :param n_rows: int (rows per device)
+    :return dfs: list of DataFrames
+    """
+    dfs = []
+    times = pd.date_range("2020-09-01", periods=n_rows, freq="10min")
+    for i in range(n_devices):
+        df = pd.DataFrame(np.random.rand(n_rows, 12).astype(np.float32),
+                          columns=['Dp>0.3', 'Dp>0.5', 'Dp>1.0', 'Dp>2.5', 'Dp>5.0', 'Dp>10.0', 'PM1_Std',
+                                   'PM2.5_Std', 'PM10_Std', 'PM1_Env', 'PM2.5_Env', 'PM10_Env'])
+        df.insert(0, 'Device Name', "Beta-%02d" % i)
+        df.insert(1, 'PT DateTime', times)
+        dfs.append(df)
+    return dfs
+
+
+def repeated_concat(dfs: list):
+    """
+    The former concat_df: grow an accumulator one frame at a time
+    :param dfs: list of DataFrames
+    :return df: DataFrame
+    """
+    df_final = pd.DataFrame(columns=dfs[0].columns)
+    for df in dfs:
+        df_final = pd.concat([df_final, df])
+    return df_final
+
+
+if __name__ == "__main__":
+    for n_devices, n_rows in [(20, 4320), (20, 77760), (60, 77760)]:
+        dfs = make_frames(n_devices, n_rows)
+        sizes = [int(df.memory_usage(deep=False).sum()) for df in dfs]
+        repeated_bytes, single_bytes = copy_volume(sizes)
+        start = time.perf_counter()
+        repeated_concat(dfs)
+        repeated_time = time.perf_counter() - start
+        start = time.perf_counter()
+        assemble_frames(dfs)
+        single_time = time.perf_counter() - start
+        print("%d devices x %d rows: copied %.1f MB -> %.1f MB, %.3f s -> %.3f s"
+              % (n_devices, n_rows, repeated_bytes / 1e6, single_bytes / 1e6, repeated_time, single_time))
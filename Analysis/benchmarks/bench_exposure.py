@@ -0,0 +1,62 @@
+"""
+Benchmark of the personal exposure series: the former per-function regrouping of Breakout-02 (moving_vs_static,
+moving_vs_static2, personal_1min_average and correlation each grouping the table again) against
+exposure.personal_frame, and the time to build and reuse the exposure intervals.
+Run from the Analysis folder: python benchmarks/bench_exposure.py
+"""
+import os
+import sys
+import tempfile
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from exposure import STATIC_DEVICES, exposure_intervals, exposure_summary, personal_frame
+from geofence import box_place
+from pipeline import run_pipeline
+from query import table_query
+from synthetic import HOME, MOVING_DEVICE, generate_dataset
+
+CALLS = 4
+
+
+def regrouped(df):
+    """
+    The former block copied into every personal exposure function
+    """
+    df_test = table_query(df).frame("Breakout-02")
+    cols_average = df_test.columns.drop(['Device Name', 'PT DateTime',
+                                         'Latitude', 'Longitude', 'In or Out'])
+    df_test = df_test.groupby(['Device Name', 'PT DateTime'],
+                              as_index=False)[cols_average].mean().sort_values(['PT DateTime'])
+    df_test["PT DateTime"] = pd.to_datetime(df_test["PT DateTime"])
+    return df_test
+
+
+if __name__ == "__main__":
+    places = [box_place("Home", HOME[0] - 0.005, HOME[1] - 0.005, HOME[0] + 0.005, HOME[1] + 0.005)]
+    with tempfile.TemporaryDirectory() as folder:
+        _, filelocs, _ = generate_dataset(folder, n_devices=16, days=10.0)
+        filelocs = [fileloc for fileloc in filelocs
+                    if any(device in fileloc for device in [MOVING_DEVICE] + STATIC_DEVICES)]
+        finals = run_pipeline(filelocs, ("10S", "1Min"), workers=1)
+    for freq in ["1Min", "10S"]:
+        df = pd.concat(finals[freq], ignore_index=True)
+        start = time.perf_counter()
+        for _ in range(CALLS):
+            regrouped(df)
+        regroup_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(CALLS):
+            personal_frame(df)
+        cached_time = time.perf_counter() - start
+        start = time.perf_counter()
+        intervals = exposure_intervals(df, places)
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        exposure_summary(exposure_intervals(df, places))
+        reuse_time = time.perf_counter() - start
+        print("%s (%d rows): %d regroupings %.3f s, personal_frame %.3f s; exposure intervals %.3f s "
+              "(%d intervals), cached + summary %.3f s" % (freq, len(df), CALLS, regroup_time, cached_time,
+                                                           build_time, len(intervals), reuse_time))
@@ -0,0 +1,44 @@
+"""
+Benchmark of assigning personal-sensor samples to places: the notebook's geoloc_analysis (a Python tuple column
+compared lexicographically against the LongLat.csv boxes) against geofence.PlaceIndex.
+Run from the Analysis folder: python benchmarks/bench_geofence.py
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from geofence import PlaceIndex, box_place
+
+BOXES = [("Igor home", 47.6610, -122.3330, 47.6620, -122.3316), ("Nano", 47.6528, -122.3058, 47.6540, -122.3040)]
+
+
+def tuple_boxes(df):
+    """
+    The former geoloc_analysis: (latitude, longitude) tuples compared with the box corners. Tuples compare the
+    latitude first, so the longitude only matters on exact latitude ties.
+    :return: list of DataFrames (one per box, then the samples outside every box)
+    """
+    lat_long = pd.Series(list(zip(df["Latitude"], df["Longitude"])), index=df.index)
+    masks = [(lat_long >= (lat_start, long_start)) & (lat_long <= (lat_end, long_end))
+             for _, lat_start, long_start, lat_end, long_end in BOXES]
+    return [df[mask] for mask in masks] + [df[~np.logical_or.reduce(masks)]]
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    index = PlaceIndex([box_place(*box) for box in BOXES])
+    for n_rows in [100000, 1000000]:
+        df = pd.DataFrame({'Latitude': rng.uniform(47.64, 47.67, n_rows),
+                           'Longitude': rng.uniform(-122.34, -122.30, n_rows)})
+        start = time.perf_counter()
+        groups = tuple_boxes(df)
+        tuple_time = time.perf_counter() - start
+        start = time.perf_counter()
+        codes = index.locate(df['Latitude'], df['Longitude'])
+        index_time = time.perf_counter() - start
+        print("%d samples: tuple compare %.3f s (%d in boxes), place index %.3f s (%d in boxes)"
+              % (n_rows, tuple_time, sum(len(group) for group in groups[:-1]), index_time,
+                 int((codes < len(BOXES)).sum())))
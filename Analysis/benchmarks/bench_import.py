@@ -0,0 +1,49 @@
+"""
+Benchmark of module start-up: each module is imported in a fresh interpreter, and the import time and the heavy
+packages it pulled in are reported. Exits with an error when functions, pipeline or incremental load the plotting
+or geo stacks at import time.
+Run from the Analysis folder: python benchmarks/bench_import.py
+"""
+import os
+import subprocess
+import sys
+
+ANALYSIS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MODULES = ["preprocessing", "ratios", "functions", "pipeline", "incremental", "plotting"]
+LIGHT_MODULES = ["functions", "pipeline", "incremental"]
+HEAVY_PACKAGES = ["matplotlib", "plotly", "geopandas", "geoplot", "contextily", "shapely"]
+REPEATS = 5
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import %s
+elapsed = time.perf_counter() - start
+print(elapsed, ",".join(name for name in %r if name in sys.modules))
+"""
+
+
+def import_time(module: str):
+    """
+    Import a module in a fresh interpreter
+    :param module: str
+    :return elapsed: float (seconds)
+    :return loaded: list of heavy packages loaded by the import
+    """
+    output = subprocess.run([sys.executable, "-c", PROBE % (module, HEAVY_PACKAGES)], cwd=ANALYSIS_DIR,
+                            capture_output=True, text=True, check=True).stdout.split()
+    return float(output[0]), output[1].split(",") if len(output) > 1 else []
+
+
+if __name__ == "__main__":
+    failed = []
+    for module in MODULES:
+        runs = [import_time(module) for _ in range(REPEATS)]
+        loaded = runs[0][1]
+        print("%-14s best %.3f s, median %.3f s, loads: %s"
+              % (module, min(run[0] for run in runs), sorted(run[0] for run in runs)[REPEATS // 2],
+                 ", ".join(loaded) or "-"))
+        if module in LIGHT_MODULES and loaded:
+            failed.append(module)
+    if failed:
+        sys.exit("Heavy packages imported at start-up by: " + ", ".join(failed))
@@ -0,0 +1,94 @@
+"""
+Benchmark of the writer thread of the live-ingest server at thousands of devices logging every 10 seconds: every
+flush parses the waiting records of all devices, merges them into the running totals and appends the touched
+buckets to the result store (IngestServer.store), against the former per-device store_frame, which read the stored
+totals of each device back and rewrote its day partitions at every frequency.
+Run from the Analysis folder: python benchmarks/bench_live.py [--devices 2000] [--flushes 10] [--flush-seconds 60]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from calibration import load_coefficients
+from incremental import store_frame
+from ingest import get_layout, parse_log_bytes
+from live import IngestServer
+from preprocessing import get_device_location, reformat
+from rollup import ROLLUP_FREQUENCIES
+from synthetic import START, epoch_seconds, log_frame, outdoor_profile, synthetic_devices
+
+
+def device_lines(device_name: str, n_records: int, period: int, outdoor, rng):
+    """
+    Records of one device as sent to the server
+    :param device_name: str
+    :param n_records: int
+    :param period: int (seconds between records)
+    :param outdoor: tuple (seconds, values) from outdoor_profile
+    :param rng: numpy Generator
+    :return: list of bytes (one line per record)
+    """
+    first = epoch_seconds(pd.DatetimeIndex([pd.Timestamp(START, tz='UTC')]))[0] + int(rng.integers(period))
+    times = first + period * np.arange(n_records)
+    df = log_frame(device_name, times, outdoor, "In", False, rng)
+    return df.to_csv(header=False, index=False, float_format='%.2f', lineterminator='\n').encode().splitlines(True)
+
+
+def store_per_device(batch: dict, results_dir: str):
+    """
+    The former writer: one store_frame call per device of the batch
+    :param batch: dict of device name -> list of lines
+    :param results_dir: str
+    :return: None
+    """
+    calibration = load_coefficients()
+    for device_name, lines in batch.items():
+        df = parse_log_bytes(b''.join(lines), get_layout(device_name))
+        device_name, df = get_device_location(df, device_name)
+        df = reformat(df, device_name)
+        if not df.empty:
+            store_frame(device_name, df, ROLLUP_FREQUENCIES, results_dir, calibration)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the live-ingest writer at many devices")
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--flushes", type=int, default=10)
+    parser.add_argument("--flush-seconds", type=int, default=60)
+    parser.add_argument("--period", type=int, default=10, help="seconds between records")
+    parser.add_argument("--former-flushes", type=int, default=2, help="flushes timed with the per-device writer")
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    outdoor = outdoor_profile(START, 1.0, rng)
+    per_flush = args.flush_seconds // args.period
+    devices = synthetic_devices(args.devices)
+    lines = {device: device_lines(device, per_flush * args.flushes, args.period, outdoor, rng) for device in devices}
+    batches = [{device: records[k * per_flush:(k + 1) * per_flush] for device, records in lines.items()}
+               for k in range(args.flushes)]
+    print("%d devices, %d records per flush" % (len(devices), len(devices) * per_flush))
+    with tempfile.TemporaryDirectory() as folder:
+        server = IngestServer(results_dir=os.path.join(folder, "Results"))
+        seconds = []
+        for batch in batches:
+            start = time.perf_counter()
+            server.store(batch)
+            seconds.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        server.totals.compact()
+        compact = time.perf_counter() - start
+        print("running totals: %.2f s per flush (max %.2f s, %.0f%% of one core), compaction of %d flushes %.2f s"
+              % (np.mean(seconds), np.max(seconds), 100 * np.mean(seconds) / args.flush_seconds, args.flushes,
+                 compact))
+        seconds = []
+        for batch in batches[:args.former_flushes]:
+            start = time.perf_counter()
+            store_per_device(batch, os.path.join(folder, "Former"))
+            seconds.append(time.perf_counter() - start)
+        print("per-device store_frame: %.2f s per flush (%.0f%% of one core)"
+              % (np.mean(seconds), 100 * np.mean(seconds) / args.flush_seconds))
@@ -0,0 +1,58 @@
+"""
+Benchmark of per-device time-window lookups: the boolean scans used by the plotting functions against
+query.TableQuery slices.
+Run from the Analysis folder: python benchmarks/bench_query.py
+"""
+import os
+import sys
+import time
+import warnings
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from query import TableQuery
+
+
+def make_table(n_devices: int, n_rows: int):
+    """
+    Build a consolidated table shaped like the 10-minute averages, rows in device order
+    :param n_devices: int
+    :param n_rows: int (rows per device)
+    :return df: DataFrame
+    """
+    times = pd.date_range("2020-09-01", periods=n_rows, freq="10min", tz="America/Los_Angeles")
+    return pd.DataFrame({'Device Name': np.repeat(["Beta-%02d" % i for i in range(n_devices)], n_rows),
+                         'PT DateTime': np.tile(times, n_devices),
+                         'PM2.5_Std': np.random.rand(n_devices * n_rows).astype(np.float32)})
+
+
+def scan(df, device: str, start: str, end: str):
+    """
+    The former lookup: one boolean mask for the device and one for the window, each a full scan
+    :return: tuple of Series (x and y of one plot line)
+    """
+    x = df[df['Device Name'] == device][(df["PT DateTime"] >= start) & (df["PT DateTime"] <= end)]['PT DateTime']
+    y = df[df['Device Name'] == device][(df["PT DateTime"] >= start) & (df["PT DateTime"] <= end)]['PM2.5_Std']
+    return x, y
+
+
+if __name__ == "__main__":
+    # The chained boolean indexing of the former lookup warns about reindexing on every call
+    warnings.simplefilter("ignore", UserWarning)
+    for n_devices, n_rows in [(20, 4320), (60, 77760)]:
+        df = make_table(n_devices, n_rows)
+        devices = pd.unique(df['Device Name'])
+        start = time.perf_counter()
+        for device in devices:
+            scan(df, device, "9/10/2020 0:00", "9/19/2020 0:00")
+        scan_time = time.perf_counter() - start
+        start = time.perf_counter()
+        query = TableQuery(df)
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for device in devices:
+            query.series(device, 'PM2.5_Std', "9/10/2020 0:00", "9/19/2020 0:00")
+        query_time = time.perf_counter() - start
+        print("%d devices x %d rows: scans %.3f s, query build %.3f s + lookups %.4f s"
+              % (n_devices, n_rows, scan_time, build_time, query_time))
@@ -0,0 +1,60 @@
+"""
+Benchmark of gap-exposing reindexing: the former per-plot set_index("PT DateTime").asfreq(freq) of every device
+against resample.RegularGrid (every device placed on the shared grid once, then served as aligned arrays).
+Run from the Analysis folder: python benchmarks/bench_resample.py
+"""
+import os
+import sys
+import tempfile
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from pipeline import run_pipeline
+from query import table_query
+from resample import regular_grid
+from synthetic import generate_dataset
+
+PLOTS = 4
+START = "9/10/2020 0:00"
+END = "9/19/2020 0:00"
+
+
+def asfreq_series(query, freq):
+    """
+    The former reindexing, once per device per plot
+    """
+    for device in query.devices:
+        frame = query.frame(device, START, END)
+        if not frame['PT DateTime'].is_unique:
+            frame = frame.groupby('PT DateTime', as_index=False)['PM2.5_Env'].mean()
+        frame.set_index("PT DateTime").asfreq(freq)['PM2.5_Env']
+
+
+def grid_series(query, freq):
+    """
+    The same series served by the shared grid
+    """
+    for device in query.devices:
+        regular_grid(query, freq).series(device, 'PM2.5_Env', START, END)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as folder:
+        _, filelocs, _ = generate_dataset(folder, n_devices=16, days=10.0)
+        finals = run_pipeline(filelocs, ("hour", "10Min", "1Min"), workers=1)
+    for freq, step in [("hour", "1h"), ("10Min", "10min"), ("1Min", "1min")]:
+        query = table_query(pd.concat(finals[freq], ignore_index=True))
+        start = time.perf_counter()
+        for _ in range(PLOTS):
+            asfreq_series(query, step)
+        asfreq_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(PLOTS):
+            grid_series(query, freq)
+        grid_time = time.perf_counter() - start
+        coverage = regular_grid(query, freq).coverage()
+        print("%s (%d rows, %d devices): %d plots with asfreq %.3f s, regular grid %.3f s; mean coverage %.1f%%, "
+              "%d gaps" % (freq, len(query.df), len(query.devices), PLOTS, asfreq_time, grid_time,
+                           100 * coverage['Coverage'].mean(), coverage['Gaps'].sum()))
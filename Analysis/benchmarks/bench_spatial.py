@@ -0,0 +1,67 @@
+"""
+Benchmark of map frames: the former voronoi_scipy (a SciPy Voronoi diagram and one plt.fill per cell, every
+timestep) against spatial.SpatialEngine (weights built once, one matrix product per timestep).
+Run from the Analysis folder: python benchmarks/bench_spatial.py
+"""
+import os
+import sys
+import time
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from scipy.spatial import Voronoi
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from spatial import SpatialEngine
+
+
+def voronoi_fill(longitudes, latitudes, values):
+    """
+    The former voronoi_scipy: a new diagram and one fill call per closed cell
+    """
+    fig = plt.figure()
+    ax = fig.add_subplot(111)
+    vor = Voronoi(np.column_stack((longitudes, latitudes)))
+    mapper = plt.cm.ScalarMappable(norm=plt.Normalize(values.min(), values.max()), cmap=plt.cm.Blues_r)
+    for r in range(len(vor.point_region)):
+        region = vor.regions[vor.point_region[r]]
+        if -1 not in region:
+            ax.fill(*zip(*[vor.vertices[i] for i in region]), color=mapper.to_rgba(values[r]), alpha=.7)
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def engine_frames(engine, readings, image):
+    """
+    Render every timestep into one reused AxesImage
+    """
+    for row in readings:
+        image.set_data(engine.render(row))
+        image.figure.canvas.draw()
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    for n_sensors, n_frames in [(10, 144), (25, 144)]:
+        longitudes = -122.33 + rng.uniform(-0.1, 0.1, n_sensors)
+        latitudes = 47.65 + rng.uniform(-0.08, 0.08, n_sensors)
+        readings = rng.uniform(0, 150, (n_frames, n_sensors))
+        readings[rng.random(readings.shape) < 0.02] = np.nan
+        start = time.perf_counter()
+        for row in readings:
+            voronoi_fill(longitudes, latitudes, np.nan_to_num(row))
+        fill_time = time.perf_counter() - start
+        line = "%d sensors x %d frames: voronoi + fill %.2f s" % (n_sensors, n_frames, fill_time)
+        for method in ["voronoi", "idw", "kriging"]:
+            start = time.perf_counter()
+            engine = SpatialEngine(longitudes, latitudes, method)
+            fig = plt.figure()
+            image = fig.add_subplot(111).imshow(engine.render(readings[0]), origin='lower')
+            engine_frames(engine, readings, image)
+            plt.close(fig)
+            render_only = time.perf_counter()
+            engine.render(readings)
+            line += ", %s %.2f s (batch render %.3f s)" % (method, render_only - start,
+                                                           time.perf_counter() - render_only)
+        print(line)
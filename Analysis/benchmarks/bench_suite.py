@@ -0,0 +1,138 @@
+"""
+Benchmark suite over a synthetic raw data folder (see benchmarks/synthetic.py): ingest, the averages at every
+frequency, the ratio tables, average() and the data preparation of the plots. Every step reports the best of
+--repeat runs; steps over result tables run on a fresh copy each time, so no cached query is reused.
+Run from the Analysis folder: python benchmarks/bench_suite.py [--devices 15] [--days 10] [--period 10] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from assembly import assemble_frames
+from downsample import plot_series
+from ingest import read_device_log
+from pipeline import run_pipeline
+from preprocessing import get_averages, get_device_location, puget_air_reformat, reformat
+from ratios import average, gov_ratio_table, io_ratio_table
+from registry import public_devices
+from rollup import ROLLUP_FREQUENCIES, rollup
+from synthetic import START, generate_dataset
+
+PARTICLE_SIZE = 'PM2.5_Env'
+PLOT_WIDTH = 1920
+
+
+def best_time(function, repeat: int, setup=None):
+    """
+    Run a step repeat times and keep the fastest run
+    :param function: callable (takes the value returned by setup, if any)
+    :param repeat: int
+    :param setup: callable run before every timed call (not timed)
+    :return: float (seconds)
+    """
+    times = []
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        start = time.perf_counter()
+        function(argument) if setup is not None else function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def read_all(filelocs: list, engine: str):
+    """
+    Read every raw log
+    :return: list of (device_name, DataFrame)
+    """
+    return [read_device_log(fileloc, engine) for fileloc in filelocs]
+
+
+def reformat_all(logs: list):
+    """
+    Locate and reformat every log read by read_all
+    :return: list of DataFrames
+    """
+    frames = []
+    for device_name, df in logs:
+        device_name, df = get_device_location(df.copy(), device_name)
+        frames.append(reformat(df, device_name))
+    return frames
+
+
+def result_table(finals: list, puget_filelocs: list):
+    """
+    Assemble one result table the way Analysis.py does: device averages followed by the public sensors
+    :param finals: list of DataFrames (averages of every device at one frequency)
+    :param puget_filelocs: list of str
+    :return: DataFrame
+    """
+    pugets = [puget_air_reformat(pd.read_csv(fileloc, skiprows=9, names=['PT DateTime', 'PM2.5_Std']), fileloc,
+                                 finals[0].columns) for fileloc in puget_filelocs]
+    return assemble_frames(finals + pugets)
+
+
+def run_suite(df_users, filelocs: list, puget_filelocs: list, start: str, end: str, repeat=3):
+    """
+    Time every step over one synthetic data folder
+    :return: dict of step -> seconds
+    """
+    results = {}
+    for engine in ['pyarrow', 'c']:
+        results["ingest (%s)" % engine] = best_time(lambda: read_all(filelocs, engine), repeat)
+    logs = read_all(filelocs, None)
+    results["locate + reformat"] = best_time(lambda: reformat_all(logs), repeat)
+    frames = reformat_all(logs)
+    for freq in ROLLUP_FREQUENCIES:
+        results["get_averages %s" % freq] = best_time(lambda: [get_averages(df.copy(), freq) for df in frames],
+                                                      repeat)
+    results["rollup (all frequencies)"] = best_time(lambda: [rollup(df, ROLLUP_FREQUENCIES) for df in frames],
+                                                    repeat)
+    results["pipeline (serial)"] = best_time(lambda: run_pipeline(filelocs, ROLLUP_FREQUENCIES, workers=1), 1)
+    finals = {freq: [] for freq in ROLLUP_FREQUENCIES}
+    for df in frames:
+        for freq, df_final in rollup(df, ROLLUP_FREQUENCIES).items():
+            finals[freq].append(df_final)
+    tables = {freq: result_table(finals[freq], puget_filelocs) for freq in ["hour", "10Min", "10S"]}
+    public_sensors = public_devices()
+    for freq in ["hour", "10Min"]:
+        table = tables[freq]
+        results["io_ratio_table %s" % freq] = best_time(
+            lambda df: io_ratio_table(df, df_users, PARTICLE_SIZE, start, end), repeat, table.copy)
+        results["gov_ratio_table %s" % freq] = best_time(
+            lambda df: gov_ratio_table(df, df_users, 'In', PARTICLE_SIZE, public_sensors, start, end), repeat,
+            table.copy)
+        for in_or_out in ['In', 'Out']:
+            results["average %s %s" % (in_or_out, freq)] = best_time(
+                lambda df: average(df, df_users, in_or_out, PARTICLE_SIZE, start=start, end=end), repeat, table.copy)
+    devices = list(pd.unique(tables["10S"]['Device Name']))
+    for freq in ["10Min", "10S"]:
+        results["plot_series %s" % freq] = best_time(
+            lambda df: [plot_series(df, device, PARTICLE_SIZE, start, end, PLOT_WIDTH) for device in devices],
+            repeat, tables[freq].copy)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the analysis steps on synthetic sensor logs")
+    parser.add_argument("--devices", type=int, default=15, help="number of Beta/Breakout devices")
+    parser.add_argument("--days", type=float, default=10.0)
+    parser.add_argument("--period", type=int, default=10, help="seconds between records")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--folder", default=None, help="keep the synthetic logs in this folder (default: temporary)")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as temporary:
+        folder = args.folder or temporary
+        start = time.perf_counter()
+        users, logs, pugets = generate_dataset(folder, args.devices, args.days, args.period)
+        print("Generated %d logs (%.1f MB) in %.1f s" % (len(logs), sum(os.path.getsize(log) for log in logs) / 2 ** 20,
+                                                       time.perf_counter() - start))
+        window_start = pd.Timestamp(START)
+        window_end = window_start + pd.Timedelta(days=args.days)
+        timings = run_suite(users, logs, pugets, window_start.strftime("%m/%d/%Y %H:%M"),
+                            window_end.strftime("%m/%d/%Y %H:%M"), args.repeat)
+    for step, seconds in timings.items():
+        print("%-28s %8.3f s" % (step, seconds))
@@ -0,0 +1,365 @@
+"""
+This .py file contains the synthetic data generator of the benchmarks: Beta and Breakout logs in the raw SD-card
+format and Puget Sound public sensor CSVs, for any number of devices and days. The logs carry the quirks of the real
+files: device name and header lines after every restart, '0/0/0' rows before the clock is set, 2005 rows from a reset
+real-time clock, Pacific (four-digit year) or UTC/GPS (two-digit year) timestamps, outages, and the GPS drift of the
+moving Breakout-02.
+Run from the Analysis folder: python benchmarks/synthetic.py OUTPUT_FOLDER [--devices 15] [--days 10] [--period 10]
+"""
+import argparse
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ingest import get_layout
+from registry import load_devices
+from timestamps import TIMEZONE
+
+START = "2020-09-10"
+MEB_DEVICES = ["Beta-08", "Beta-13"]
+MOVING_DEVICE = "Breakout-02"
+HOME = (47.661519, -122.332354)
+PUGET_HEADER_LINES = 9
+UNSET_ROWS = 3
+RESET_ROWS = 30
+# Every time of day as written by the loggers, indexed by seconds since midnight
+TIME_STRINGS = np.array(["%02d:%02d:%02d" % (s // 3600, s // 60 % 60, s % 60) for s in range(86400)], dtype=object)
+
+
+def synthetic_devices(n_devices: int):
+    """
+    Pick the devices to simulate: the MEB pair and the moving sensor first (average() and the moving-sensor
+    figures need them), then the other registered sensors, then extra Beta pairs
+    :param n_devices: int
+    :return: list of str (Device Names)
+    """
+    registered = [name for name, device in load_devices().items()
+                  if not device['Public'] and not device['Skip'] and name not in MEB_DEVICES + [MOVING_DEVICE]]
+    names = MEB_DEVICES + [MOVING_DEVICE] + registered
+    number = 20
+    while len(names) < n_devices:
+        names.append("Beta-%02d" % number)
+        number += 1
+    return names[:n_devices]
+
+
+def users_frame(devices: list):
+    """
+    Build a users sheet for the simulated devices: registered indoor and outdoor devices sharing a location form
+    one user (the MEB location is user "MEB"), extra Betas are paired two by two
+    :param devices: list of str (Device Names)
+    :return df_users: DataFrame (In, Out, User, Location Number)
+    """
+    registry = load_devices()
+    locations = {}
+    extras = []
+    for name in devices:
+        device = registry.get(name)
+        if device is None:
+            extras.append(name)
+        elif device['In or Out'] in ('In', 'Out') and not np.isnan(device['Latitude']):
+            locations.setdefault((device['Latitude'], device['Longitude']), {'In': [], 'Out': []})
+            locations[(device['Latitude'], device['Longitude'])][device['In or Out']].append(name)
+    rows = []
+    for number, location in enumerate(locations.values(), 1):
+        if not location['In'] or not location['Out']:
+            continue
+        user = "MEB" if MEB_DEVICES[0] in location['Out'] else "User %d" % number
+        for suffix, indoor in zip("abcdefgh", location['In']):
+            label = "L%d" % number if len(location['In']) == 1 else "L%d-%s" % (number, suffix)
+            rows.append({'In': indoor, 'Out': location['Out'][0], 'User': user, 'Location Number': label})
+    for number, (indoor, outdoor) in enumerate(zip(extras[::2], extras[1::2]), len(locations) + 1):
+        rows.append({'In': indoor, 'Out': outdoor, 'User': "User %d" % number, 'Location Number': "L%d" % number})
+    return pd.DataFrame(rows, columns=['In', 'Out', 'User', 'Location Number'])
+
+
+def outdoor_profile(start: str, days: float, rng):
+    """
+    Hourly outdoor PM2.5 shared by all devices: background level, a wildfire smoke episode over the middle of the
+    period, a daily cycle and slowly varying noise
+    :param start: str (first day, Pacific time)
+    :param days: float
+    :param rng: numpy Generator
+    :return seconds: 1-D int array (UTC seconds of every hour)
+    :return values: 1-D float array (ug/m3)
+    """
+    hours = np.arange(int(days * 24) + 2)
+    episode = 150 * np.exp(-0.5 * ((hours - days * 12) / (days * 3)) ** 2)
+    daily = 1 + 0.25 * np.sin(2 * np.pi * (hours - 8) / 24)
+    noise = np.empty(len(hours))
+    noise[0] = 0
+    for i in range(1, len(hours)):
+        noise[i] = 0.9 * noise[i - 1] + rng.normal(0, 0.1)
+    seconds = pd.Timestamp(start, tz=TIMEZONE).value // 10 ** 9 + hours * 3600
+    return seconds, (8 + episode) * daily * np.exp(noise)
+
+
+def device_times(start: str, days: float, period: int, restarts: int, rng):
+    """
+    Logging times of one device: one record every period seconds (with a second of jitter), split into segments
+    by outages of 1 to 6 hours after which the device restarts
+    :param start: str (first day, Pacific time)
+    :param days: float
+    :param period: int (seconds between records)
+    :param restarts: int (number of outages)
+    :param rng: numpy Generator
+    :return times: 1-D int array (UTC seconds)
+    :return segments: list of slices of times (one per power cycle)
+    """
+    first = pd.Timestamp(start, tz=TIMEZONE).value // 10 ** 9
+    times = first + np.arange(0, int(days * 86400), period)
+    times += rng.integers(0, 2, len(times))
+    keep = np.ones(len(times), dtype=bool)
+    ends = []
+    for outage in rng.integers(1, len(times) - 1, restarts):
+        end = np.searchsorted(times, times[outage] + rng.integers(3600, 6 * 3600))
+        keep[outage:end] = False
+        ends.append(end)
+    # Segment bounds counted in kept records
+    bounds = sorted({0, int(keep.sum())} | {int(keep[:end].sum()) for end in ends})
+    return times[keep], [slice(lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+
+def epoch_seconds(stamps):
+    """
+    Seconds since the epoch of timestamps, whatever their resolution
+    :param stamps: DatetimeIndex (naive: wall-clock seconds; tz-aware: UTC seconds)
+    :return: 1-D int array
+    """
+    epoch = pd.Timestamp(0, tz=stamps.tz)
+    return np.asarray((stamps - epoch) // pd.Timedelta(seconds=1), dtype=np.int64)
+
+
+def date_strings(seconds, two_digit_year=False, year_offset=0):
+    """
+    Format logger dates ("2020/9/10" or "20/9/10") of wall-clock seconds, one strftime per distinct day
+    :param seconds: 1-D int array (wall-clock seconds since the epoch)
+    :param two_digit_year: bool
+    :param year_offset: int (years added to the written year, e.g. -15 for a clock reset to 2005)
+    :return: 1-D object array
+    """
+    days, inverse = np.unique(seconds // 86400, return_inverse=True)
+    stamps = pd.to_datetime(days * 86400, unit='s')
+    years = stamps.year + year_offset
+    labels = np.array(["%d/%d/%d" % (year % 100 if two_digit_year else year, month, day)
+                       for year, month, day in zip(years, stamps.month, stamps.day)], dtype=object)
+    return labels[inverse]
+
+
+def pm_values(times, outdoor, in_or_out: str, rng):
+    """
+    PM2.5 (Env) seen by one device: the outdoor profile scaled by a sensor gain, attenuated and delayed indoors
+    with occasional indoor sources, and with measurement noise
+    :param times: 1-D int array (UTC seconds)
+    :param outdoor: tuple (seconds, values) from outdoor_profile
+    :param in_or_out: str
+    :param rng: numpy Generator
+    :return: 1-D float array
+    """
+    gain = rng.uniform(0.85, 1.15)
+    if in_or_out == 'In':
+        values = rng.uniform(0.3, 0.7) * np.interp(times - 3600, *outdoor)
+        # Cooking and cleaning peaks (about one a day) decaying over half an hour
+        period = max(float(np.median(np.diff(times))), 1.0) if len(times) > 1 else 1.0
+        events = rng.random(len(times)) < period / 86400
+        decay = np.exp(-np.arange(int(3 * 600 / period) + 1) * period / 600)
+        values += np.convolve(events.astype(float), decay)[:len(times)] * 40
+    else:
+        values = np.interp(times, *outdoor)
+    return np.maximum(gain * values * rng.lognormal(0, 0.1, len(times)) + rng.normal(0, 0.5, len(times)), 0)
+
+
+def track(n_rows: int, rng):
+    """
+    GPS positions of the moving sensor: walks around home with pauses, plus GPS noise
+    :param n_rows: int
+    :param rng: numpy Generator
+    :return latitude: 1-D float array
+    :return longitude: 1-D float array
+    """
+    moving = np.repeat(rng.random(n_rows // 360 + 1) < 0.3, 360)[:n_rows]
+    steps = rng.normal(0, 1.5e-4, (n_rows, 2)) * moving[:, None]
+    position = np.empty((n_rows, 2))
+    current = np.zeros(2)
+    for i in range(n_rows):
+        # Mean-reverting walk, so the sensor stays around the neighborhood
+        current = 0.999 * current + steps[i]
+        position[i] = current
+    noise = rng.normal(0, 2e-5, (n_rows, 2))
+    return HOME[0] + position[:, 0] + noise[:, 0], HOME[1] + position[:, 1] + noise[:, 1]
+
+
+def log_frame(device_name: str, times, outdoor, in_or_out: str, utc: bool, rng):
+    """
+    Build the records of one power cycle of a device, laid out like the raw log
+    :param device_name: str
+    :param times: 1-D int array (UTC seconds)
+    :param outdoor: tuple (seconds, values) from outdoor_profile
+    :param in_or_out: str
+    :param utc: bool (True: the logger writes GPS/UTC time with a two-digit year; False: Pacific time)
+    :param rng: numpy Generator
+    :return df: DataFrame (columns of the device layout, Date/Time as written by the logger)
+    """
+    n = len(times)
+    columns = get_layout(device_name)
+    if utc:
+        wall = times
+    else:
+        wall = epoch_seconds(pd.to_datetime(times, unit='s', utc=True).tz_convert(TIMEZONE).tz_localize(None))
+    dates = date_strings(wall, two_digit_year=utc)
+    time_strings = TIME_STRINGS[wall % 86400]
+    unset = min(UNSET_ROWS, n)
+    dates[:unset] = '0/0/0'
+    time_strings[:unset] = TIME_STRINGS[:unset]
+    if rng.random() < 0.5:
+        # Real-time clock reset: UTC time of 2005 until the GPS sets the clock again
+        reset = slice(unset, min(unset + RESET_ROWS, n))
+        dates[reset] = date_strings(times[reset], year_offset=-15)
+        time_strings[reset] = TIME_STRINGS[times[reset] % 86400]
+    # The loggers pad the date and time fields with spaces ("2020/9/10 , 10:00:05 , 3.9")
+    dates = dates + ' '
+    time_strings = ' ' + time_strings + ' '
+    fix = np.zeros(n, dtype=int)
+    latitude = np.zeros(n)
+    longitude = np.zeros(n)
+    registered = load_devices().get(device_name)
+    if registered is None or np.isnan(registered['Latitude']):
+        # Devices without registered coordinates log their own GPS position once they have a fix
+        fix[unset + RESET_ROWS:] = 1
+        if device_name == MOVING_DEVICE:
+            latitude, longitude = track(n, rng)
+        else:
+            latitude = HOME[0] + rng.uniform(-0.05, 0.05) + rng.normal(0, 2e-5, n)
+            longitude = HOME[1] + rng.uniform(-0.05, 0.05) + rng.normal(0, 2e-5, n)
+        latitude = np.where(fix == 1, latitude, 0)
+        longitude = np.where(fix == 1, longitude, 0)
+    env = pm_values(times, outdoor, in_or_out, rng)
+    std = env * (1 + 0.5 * env / (env + 50))
+    counts = 180 * 0.75 * std
+    values = {'Date': dates, 'Time': time_strings, 'Battery': np.linspace(4.2, 3.5, n), 'Fix': fix,
+              'Latitude': latitude, 'Longitude': longitude,
+              'Dp>0.3': counts, 'Dp>0.5': counts * 0.3, 'Dp>1.0': counts * 0.09, 'Dp>2.5': counts * 0.009,
+              'Dp>5.0': counts * 0.0027, 'Dp>10.0': counts * 0.0008,
+              'PM1_Std': std * 0.75, 'PM2.5_Std': std, 'PM10_Std': std * 1.15,
+              'PM1_Env': env * 0.75, 'PM2.5_Env': env, 'PM10_Env': env * 1.15}
+    for column in ['Dp>0.3', 'Dp>0.5', 'Dp>1.0', 'Dp>2.5', 'Dp>5.0', 'Dp>10.0']:
+        values[column] = np.round(values[column]).astype(int)
+    if 'Temp(C)' in columns:
+        hour = (wall % 86400) / 3600
+        values['Temp(C)'] = 20 + 5 * np.sin(2 * np.pi * (hour - 9) / 24) + rng.normal(0, 0.2, n)
+        values['RH(%)'] = 60 - 15 * np.sin(2 * np.pi * (hour - 9) / 24) + rng.normal(0, 1, n)
+        values['P(hPa)'] = 1013 + rng.normal(0, 0.3, n)
+        values['Alti(m)'] = 44330 * (1 - (values['P(hPa)'] / 1013.25) ** 0.1903)
+    return pd.DataFrame(values, columns=columns)
+
+
+def write_device_log(fileloc: str, device_name: str, outdoor, in_or_out: str, start=START, days=10.0, period=10,
+                     restarts=2, utc=None, seed=0):
+    """
+    Write one raw Beta/Breakout log
+    :param fileloc: str (file location)
+    :param device_name: str
+    :param outdoor: tuple (seconds, values) from outdoor_profile
+    :param in_or_out: str
+    :param start: str (first day, Pacific time)
+    :param days: float
+    :param period: int (seconds between records)
+    :param restarts: int (number of outages; each one writes the device name and header lines again)
+    :param utc: bool (None: Breakouts log UTC, Betas log Pacific time)
+    :param seed: int
+    :return: int (number of records)
+    """
+    rng = np.random.default_rng(seed)
+    if utc is None:
+        utc = 'Breakout' in device_name
+    times, segments = device_times(start, days, period, restarts, rng)
+    header = ", ".join(get_layout(device_name)) + "\n"
+    with open(fileloc, 'w', newline='') as f:
+        for segment in segments:
+            f.write(device_name + "\n")
+            f.write(header)
+            log_frame(device_name, times[segment], outdoor, in_or_out, utc, rng).to_csv(
+                f, header=False, index=False, float_format='%.2f', lineterminator='\n')
+    return len(times)
+
+
+def write_puget_csv(fileloc: str, outdoor, start=START, days=10.0, seed=0):
+    """
+    Write one Puget Sound public sensor export: header lines, then hourly PM2.5 in Pacific wall-clock time with
+    a few missing hours
+    :param fileloc: str (file location)
+    :param outdoor: tuple (seconds, values) from outdoor_profile
+    :param start: str (first day, Pacific time)
+    :param days: float
+    :param seed: int
+    :return: int (number of rows)
+    """
+    rng = np.random.default_rng(seed)
+    hours = pd.date_range(pd.Timestamp(start, tz=TIMEZONE), periods=int(days * 24), freq="1h")
+    values = np.interp(epoch_seconds(hours), *outdoor) * rng.uniform(0.8, 1.2) * rng.lognormal(0, 0.05, len(hours))
+    text = np.char.mod('%.1f', values).astype(object)
+    text[rng.random(len(hours)) < 0.02] = ''
+    name = os.path.splitext(os.path.basename(fileloc))[0]
+    header = ["Site: " + name, "Parameter: PM2.5", "Units: ug/m3", "Averaging: 1 hour", "Time zone: Pacific",
+              "Source: synthetic", "", "", "Date Time,Value"]
+    with open(fileloc, 'w', newline='') as f:
+        f.write("\n".join(header[:PUGET_HEADER_LINES]) + "\n")
+        for hour, value in zip(hours.tz_localize(None).strftime('%m/%d/%Y %H:%M'), text):
+            f.write(hour + "," + value + "\n")
+    return len(hours)
+
+
+def generate_dataset(folder: str, n_devices=15, days=10.0, period=10, start=START, restarts=2, seed=0):
+    """
+    Write a synthetic raw data folder: one log per device (named like the real files) and one CSV per public
+    sensor
+    :param folder: str
+    :param n_devices: int (number of Beta/Breakout devices)
+    :param days: float
+    :param period: int (seconds between records)
+    :param start: str (first day, Pacific time)
+    :param restarts: int (outages per device)
+    :param seed: int
+    :return df_users: DataFrame (users sheet of the simulated devices)
+    :return filelocs: list of str (device logs)
+    :return puget_filelocs: list of str (public sensor CSVs)
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    outdoor = outdoor_profile(start, days, rng)
+    devices = synthetic_devices(n_devices)
+    df_users = users_frame(devices)
+    sheet = {device: 'In' for device in df_users['In']}
+    sheet.update({device: 'Out' for device in df_users['Out']})
+    registry = load_devices()
+    filelocs = []
+    for number, device in enumerate(devices):
+        registered = registry.get(device)
+        in_or_out = registered['In or Out'] if registered is not None and registered['In or Out'] in ('In', 'Out') \
+            else sheet.get(device, 'Out')
+        fileloc = os.path.join(folder, (registered['File'] if registered is not None else device) + ".txt")
+        write_device_log(fileloc, device, outdoor, in_or_out, start, days, period, restarts, seed=seed + number + 1)
+        filelocs.append(fileloc)
+    puget_filelocs = []
+    for number, device in enumerate(device for device in registry.values() if device['Public']):
+        fileloc = os.path.join(folder, device['File'] + ".csv")
+        write_puget_csv(fileloc, outdoor, start, days, seed=seed + 1000 + number)
+        puget_filelocs.append(fileloc)
+    return df_users, filelocs, puget_filelocs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic raw sensor logs")
+    parser.add_argument("folder")
+    parser.add_argument("--devices", type=int, default=15, help="number of Beta/Breakout devices")
+    parser.add_argument("--days", type=float, default=10.0)
+    parser.add_argument("--period", type=int, default=10, help="seconds between records")
+    parser.add_argument("--start", default=START, help="first day (Pacific time)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    users, logs, pugets = generate_dataset(args.folder, args.devices, args.days, args.period, args.start,
+                                           seed=args.seed)
+    users.to_csv(os.path.join(args.folder, "users.csv"), index=False)
+    print("Wrote %d device logs, %d public sensor files and users.csv to %s" % (len(logs), len(pugets), args.folder))
@@ -0,0 +1,403 @@
+"""
+This .py file contains the calibration of low-cost sensors against reference monitors: polynomial features,
+least-squares fits, k-fold cross validation, batched fits over devices, degrees and offset/no-offset models, the
+versioned coefficient store (calibrations.json) and the stage that writes calibrated columns into the results.
+"""
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from registry import public_devices
+from storage import RESULTS_DIR, dataset_path, delta_files, load_results, write_results
+
+COEFFICIENTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calibrations.json")
+APPLIED_FILE = "calibration_applied.json"
+CALIBRATED_SUFFIX = "_Cal"
+DEFAULT_MODEL = "*"
+
+_STORES = {}
+
+
+def poly_features(X, degree: int):
+    """
+    Build the polynomial design matrix [x, x^2, ..., x^degree] (no constant column)
+    :param X: 1-D array
+    :param degree: int
+    :return: 2-D array (n x degree)
+    """
+    return np.vander(np.asarray(X, dtype=np.float64), degree + 1, increasing=True)[:, 1:]
+
+
+def linear_fit(X, Y):
+    """
+    Least-squares coefficients of Y ~ X (no intercept)
+    :param X: 1-D array (single feature) or 2-D array (design matrix)
+    :param Y: 1-D array
+    :return: float for a 1-D X, otherwise 1-D array of coefficients
+    """
+    X = np.asarray(X, dtype=np.float64)
+    if X.ndim == 1:
+        return float(np.linalg.lstsq(X[:, None], Y, rcond=None)[0][0])
+    return np.linalg.lstsq(X, Y, rcond=None)[0]
+
+
+def calibrate(X, coefficients, intercept=0.0):
+    """
+    Apply a polynomial calibration: intercept + c1 x + c2 x^2 + ...
+    :param X: array or Series (raw readings)
+    :param coefficients: list of float (c1, c2, ...)
+    :param intercept: float
+    :return: array or Series (calibrated readings)
+    """
+    result = 0.0
+    for coefficient in reversed(list(coefficients)):
+        result = (result + coefficient) * X
+    return result + intercept
+
+
+def calc_error(Y, Y_hat):
+    """
+    Mean squared error
+    :param Y: 1-D array (reference)
+    :param Y_hat: 1-D array (prediction)
+    :return: float
+    """
+    return np.mean((Y - Y_hat) ** 2)
+
+
+def r_squared(Y, Y_hat):
+    """
+    Coefficient of determination
+    :param Y: 1-D array (reference)
+    :param Y_hat: 1-D array (prediction)
+    :return: float
+    """
+    return 1 - np.sum((Y - Y_hat) ** 2) / np.sum((Y - np.mean(Y)) ** 2)
+
+
+def bic(Y, Y_hat, k: int):
+    """
+    Bayesian information criterion of a least-squares fit
+    :param Y: 1-D array (reference)
+    :param Y_hat: 1-D array (prediction)
+    :param k: int (number of fitted coefficients)
+    :return: float
+    """
+    n = Y.shape[0]
+    return n * np.log(np.sum((Y - Y_hat) ** 2) / n) + k * np.log(n)
+
+
+def fold_ids(n: int, folds=10, seed=None):
+    """
+    Assign every sample to one of the k folds through a single random permutation
+    :param n: int (number of samples)
+    :param folds: int
+    :param seed: int (random seed)
+    :return: 1-D int array (fold of each sample)
+    """
+    ids = np.empty(n, dtype=int)
+    ids[np.random.default_rng(seed).permutation(n)] = np.arange(n) % folds
+    return ids
+
+
+def _design(X, degree: int, offset: bool):
+    """
+    Build the scaled design matrix of one model. x is divided by its largest magnitude first, which keeps the
+    high powers well conditioned; _unscale maps the coefficients back.
+    :return A: 2-D array
+    :return scale: float
+    """
+    scale = np.max(np.abs(X)) if X.size and np.max(np.abs(X)) > 0 else 1.0
+    A = poly_features(X / scale, degree)
+    if offset:
+        A = np.hstack([np.ones((A.shape[0], 1)), A])
+    return A, scale
+
+
+def _unscale(solution, scale: float, offset: bool):
+    """
+    Turn the solution of a scaled design into (coefficients, intercept) of the raw readings
+    :return coefficients: 1-D array (c1, c2, ...)
+    :return intercept: float
+    """
+    intercept = solution[0] if offset else 0.0
+    coefficients = solution[1:] if offset else solution
+    return coefficients / scale ** np.arange(1, len(coefficients) + 1), float(intercept)
+
+
+def _nested_fits(A, Y, sizes: list):
+    """
+    Least-squares solutions of the models made of the first `size` columns of A, all from one QR factorization
+    (a polynomial of lower degree uses a leading block of the same design)
+    :param A: 2-D array (design of the largest model)
+    :param Y: 1-D array
+    :param sizes: list of int (number of columns of each model)
+    :return: list of 1-D arrays
+    """
+    Q, R = np.linalg.qr(A)
+    QtY = Q.T.dot(Y)
+    return [np.linalg.lstsq(R[:size, :size], QtY[:size], rcond=None)[0] for size in sizes]
+
+
+def cross_val(X, Y, degree: int, off=False, folds=10, seed=None, ids=None):
+    """
+    k-fold cross validation of a polynomial calibration
+    :param X: 1-D array (raw readings)
+    :param Y: 1-D array (reference)
+    :param degree: int
+    :param off: bool (fit an offset as well)
+    :param folds: int
+    :param seed: int (random seed of the fold assignment)
+    :param ids: 1-D int array (precomputed fold of each sample, see fold_ids)
+    :return: mean test MSE, mean test R squared
+    """
+    X = np.asarray(X, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    if ids is None:
+        ids = fold_ids(X.shape[0], folds, seed)
+    errors = []
+    r_squareds = []
+    for fold in range(folds):
+        test = ids == fold
+        A, scale = _design(X[~test], degree, off)
+        coefficients, intercept = _unscale(np.linalg.lstsq(A, Y[~test], rcond=None)[0], scale, off)
+        Y_ = calibrate(X[test], coefficients, intercept)
+        errors.append(calc_error(Y[test], Y_))
+        r_squareds.append(r_squared(Y[test], Y_))
+    return np.mean(errors), np.mean(r_squareds)
+
+
+def fit_calibrations(df, devices: list, reference="Reference Average", degrees=(1, 2, 3), offsets=(False, True),
+                     folds=10, seed=0, pooled=False):
+    """
+    Fit every device x degree x offset/no-offset calibration against a reference column in one call. For each
+    device and offset mode, the design is factorized once and every degree is solved from it; cross validation
+    reuses one fold assignment per device.
+    :param df: DataFrame (wide table with one column per device and the reference column, e.g. from average())
+    :param devices: list of device columns
+    :param reference: str (reference column)
+    :param degrees: list of int (polynomial degrees)
+    :param offsets: list of bool (fit without and/or with an offset)
+    :param folds: int (number of cross-validation folds, 0 to skip cross validation)
+    :param seed: int (random seed of the fold assignment)
+    :param pooled: bool (also fit all devices stacked together, reported as Device "All")
+    :return df: DataFrame with one row per model: Device, Degree, Offset, Coefficients (c1, c2, ...), Intercept,
+                N, MSE, R2, BIC, CV MSE, CV R2
+    """
+    samples = []
+    for device in devices:
+        valid = df[device].notna() & df[reference].notna()
+        samples.append((device, df.loc[valid, device].to_numpy(np.float64),
+                        df.loc[valid, reference].to_numpy(np.float64)))
+    if pooled:
+        samples.append(("All", np.concatenate([sample[1] for sample in samples]),
+                        np.concatenate([sample[2] for sample in samples])))
+    degrees = sorted(degrees)
+    rows = []
+    for device, X, Y in samples:
+        if X.shape[0] == 0:
+            continue
+        ids = fold_ids(X.shape[0], folds, seed) if folds else None
+        for off in offsets:
+            A, scale = _design(X, degrees[-1], off)
+            sizes = [degree + int(off) for degree in degrees]
+            for degree, solution in zip(degrees, _nested_fits(A, Y, sizes)):
+                coefficients, intercept = _unscale(solution, scale, off)
+                Y_hat = calibrate(X, coefficients, intercept)
+                cv_error, cv_r_squared = cross_val(X, Y, degree, off, folds, ids=ids) if folds else (np.nan, np.nan)
+                rows.append({"Device": device, "Degree": degree, "Offset": off,
+                             "Coefficients": list(coefficients), "Intercept": intercept, "N": X.shape[0],
+                             "MSE": calc_error(Y, Y_hat), "R2": r_squared(Y, Y_hat),
+                             "BIC": bic(Y, Y_hat, degree + int(off)), "CV MSE": cv_error, "CV R2": cv_r_squared})
+    return pd.DataFrame(rows, columns=["Device", "Degree", "Offset", "Coefficients", "Intercept", "N", "MSE", "R2",
+                                       "BIC", "CV MSE", "CV R2"])
+
+
+def models_from_fits(df_fit, degree=1, offset=False):
+    """
+    Pick one model per device from a fit_calibrations table, in the format of the coefficient store
+    :param df_fit: DataFrame (from fit_calibrations)
+    :param degree: int
+    :param offset: bool
+    :return models: dict of Device Name -> {"coefficients": [...], "intercept": float}
+    """
+    df_fit = df_fit[(df_fit['Degree'] == degree) & (df_fit['Offset'] == offset)]
+    return {device: {"coefficients": [float(c) for c in coefficients], "intercept": float(intercept)}
+            for device, coefficients, intercept in zip(df_fit['Device'], df_fit['Coefficients'],
+                                                       df_fit['Intercept'])}
+
+
+def load_store(path=COEFFICIENTS_FILE):
+    """
+    Load the coefficient store, re-reading it only when the file changed
+    :param path: str (location of calibrations.json)
+    :return store: dict ("active": version number, "versions": dict of version -> entry)
+    """
+    if not os.path.exists(path):
+        return {"active": None, "versions": {}}
+    mtime = os.path.getmtime(path)
+    cached = _STORES.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'r') as f:
+        store = json.load(f)
+    _STORES[path] = (mtime, store)
+    return store
+
+
+def load_coefficients(version=None, path=COEFFICIENTS_FILE):
+    """
+    Get one version of the calibration models
+    :param version: int (None for the active version)
+    :param path: str (location of calibrations.json)
+    :return entry: dict ("version", "columns", "models", "note", "created") or None when the store is empty
+    """
+    store = load_store(path)
+    version = store["active"] if version is None else version
+    if version is None:
+        return None
+    if str(version) not in store["versions"]:
+        raise ValueError("Calibration version " + str(version) + " is not in " + path)
+    return dict(store["versions"][str(version)], version=int(version))
+
+
+def save_coefficients(models: dict, columns=("PM2.5_Env",), note="", path=COEFFICIENTS_FILE, activate=True):
+    """
+    Add a new version to the coefficient store (earlier versions are kept, so results can be reproduced)
+    :param models: dict of Device Name (or "*" for every low-cost device without its own model) ->
+                   {"coefficients": [c1, c2, ...], "intercept": float}
+    :param columns: list of columns the models apply to
+    :param note: str (e.g. how the models were fitted)
+    :param path: str (location of calibrations.json)
+    :param activate: bool (make the new version the active one)
+    :return version: int
+    """
+    store = load_store(path)
+    store = {"active": store["active"], "versions": dict(store["versions"])}
+    version = max([int(key) for key in store["versions"]] + [0]) + 1
+    store["versions"][str(version)] = {"created": pd.Timestamp.now(tz="UTC").isoformat(), "note": note,
+                                       "columns": list(columns), "models": models}
+    if activate:
+        store["active"] = version
+    with open(path + ".tmp", 'w') as f:
+        json.dump(store, f, indent=2)
+    os.replace(path + ".tmp", path)
+    return version
+
+
+def fingerprint(entry):
+    """
+    Hash of the columns and models of a store version: calibrated results are stale when it changes
+    :param entry: dict (from load_coefficients) or None
+    :return: str
+    """
+    if entry is None:
+        return ""
+    content = json.dumps({"columns": entry["columns"], "models": entry["models"]}, sort_keys=True)
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def calibrated_column(column: str):
+    """
+    :param column: str (e.g. 'PM2.5_Env')
+    :return: str (name of its calibrated column, e.g. 'PM2.5_Env_Cal')
+    """
+    return column + CALIBRATED_SUFFIX
+
+
+def apply_calibration(df, entry=None, device_column='Device Name'):
+    """
+    Write the calibrated columns of a result table in one vectorized pass: each row takes the polynomial of its
+    device (or the "*" model), public reference sensors and devices without a model keep their raw values
+    :param df: DataFrame (averaged results of any number of devices)
+    :param entry: dict (from load_coefficients; None uses the active version)
+    :param device_column: str
+    :return df: DataFrame with a '<column>_Cal' column per calibrated column
+    """
+    if entry is None:
+        entry = load_coefficients()
+    if entry is None:
+        return df
+    models = entry["models"]
+    codes, devices = pd.factorize(df[device_column])
+    references = set(public_devices())
+    chosen = [None if device in references else models.get(device, models.get(DEFAULT_MODEL))
+              for device in devices]
+    degree = max([len(model["coefficients"]) for model in chosen if model is not None] + [1])
+    # One coefficient row per device (identity for uncalibrated devices), gathered per row through the codes
+    coefficients = np.zeros((len(devices) + 1, degree))
+    intercepts = np.zeros(len(devices) + 1)
+    coefficients[:, 0] = 1.0
+    for i, model in enumerate(chosen):
+        if model is not None:
+            coefficients[i] = 0.0
+            coefficients[i, :len(model["coefficients"])] = model["coefficients"]
+            intercepts[i] = model["intercept"]
+    coefficients = coefficients[codes]
+    intercepts = intercepts[codes]
+    df = df.copy()
+    for column in entry["columns"]:
+        if column not in df.columns:
+            continue
+        X = df[column].to_numpy(np.float64)
+        result = np.zeros(len(X))
+        for j in range(degree - 1, -1, -1):
+            result = (result + coefficients[:, j]) * X
+        df[calibrated_column(column)] = result + intercepts
+    return df
+
+
+def load_applied(results_dir=RESULTS_DIR):
+    """
+    Load which store version was applied to each result dataset
+    :param results_dir: str
+    :return: dict of dataset name -> {"version": int, "fingerprint": str}
+    """
+    path = os.path.join(results_dir, APPLIED_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def mark_applied(names: list, entry=None, results_dir=RESULTS_DIR):
+    """
+    Record that result datasets were written with a store version
+    :param names: list of dataset names (e.g. frequency names)
+    :param entry: dict (from load_coefficients; None uses the active version)
+    :param results_dir: str
+    :return: None
+    """
+    if entry is None:
+        entry = load_coefficients()
+    applied = load_applied(results_dir)
+    for name in names:
+        applied[name] = {"version": None if entry is None else entry["version"], "fingerprint": fingerprint(entry)}
+    path = os.path.join(results_dir, APPLIED_FILE)
+    os.makedirs(results_dir, exist_ok=True)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(applied, f, indent=2)
+    os.replace(path + ".tmp", path)
+    return
+
+
+def recalibrate_results(names: list, results_dir=RESULTS_DIR):
+    """
+    Rewrite the calibrated columns of every result dataset whose coefficients changed since it was written;
+    datasets that are up to date are not read
+    :param names: list of dataset names (e.g. frequency names)
+    :param results_dir: str
+    :return stale: list of dataset names that were rewritten
+    """
+    entry = load_coefficients()
+    applied = load_applied(results_dir)
+    stale = [name for name in names if (os.path.exists(dataset_path(name, results_dir))
+                                        or delta_files(name, results_dir))
+             and applied.get(name, {}).get("fingerprint") != fingerprint(entry)]
+    for name in stale:
+        df = load_results(name, results_dir=results_dir)
+        df = df.drop(columns=[column for column in df.columns if column.endswith(CALIBRATED_SUFFIX)])
+        write_results(apply_calibration(df, entry), name, results_dir)
+        mark_applied([name], entry, results_dir)
+    return stale
@@ -0,0 +1,135 @@
+"""
+This .py file contains the downsampling layer of the plotting functions: dense time series are reduced to about two
+points per horizontal pixel with Largest-Triangle-Three-Buckets (shape preserving) or a min/max envelope (peak
+preserving) before they reach matplotlib. Downsampled series of result tables are cached per
+(table, device, column, window, width, mode).
+"""
+import numpy as np
+import pandas as pd
+from query import cached_by_table, table_query
+
+POINTS_PER_PIXEL = 2
+MODES = ("lttb", "minmax")
+
+_DOWNSAMPLED = {}
+
+
+def lttb_indices(x, y, n_out: int):
+    """
+    Pick n_out points with Largest-Triangle-Three-Buckets: the first and last points are kept, and every bucket in
+    between keeps the point forming the largest triangle with the previously kept point and the next bucket's mean
+    :param x: 1-D float array (increasing)
+    :param y: 1-D float array without NaN
+    :param n_out: int
+    :return: 1-D int array (sorted positions)
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.floor(np.linspace(1, n - 1, n_out - 1)).astype(int)
+    sizes = np.diff(edges)
+    # Means of every bucket, for the "next bucket" corner of the triangles
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / sizes
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / sizes
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo = edges[i]
+        hi = edges[i + 1]
+        if i < n_out - 3:
+            cx = mean_x[i + 1]
+            cy = mean_y[i + 1]
+        else:
+            cx = x[n - 1]
+            cy = y[n - 1]
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, n_out: int):
+    """
+    Keep the minimum and the maximum of each of n_out / 2 equal buckets, so no peak is lost
+    :param y: 1-D float array without NaN
+    :param n_out: int
+    :return: 1-D int array (sorted positions)
+    """
+    n = len(y)
+    buckets = max(n_out // 2, 1)
+    if n_out >= n:
+        return np.arange(n)
+    size = int(np.ceil(n / buckets))
+    padded_low = np.full(buckets * size, np.inf)
+    padded_high = np.full(buckets * size, -np.inf)
+    padded_low[:n] = y
+    padded_high[:n] = y
+    offsets = np.arange(buckets) * size
+    low = offsets + np.argmin(padded_low.reshape(buckets, size), axis=1)
+    high = offsets + np.argmax(padded_high.reshape(buckets, size), axis=1)
+    return np.unique(np.concatenate([low[low < n], high[high < n]]))
+
+
+def target_points(width=None, points_per_pixel=POINTS_PER_PIXEL):
+    """
+    Number of points worth drawing for a plot width
+    :param width: int (pixels; None uses the width of the current matplotlib figure)
+    :param points_per_pixel: int
+    :return: int
+    """
+    if width is None:
+        import matplotlib.pyplot as plt
+        figure = plt.gcf()
+        width = figure.get_figwidth() * figure.dpi
+    return int(width * points_per_pixel)
+
+
+def downsample(values, width=None, mode="lttb", points_per_pixel=POINTS_PER_PIXEL):
+    """
+    Reduce a time series to about points_per_pixel points per pixel of the plot width. Series that are already
+    short enough are returned as they are. Missing values are kept at the start of every gap, so gaps still break
+    the plotted line.
+    :param values: Series indexed by PT DateTime
+    :param width: int (pixels; None uses the width of the current matplotlib figure)
+    :param mode: "lttb" (shape preserving) or "minmax" (envelope keeping every peak)
+    :param points_per_pixel: int
+    :return: Series (subset of values)
+    """
+    if mode not in MODES:
+        raise ValueError("Wrong mode. Choose either lttb or minmax")
+    n_out = target_points(width, points_per_pixel)
+    if len(values) <= n_out:
+        return values
+    y = values.to_numpy(dtype=np.float64)
+    valid = ~np.isnan(y)
+    positions = np.flatnonzero(valid)
+    if mode == "lttb":
+        x = pd.DatetimeIndex(values.index).asi8.astype(np.float64)
+        x = x[valid] - x[positions[0]] if len(positions) else x[valid]
+        kept = positions[lttb_indices(x, y[valid], n_out)]
+    else:
+        kept = positions[minmax_indices(y[valid], n_out)]
+    gaps = np.flatnonzero(~valid & np.r_[True, valid[:-1]])
+    return values.iloc[np.union1d(kept, gaps)]
+
+
+def plot_series(df, device: str, column: str, start=None, end=None, width=None, mode="lttb"):
+    """
+    Get the downsampled series of one device for plotting, cached per (table, device, column, window, width, mode)
+    :param df: DataFrame or TableQuery (result table)
+    :param device: str
+    :param column: str (e.g. 'PM2.5_Env')
+    :param start: start of the window
+    :param end: end of the window
+    :param width: int (pixels; None uses the width of the current matplotlib figure)
+    :param mode: "lttb" or "minmax"
+    :return: Series indexed by PT DateTime
+    """
+    # Keyed by the query: after query.invalidate_table(df), table_query builds a new one and the entries of the old
+    # one are dropped with it
+    query = table_query(df)
+    n_out = target_points(width)
+    return cached_by_table(_DOWNSAMPLED, query, (device, column, start, end, n_out, mode),
+                           lambda: downsample(query.series(device, column, start, end), n_out / POINTS_PER_PIXEL, mode))
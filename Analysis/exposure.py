@@ -0,0 +1,250 @@
+"""
+This .py file contains the personal exposure API of the moving sensor (Breakout-02): its per-timestamp series, built
+once per table instead of regrouped by every plot, and its dose (concentration integrated over time, in ug/m3 x h)
+with the trapezoidal rule on the irregular timestamps. Intervals longer than max_gap are gaps and add no dose. Every
+interval is attributed to the indoor, outdoor or transit segment it starts in (see geofence.py) and compared with the
+dose the co-located static sensors saw over the same intervals.
+"""
+import weakref
+import numpy as np
+import pandas as pd
+from geofence import NO_FIX, OTHER, classify, dwell_segments, place_index
+from query import table_query
+
+PERSONAL_DEVICE = "Breakout-02"
+STATIC_DEVICES = ["Beta-11", "Beta-14", "Beta-16"]
+INDOOR = "Indoor"
+OUTDOOR = "Outdoor"
+TRANSIT = "Transit"
+ALL = "All"
+MAX_GAP = "30min"
+
+_PERSONAL = {}
+_INTERVALS = {}
+
+
+def _cached(cache: dict, tables: tuple, key: tuple, build):
+    """
+    Get a result cached for some tables, or build it. Entries are dropped when one of the tables is collected (see
+    query.cached_by_table).
+    :param cache: dict
+    :param tables: tuple of TableQuery (the key holds their ids)
+    :param key: tuple
+    :param build: function without arguments
+    :return: the cached or built result
+    """
+    cached = cache.get(key)
+    if cached is not None and all(ref() is table for ref, table in zip(cached[0], tables)):
+        return cached[1]
+    value = build()
+    refs = tuple(weakref.ref(table, lambda ref, key=key: cache.pop(key, None)) for table in tables)
+    cache[key] = (refs, value)
+    return value
+
+
+def _places_key(places):
+    """
+    :param places: list of dict (see geofence.load_places), PlaceIndex or None
+    :return: hashable description of the places
+    """
+    if places is None:
+        return None
+    return tuple((place['name'], place.get('setting'),
+                  place['polygon'].tobytes() if 'polygon' in place
+                  else (place['latitude'], place['longitude'], place['radius']))
+                 for place in place_index(places).places)
+
+
+def _nanoseconds(times, origin):
+    """
+    :param times: DatetimeIndex
+    :param origin: Timestamp
+    :return: 1-D int64 array (nanoseconds since origin, whatever the resolution of times)
+    """
+    return np.asarray((times - origin) // pd.Timedelta(1, 'ns'), dtype=np.int64)
+
+
+def personal_frame(df, device=PERSONAL_DEVICE, start=None, end=None, place=None, places=None):
+    """
+    The series of the personal sensor: one row per timestamp, averaging the rows logged at several positions within
+    one averaging bucket. Built once per table and window, then copied.
+    :param df: DataFrame or TableQuery (result table)
+    :param device: str
+    :param start: start of the window
+    :param end: end of the window
+    :param place: str (only keep the rows logged at this place; None keeps all)
+    :param places: list of places (see geofence.load_places)
+    :return: DataFrame (Device Name, PT DateTime and the averaged numeric columns), sorted by PT DateTime
+    """
+    query = table_query(df)
+    key = (id(query), device, start, end, place, _places_key(places) if place is not None else None)
+
+    def build():
+        df_device = query.frame(device, start, end)
+        if place is not None:
+            df_device = df_device[classify(df_device, places) == place]
+        cols_average = df_device.columns.drop(['Device Name', 'PT DateTime',
+                                               'Latitude', 'Longitude', 'In or Out'])
+        df_device = df_device.groupby(['Device Name', 'PT DateTime'],
+                                      as_index=False)[cols_average].mean().sort_values(['PT DateTime'])
+        df_device["PT DateTime"] = pd.to_datetime(df_device["PT DateTime"])
+        return df_device.reset_index(drop=True)
+
+    return _cached(_PERSONAL, (query,), key, build).copy()
+
+
+def trapezoid_dose(nanoseconds, values, max_gap=MAX_GAP):
+    """
+    Integrate a concentration over irregular timestamps with the trapezoidal rule
+    :param nanoseconds: 1-D int64 array (sorted sample times)
+    :param values: 1-D float array (ug/m3, NaN where the sample has no reading)
+    :param max_gap: str or Timedelta (longer intervals are gaps)
+    :return counted: boolean array (one per interval between consecutive samples: both ends have a reading and
+                     the interval is not a gap)
+    :return hours: 1-D float array (length of every interval)
+    :return dose: 1-D float array (ug/m3 x h of every interval, 0 where not counted)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    steps = np.diff(nanoseconds)
+    hours = steps / 3.6e12
+    counted = (steps <= pd.Timedelta(max_gap).value) & ~np.isnan(values[:-1]) & ~np.isnan(values[1:])
+    dose = np.where(counted, (values[:-1] + values[1:]) / 2 * hours, 0)
+    return counted, hours, dose
+
+
+def interpolate_onto(nanoseconds, sample_nanoseconds, sample_values, max_gap=MAX_GAP):
+    """
+    Linearly interpolate another sensor onto the sample times, only between its readings at most max_gap apart
+    :param nanoseconds: 1-D int64 array (target times)
+    :param sample_nanoseconds: 1-D int64 array (sorted times of the other sensor)
+    :param sample_values: 1-D float array (readings of the other sensor, without NaN)
+    :param max_gap: str or Timedelta
+    :return: 1-D float array, NaN where the other sensor has no bracketing readings
+    """
+    values = np.full(len(nanoseconds), np.nan)
+    if not len(sample_nanoseconds):
+        return values
+    after = np.searchsorted(sample_nanoseconds, nanoseconds)
+    right = np.minimum(after, len(sample_nanoseconds) - 1)
+    left = np.maximum(after - 1, 0)
+    exact = sample_nanoseconds[right] == nanoseconds
+    bracketed = (after > 0) & (after < len(sample_nanoseconds)) \
+        & (sample_nanoseconds[right] - sample_nanoseconds[left] <= pd.Timedelta(max_gap).value)
+    valid = exact | bracketed
+    values[valid] = np.interp(nanoseconds[valid], sample_nanoseconds, sample_values)
+    return values
+
+
+def _settings(segments, places):
+    """
+    Name the setting of every segment: indoor or outdoor when the sensor dwelled at a place (named places are
+    indoor unless their setting is "Out"; OTHER is outdoor), transit for passages
+    :param segments: DataFrame (from geofence.dwell_segments)
+    :param places: list of places (see geofence.load_places) or PlaceIndex
+    :return: 1-D object array
+    """
+    outdoor = {OTHER} | {place['name'] for place in place_index(places).places if place.get('setting') == "Out"}
+    names = segments['Place'].astype(str).to_numpy()
+    settings = np.where(np.isin(names, list(outdoor)), OUTDOOR, INDOOR).astype(object)
+    settings[~segments['Dwell'].to_numpy(dtype=bool)] = TRANSIT
+    settings[names == NO_FIX] = NO_FIX
+    return settings
+
+
+def exposure_intervals(df, places=None, static_devices=STATIC_DEVICES, particle_size='PM2.5_Env', start=None,
+                       end=None, max_gap=MAX_GAP, min_dwell="10min", df_static=None, device=PERSONAL_DEVICE):
+    """
+    The dose of the personal sensor per interval between consecutive timestamps, with its place and setting and the
+    dose of every static sensor over the same interval. Gaps longer than max_gap and intervals without a reading at
+    both ends are left out. Results are cached per tables, places and parameters.
+    :param df: DataFrame or TableQuery (result table holding the personal sensor)
+    :param places: list of places (see geofence.load_places) or PlaceIndex; None attributes every interval to ALL
+    :param static_devices: list of Device Names (the static sensors to compare with)
+    :param particle_size: Size of particles (column names of df)
+    :param start: start of the window
+    :param end: end of the window
+    :param max_gap: str or Timedelta
+    :param min_dwell: str or Timedelta (shorter stays at a place are transit, see geofence.dwell_segments)
+    :param df_static: DataFrame or TableQuery (table holding the static sensors; None uses df)
+    :param device: str (the personal sensor)
+    :return: DataFrame (Start, End, Hours, Dose in ug/m3 x h, Place, Setting, then '<device> Dose' per static sensor,
+             NaN where that sensor has no reading)
+    """
+    if df_static is None:
+        df_static = df
+    query, static_query = table_query(df), table_query(df_static)
+    tables = (query,) if static_query is query else (query, static_query)
+    key = (tuple(id(table) for table in tables), _places_key(places), tuple(static_devices), particle_size, start,
+           end, str(max_gap), str(min_dwell), device)
+
+    def build():
+        personal = personal_frame(query, device, start, end)
+        times = pd.DatetimeIndex(personal['PT DateTime'])
+        if len(times) < 2:
+            columns = ['Start', 'End', 'Hours', 'Dose', 'Place', 'Setting']
+            return pd.DataFrame(columns=columns + [static + " Dose" for static in static_devices])
+        nanoseconds = _nanoseconds(times, times[0])
+        counted, hours, dose = trapezoid_dose(nanoseconds, personal[particle_size], max_gap)
+        intervals = pd.DataFrame({'Start': times[:-1], 'End': times[1:], 'Hours': hours, 'Dose': dose})
+        if places is None:
+            intervals['Place'] = ALL
+            intervals['Setting'] = ALL
+        else:
+            segments = dwell_segments(query.frame(device, start, end), places, particle_size, max_gap,
+                                      min_dwell)
+            number = np.searchsorted(_nanoseconds(pd.DatetimeIndex(segments['Start']), times[0]),
+                                     nanoseconds[:-1], side='right') - 1
+            number = np.maximum(number, 0)
+            intervals['Place'] = segments['Place'].astype(str).to_numpy()[number]
+            intervals['Setting'] = _settings(segments, places)[number]
+        for static in static_devices:
+            values = static_query.series(static, particle_size, start, end)
+            if not values.index.is_unique:
+                values = values.groupby(level=0).mean()
+            values = values.dropna()
+            interpolated = interpolate_onto(nanoseconds, _nanoseconds(values.index, times[0]),
+                                            values.to_numpy(dtype=np.float64), max_gap)
+            shared, _, static_dose = trapezoid_dose(nanoseconds, interpolated, max_gap)
+            intervals[static + " Dose"] = np.where(shared, static_dose, np.nan)
+        return intervals[counted].reset_index(drop=True)
+
+    return _cached(_INTERVALS, tables, key, build).copy()
+
+
+def exposure_summary(intervals):
+    """
+    Time, dose and mean concentration of the personal sensor per setting and in total, and its dose relative to
+    every static sensor over the intervals both have readings for
+    :param intervals: DataFrame (from exposure_intervals)
+    :return: DataFrame indexed by Setting (Hours, Share of the time, Dose in ug/m3 x h, Mean in ug/m3, then
+             '<device> Ratio' per static sensor: personal dose / static dose)
+    """
+    statics = [column[:-len(" Dose")] for column in intervals.columns if column.endswith(" Dose")]
+    columns = ['Hours', 'Dose']
+    for static in statics:
+        intervals = intervals.assign(**{static + " Shared": np.where(intervals[static + " Dose"].notna(),
+                                                                     intervals['Dose'], np.nan)})
+        columns += [static + " Shared", static + " Dose"]
+    df = intervals.groupby('Setting')[columns].sum()
+    df.loc["Total"] = df.sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df['Share'] = df['Hours'] / df.loc["Total", 'Hours']
+        df['Mean'] = df['Dose'] / df['Hours']
+        for static in statics:
+            df[static + " Ratio"] = df[static + " Shared"] / df[static + " Dose"]
+    return df[['Hours', 'Share', 'Dose', 'Mean'] + [static + " Ratio" for static in statics]]
+
+
+def cumulative_dose(intervals, by_setting=False):
+    """
+    Running dose of the personal sensor and of the static sensors
+    :param intervals: DataFrame (from exposure_intervals)
+    :param by_setting: bool (one running personal dose per setting instead of the static sensors)
+    :return: DataFrame indexed by the end of every interval (ug/m3 x h)
+    """
+    if by_setting:
+        doses = intervals.pivot_table(index='End', columns='Setting', values='Dose', aggfunc='sum', fill_value=0)
+        return doses.cumsum()
+    columns = ['Dose'] + [column for column in intervals.columns if column.endswith(" Dose")]
+    doses = intervals.set_index('End')[columns].fillna(0).cumsum()
+    return doses.rename(columns={'Dose': "Personal"})
@@ -0,0 +1,218 @@
+"""
+This .py file contains the headless figure build: the figures configured in figures.json are rendered with the Agg
+backend (plotly figures through static export) to Figures/build in a process pool, next to (never over) the
+figures of the paper. A figure is skipped when the hash of its input datasets, of figures.json and of the plotting
+source has not changed since it was last built.
+The plotting functions end with show_figure(), which shows the figure interactively, or saves it while a build
+renders it.
+Run from the Analysis folder: python figures.py [Figure_3 ...] [--workers 4] [--force]
+"""
+import argparse
+import ast
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIGURES_FILE = os.path.join(SOURCE_DIR, "figures.json")
+FIGURES_DIR = os.path.join(os.path.dirname(SOURCE_DIR), "Figures", "build")
+HASH_FILE = ".build_hashes.json"
+# Modules holding the figure functions (functions.py loads plotting and geo lazily, so they are listed too)
+PLOTTING_MODULES = ["functions", "plotting", "geo"]
+
+_OUTPUT = {"path": None}
+
+
+@contextmanager
+def render_to(path: str):
+    """
+    Save the next figure passed to show_figure() to a file instead of showing it
+    :param path: str (output file; the extension picks the format, e.g. .svg or .png)
+    """
+    _OUTPUT["path"] = path
+    try:
+        yield path
+    finally:
+        _OUTPUT["path"] = None
+
+
+def show_figure(fig=None):
+    """
+    Show a finished figure, or save it when a build is rendering (see render_to)
+    :param fig: matplotlib Figure or plotly Figure (None for the current matplotlib figure)
+    :return: None
+    """
+    import matplotlib.pyplot as plt
+    path = _OUTPUT["path"]
+    if path is None:
+        if fig is not None and hasattr(fig, 'write_image'):
+            fig.show()
+        else:
+            plt.show()
+        return
+    if fig is not None and hasattr(fig, 'write_image'):
+        # Plotly static export (needs the kaleido package)
+        fig.write_image(path)
+        return
+    fig = plt.gcf() if fig is None else fig
+    fig.savefig(path, bbox_inches='tight')
+    plt.close(fig)
+    return
+
+
+def load_specs(config=FIGURES_FILE):
+    """
+    Load the figure configuration
+    :param config: str (location of figures.json)
+    :return: list of dict
+    """
+    with open(config, 'r') as f:
+        return json.load(f)
+
+
+def source_files(modules=PLOTTING_MODULES):
+    """
+    List the source files of modules of the Analysis folder and of every module of the folder they import
+    :param modules: list of module names
+    :return: list of file locations (sorted)
+    """
+    pending = list(modules)
+    found = set()
+    while pending:
+        fileloc = os.path.join(SOURCE_DIR, pending.pop() + ".py")
+        if fileloc in found or not os.path.exists(fileloc):
+            continue
+        found.add(fileloc)
+        with open(fileloc, 'r', encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                pending.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module is not None and node.level == 0:
+                pending.append(node.module)
+    return sorted(found)
+
+
+def input_hash(spec: dict, results_dir=None, config=FIGURES_FILE):
+    """
+    Hash everything a figure is built from: its configuration, figures.json, the source of the plotting modules
+    (see source_files) and the files (name, size, modification time) of its input datasets, of their appended delta
+    files and of the users sheet
+    :param spec: dict (one figures.json entry)
+    :param results_dir: str
+    :param config: str (location of figures.json)
+    :return: str
+    """
+    from registry import USERS_FILE
+    from storage import RESULTS_DIR, dataset_path, delta_path
+    digest = hashlib.sha1(json.dumps(spec, sort_keys=True).encode())
+    for fileloc in [config] + source_files():
+        with open(fileloc, 'rb') as f:
+            digest.update(f.read())
+    paths = []
+    for data in spec.get("data", {}).values():
+        paths += [dataset_path(data["dataset"], results_dir or RESULTS_DIR),
+                  delta_path(data["dataset"], results_dir or RESULTS_DIR)]
+    if spec.get("users"):
+        paths.append(USERS_FILE)
+    for path in paths:
+        files = [path] if os.path.isfile(path) else sorted(os.path.join(folder, name)
+                                                           for folder, _, names in os.walk(path) for name in names)
+        for file in files:
+            stat = os.stat(file)
+            digest.update(("%s:%d:%d;" % (file, stat.st_size, stat.st_mtime_ns)).encode())
+    return digest.hexdigest()
+
+
+def build_figure(spec: dict, figures_dir=FIGURES_DIR, results_dir=None):
+    """
+    Load the inputs of one figure and render it headless (runs in a worker process)
+    :param spec: dict (one figures.json entry: name, function, format, data, users, ratio, args, size)
+    :param figures_dir: str
+    :param results_dir: str
+    :return: str (output file)
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import functions
+    from registry import USERS_FILE
+    from storage import RESULTS_DIR, load_results
+    kwargs = {}
+    for argument, data in spec.get("data", {}).items():
+        kwargs[argument] = load_results(data["dataset"], devices=data.get("devices"), start=data.get("start"),
+                                        end=data.get("end"), results_dir=results_dir or RESULTS_DIR)
+    if spec.get("users"):
+        df_users = pd.read_excel(USERS_FILE, engine='openpyxl')
+        kwargs["df_users"] = df_users[df_users['In'].notna()].reset_index(drop=True)
+    if "ratio" in spec:
+        # Ratio figures take the long-format I/O ratio table of their first input
+        ratio = spec["ratio"]
+        kwargs["df"], kwargs["df_users"] = functions.io_ratio_table(kwargs["df"], kwargs["df_users"],
+                                                                    ratio["particle_size"], ratio["start"],
+                                                                    ratio["end"])
+    kwargs.update(spec.get("args", {}))
+    path = os.path.join(figures_dir, spec["name"] + "." + spec.get("format", "svg"))
+    with plt.rc_context({'figure.figsize': spec.get("size", [19.2, 10.8])}), render_to(path):
+        getattr(functions, spec["function"])(**kwargs)
+    plt.close('all')
+    return path
+
+
+def build_figures(names=None, workers=None, force=False, figures_dir=FIGURES_DIR, results_dir=None,
+                  config=FIGURES_FILE):
+    """
+    Render the configured figures whose inputs changed, in parallel
+    :param names: list of figure names (None builds every configured figure)
+    :param workers: number of worker processes (None uses every core)
+    :param force: bool (rebuild even if the inputs did not change)
+    :param figures_dir: str
+    :param results_dir: str
+    :param config: str (location of figures.json)
+    :return built: list of output files
+    """
+    specs = [spec for spec in load_specs(config) if names is None or spec["name"] in names]
+    hash_path = os.path.join(figures_dir, HASH_FILE)
+    hashes = {}
+    if os.path.exists(hash_path):
+        with open(hash_path, 'r') as f:
+            hashes = json.load(f)
+    stale = {}
+    for spec in specs:
+        digest = input_hash(spec, results_dir, config)
+        output = os.path.join(figures_dir, spec["name"] + "." + spec.get("format", "svg"))
+        if force or hashes.get(spec["name"]) != digest or not os.path.exists(output):
+            stale[spec["name"]] = (spec, digest)
+        else:
+            print("Unchanged " + spec["name"])
+    built = []
+    if stale:
+        os.makedirs(figures_dir, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(build_figure, spec, figures_dir, results_dir): name
+                       for name, (spec, _) in stale.items()}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    built.append(future.result())
+                except Exception as error:
+                    # One broken figure does not stop the others
+                    print("Failed " + name + ": " + repr(error))
+                    continue
+                hashes[name] = stale[name][1]
+                print("Built " + built[-1])
+        with open(hash_path, 'w') as f:
+            json.dump(hashes, f, indent=2)
+    return built
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the configured figures headless")
+    parser.add_argument("names", nargs="*", help="figures to build (default: all of figures.json)")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="rebuild figures whose inputs did not change")
+    args = parser.parse_args()
+    build_figures(args.names or None, args.workers, args.force)
@@ -0,0 +1,131 @@
+"""
+This .py file contains the map features: Voronoi and interpolated PM maps of the sensor network, drawn from the
+cached weights of spatial.py. The geo stack (geopandas, geoplot, contextily) is only imported for the clip area and
+the basemap tiles.
+"""
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib import animation, colors
+from figures import show_figure
+from query import table_query
+from registry import device_info
+from resample import regular_grid
+from spatial import basemap, sensor_engine
+
+
+def draw_map(engine, image, ax=None, norm=None, cmap='Reds', with_basemap=True, alpha=.7):
+    """
+    Draw one rendered map with the sensor locations, over the basemap
+    :param engine: spatial.SpatialEngine
+    :param image: 2-D array (rendered by engine.render)
+    :param ax: matplotlib Axes (None creates a figure)
+    :param norm: matplotlib Normalize (None scales to the image)
+    :param cmap: str
+    :param with_basemap: bool (draw the basemap tiles under the map)
+    :param alpha: float
+    :return: AxesImage (call set_data to draw another timestep)
+    """
+    if ax is None:
+        ax = plt.figure().add_subplot(111)
+    if with_basemap:
+        tiles, tiles_extent = basemap(engine.extent)
+        ax.imshow(tiles, extent=tiles_extent, interpolation='bilinear', zorder=0)
+    mapped = ax.imshow(image, extent=engine.extent, origin='lower', cmap=cmap, norm=norm, alpha=alpha,
+                       interpolation='nearest', zorder=1)
+    ax.scatter(engine.sensor_x, engine.sensor_y, s=8, c='black', zorder=2)
+    ax.set_xlim(engine.extent[0], engine.extent[1])
+    ax.set_ylim(engine.extent[2], engine.extent[3])
+    ax.set_axis_off()
+    plt.colorbar(mapped, ax=ax)
+    return mapped
+
+
+def voronoi_geoplot(df_sub, particle_size='PM2.5_Std'):
+    """
+    Draw the Voronoi map of one timestep on the basemap, clipped to the contiguous USA
+    :param df_sub: Dataframe (one row per sensor with Longitude, Latitude and particle_size)
+    :param particle_size: Size of particles (column names of df)
+    :return: None (shows plots)
+    """
+    engine = sensor_engine(df_sub['Longitude'], df_sub['Latitude'], "voronoi", clip_path=None)
+    draw_map(engine, engine.render(df_sub[particle_size].to_numpy()))
+    show_figure()
+    return
+
+
+def voronoi_scipy(df, particle_size='PM2.5_Std'):
+    """
+    Draw the Voronoi map of one timestep, without basemap
+    :param df: Dataframe (one row per sensor with Longitude, Latitude and particle_size)
+    :param particle_size: Size of particles (column names of df)
+    :return: None (shows plots)
+    """
+    engine = sensor_engine(df['Longitude'], df['Latitude'], "voronoi")
+    draw_map(engine, engine.render(df[particle_size].to_numpy()), cmap='Blues_r', with_basemap=False)
+    show_figure()
+    return
+
+
+def map_devices(df, particle_size: str):
+    """
+    Pick the sensors of a smoke map: outdoor sensors with registered coordinates (public sensors only report
+    PM2.5_Std)
+    :param df: DataFrame or TableQuery (result table)
+    :param particle_size: Size of particles (column names of df)
+    :return: list of Device Names
+    """
+    devices = []
+    for device in table_query(df).slices:
+        info = device_info(device)
+        if info['In or Out'] == 'Out' and not np.isnan(info['Latitude']) \
+                and (not info['Public'] or particle_size == 'PM2.5_Std'):
+            devices.append(device)
+    return devices
+
+
+def smoke_map_animation(df, particle_size: str, start, end, method="idw", devices=None, path=None, with_basemap=True,
+                        fps=10, resolution=200):
+    """
+    Animate the interpolated map of every timestep of a result table, on its regular time grid (timesteps without
+    any reading are blank frames). The weights are built once for the sensor set and every frame is rendered up
+    front, one weight-matrix x readings product per pattern of missing sensors.
+    :param df: DataFrame (result table at one resolution, e.g. the 10-minute averages)
+    :param particle_size: Size of particles (column names of df)
+    :param start: start of the window
+    :param end: end of the window
+    :param method: "voronoi", "idw" or "kriging"
+    :param devices: list of Device Names (None: outdoor sensors with registered coordinates, see map_devices)
+    :param path: str (save the animation to this file, e.g. .gif or .mp4; None shows it)
+    :param with_basemap: bool
+    :param fps: int (frames per second)
+    :param resolution: int (pixels along the longer side of the map)
+    :return: matplotlib FuncAnimation
+    """
+    if devices is None:
+        devices = map_devices(df, particle_size)
+    if not devices:
+        raise ValueError("No sensors with registered coordinates to map")
+    longitudes = [device_info(device)['Longitude'] for device in devices]
+    latitudes = [device_info(device)['Latitude'] for device in devices]
+    engine = sensor_engine(longitudes, latitudes, method, resolution)
+    grid, readings = regular_grid(df).matrix(devices, particle_size, start, end)
+    norm = colors.Normalize(vmin=0, vmax=np.nanpercentile(readings, 99) if np.isfinite(readings).any() else 1)
+    fig = plt.figure()
+    ax = fig.add_subplot(111)
+    images = engine.render(readings)
+    mapped = draw_map(engine, images[0], ax, norm, with_basemap=with_basemap)
+    title = ax.set_title(str(grid[0]))
+
+    def update(frame):
+        mapped.set_data(images[frame])
+        title.set_text(str(grid[frame]))
+        return mapped, title
+
+    animated = animation.FuncAnimation(fig, update, frames=len(grid), interval=1000 / fps)
+    if path is None:
+        show_figure(fig)
+    else:
+        animated.save(path, writer='pillow' if path.endswith('.gif') else None, fps=fps)
+        plt.close(fig)
+    return animated
+
@@ -0,0 +1,255 @@
+"""
+This .py file contains the geofences of the moving personal sensor (Breakout-02): places are polygons, boxes or
+circles; GPS samples are assigned to places with vectorized point-in-polygon and radius tests behind a grid hash, then
+grouped into dwell segments with their time-weighted exposure.
+"""
+import json
+import os
+import numpy as np
+import pandas as pd
+
+LONGLAT_FILE = "Results/LongLat.csv"
+OTHER = "Other"
+NO_FIX = "No fix"
+METERS_PER_DEGREE = 111320.0
+
+
+def load_places(path=LONGLAT_FILE):
+    """
+    Load the places of the personal sensor. CSV files hold one box per row (Location, Lat start, Long start,
+    Lat end, Long end); JSON files hold a list of {"name", "polygon": [[longitude, latitude], ...]} or
+    {"name", "latitude", "longitude", "radius" (meters)}, with an optional "setting" ("In" or "Out", see
+    exposure.py). Earlier places win where places overlap.
+    :param path: str (.csv or .json)
+    :return places: list of dict (name, polygon as an (n, 2) longitude/latitude array, or latitude, longitude,
+                    radius; setting when given)
+    """
+    if os.path.splitext(path)[1].lower() == '.json':
+        with open(path, 'r') as f:
+            entries = json.load(f)
+        places = []
+        for entry in entries:
+            if 'polygon' in entry:
+                places.append({'name': entry['name'], 'polygon': np.asarray(entry['polygon'], dtype=np.float64)})
+            else:
+                places.append({'name': entry['name'], 'latitude': float(entry['latitude']),
+                               'longitude': float(entry['longitude']), 'radius': float(entry['radius'])})
+            if 'setting' in entry:
+                places[-1]['setting'] = entry['setting']
+        return places
+    df = pd.read_csv(path)
+    return [box_place(row['Location'], row['Lat start'], row['Long start'], row['Lat end'], row['Long end'])
+            for _, row in df.iterrows()]
+
+
+def box_place(name: str, lat_start, long_start, lat_end, long_end):
+    """
+    Build a place from two opposite corners of a box, given in any order
+    :param name: str
+    :return: dict (see load_places)
+    """
+    south, north = sorted([float(lat_start), float(lat_end)])
+    west, east = sorted([float(long_start), float(long_end)])
+    return {'name': name, 'polygon': np.array([[west, south], [east, south], [east, north], [west, north]])}
+
+
+def points_in_polygon(x, y, polygon):
+    """
+    Even-odd ray casting over all points at once (one pass per polygon edge)
+    :param x: 1-D float array (longitudes)
+    :param y: 1-D float array (latitudes)
+    :param polygon: (n, 2) array of vertices (longitude, latitude)
+    :return: boolean array
+    """
+    inside = np.zeros(len(x), dtype=bool)
+    xs = polygon[:, 0]
+    ys = polygon[:, 1]
+    j = len(polygon) - 1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in range(len(polygon)):
+            straddles = (ys[i] > y) != (ys[j] > y)
+            inside ^= straddles & (x < (xs[j] - xs[i]) * (y - ys[i]) / (ys[j] - ys[i]) + xs[i])
+            j = i
+    return inside
+
+
+def place_bounds(place: dict):
+    """
+    Bounding box of a place
+    :param place: dict (see load_places)
+    :return: tuple (west, south, east, north) in degrees
+    """
+    if 'polygon' in place:
+        return tuple(place['polygon'].min(axis=0)) + tuple(place['polygon'].max(axis=0))
+    d_lat = place['radius'] / METERS_PER_DEGREE
+    d_long = d_lat / np.cos(np.radians(place['latitude']))
+    return (place['longitude'] - d_long, place['latitude'] - d_lat,
+            place['longitude'] + d_long, place['latitude'] + d_lat)
+
+
+class PlaceIndex:
+    """
+    Grid hash over the places: every sample only runs the exact test of the places whose bounding box touches its
+    grid cell
+    """
+
+    def __init__(self, places: list, cell_size=0.005):
+        """
+        :param places: list of dict (see load_places)
+        :param cell_size: float (grid cell size in degrees)
+        """
+        self.places = list(places)
+        self.names = [place['name'] for place in self.places] + [OTHER, NO_FIX]
+        self.cell_size = cell_size
+        bounds = np.array([place_bounds(place) for place in self.places]).reshape(-1, 4)
+        if len(bounds):
+            self.origin = np.floor(bounds[:, :2].min(axis=0) / cell_size) * cell_size
+            self.cells = np.floor((bounds[:, 2:].max(axis=0) - self.origin) / cell_size).astype(int) + 1
+        else:
+            self.origin = np.zeros(2)
+            self.cells = np.ones(2, dtype=int)
+        # occupied[place, cell]: the bounding box of the place touches the cell
+        self.occupied = np.zeros((len(self.places), self.cells[0] * self.cells[1]), dtype=bool)
+        for number, (west, south, east, north) in enumerate(bounds):
+            low = np.floor((np.array([west, south]) - self.origin) / cell_size).astype(int)
+            high = np.floor((np.array([east, north]) - self.origin) / cell_size).astype(int)
+            columns, rows = np.meshgrid(np.arange(low[0], high[0] + 1), np.arange(low[1], high[1] + 1))
+            self.occupied[number, (columns * self.cells[1] + rows).ravel()] = True
+
+    def locate(self, latitudes, longitudes):
+        """
+        Assign samples to places
+        :param latitudes: array of float
+        :param longitudes: array of float
+        :return: 1-D int array (position in self.names; OTHER outside every place, NO_FIX for missing or zero
+                 positions)
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        codes = np.full(len(latitudes), len(self.places), dtype=np.int64)
+        no_fix = np.isnan(latitudes) | np.isnan(longitudes) | ((latitudes == 0) & (longitudes == 0))
+        codes[no_fix] = len(self.places) + 1
+        cell = np.floor((np.column_stack((longitudes, latitudes)) - self.origin) / self.cell_size)
+        on_grid = ~no_fix & (cell >= 0).all(axis=1) & (cell < self.cells).all(axis=1)
+        cell_ids = np.zeros(len(latitudes), dtype=np.int64)
+        cell_ids[on_grid] = cell[on_grid, 0].astype(np.int64) * self.cells[1] + cell[on_grid, 1].astype(np.int64)
+        unassigned = on_grid.copy()
+        for number, place in enumerate(self.places):
+            candidates = np.flatnonzero(unassigned & self.occupied[number, cell_ids])
+            if not len(candidates):
+                continue
+            if 'polygon' in place:
+                inside = points_in_polygon(longitudes[candidates], latitudes[candidates], place['polygon'])
+            else:
+                d_north = (latitudes[candidates] - place['latitude']) * METERS_PER_DEGREE
+                d_east = (longitudes[candidates] - place['longitude']) * METERS_PER_DEGREE \
+                    * np.cos(np.radians(place['latitude']))
+                inside = d_north ** 2 + d_east ** 2 <= place['radius'] ** 2
+            codes[candidates[inside]] = number
+            unassigned[candidates[inside]] = False
+        return codes
+
+
+def place_index(places):
+    """
+    :param places: list of dict (see load_places) or PlaceIndex
+    :return: PlaceIndex
+    """
+    return places if isinstance(places, PlaceIndex) else PlaceIndex(places)
+
+
+def classify(df, places):
+    """
+    Name the place of every sample
+    :param df: DataFrame (with Latitude and Longitude)
+    :param places: list of dict (see load_places) or PlaceIndex
+    :return: categorical Series aligned with df (place names, OTHER or NO_FIX)
+    """
+    index = place_index(places)
+    codes = index.locate(df['Latitude'], df['Longitude'])
+    return pd.Series(pd.Categorical.from_codes(codes, categories=index.names), index=df.index, name='Place')
+
+
+def split_by_place(df, places):
+    """
+    Split the samples of the personal sensor by place
+    :param df: DataFrame (with Latitude and Longitude)
+    :param places: list of dict (see load_places) or PlaceIndex
+    :return: dict of place name -> DataFrame (every place, OTHER and NO_FIX, possibly empty)
+    """
+    index = place_index(places)
+    codes = index.locate(df['Latitude'], df['Longitude'])
+    return {name: df[codes == number] for number, name in enumerate(index.names)}
+
+
+def dwell_segments(df, places, particle_size='PM2.5_Env', max_gap="30min", min_dwell="10min"):
+    """
+    Group consecutive samples at the same place into segments. A segment ends when the place changes or when no
+    sample was logged for more than max_gap. Every sample stands for the time until the next one (at most max_gap);
+    samples sharing a timestamp (several positions in one averaging bucket) share that time.
+    :param df: DataFrame (samples of the personal sensor with PT DateTime, Latitude, Longitude and particle_size)
+    :param places: list of dict (see load_places) or PlaceIndex
+    :param particle_size: Size of particles (column names of df)
+    :param max_gap: str or Timedelta
+    :param min_dwell: str or Timedelta (shorter segments are passages, Dwell is False)
+    :return: DataFrame (Place, Start, End, Hours, Samples, Dwell, Covered hours with a reading, Exposure in
+             ug/m3 x h, Mean in ug/m3 weighted by time)
+    """
+    columns = ['Place', 'Start', 'End', 'Hours', 'Samples', 'Dwell', 'Covered', 'Exposure', 'Mean']
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+    index = place_index(places)
+    df = df.sort_values('PT DateTime', kind='stable')
+    times = pd.DatetimeIndex(df['PT DateTime'])
+    nanoseconds = np.asarray((times - times[0]) // pd.Timedelta(1, 'ns'), dtype=np.int64)
+    gap = pd.Timedelta(max_gap).value
+    codes = index.locate(df['Latitude'], df['Longitude'])
+    unique_times, inverse, counts = np.unique(nanoseconds, return_inverse=True, return_counts=True)
+    steps = np.diff(unique_times)
+    last = np.median(steps) if len(steps) else 0
+    durations = np.minimum(np.append(steps, last), gap)
+    hours = durations[inverse] / counts[inverse] / 3.6e12
+    values = df[particle_size].to_numpy(dtype=np.float64)
+    valid = ~np.isnan(values)
+    starts = np.flatnonzero(np.r_[True, (codes[1:] != codes[:-1]) | (np.diff(nanoseconds) > gap)])
+    covered = np.add.reduceat(np.where(valid, hours, 0), starts)
+    exposure = np.add.reduceat(np.where(valid, values * hours, 0), starts)
+    ends = np.r_[starts[1:], len(codes)] - 1
+    segments = pd.DataFrame({'Place': pd.Categorical.from_codes(codes[starts], categories=index.names),
+                             'Start': times[starts], 'End': times[ends],
+                             'Hours': np.add.reduceat(hours, starts), 'Samples': ends - starts + 1})
+    segments['Dwell'] = segments['End'] - segments['Start'] + pd.to_timedelta(durations[inverse[ends]]) \
+        >= pd.Timedelta(min_dwell)
+    segments['Covered'] = covered
+    segments['Exposure'] = exposure
+    with np.errstate(divide='ignore', invalid='ignore'):
+        segments['Mean'] = np.where(covered > 0, exposure / covered, np.nan)
+    return segments[columns]
+
+
+def transitions(segments, dwell_only=True):
+    """
+    Count the moves between places
+    :param segments: DataFrame (from dwell_segments)
+    :param dwell_only: bool (skip passages, so A -> passage through B -> C counts as A -> C)
+    :return: DataFrame (From, To, Count), most frequent first
+    """
+    places = segments[segments['Dwell']] if dwell_only else segments
+    places = places[places['Place'] != NO_FIX]['Place'].astype(str).to_numpy()
+    moves = pd.DataFrame({'From': places[:-1], 'To': places[1:]})
+    moves = moves[moves['From'] != moves['To']]
+    return moves.groupby(['From', 'To']).size().rename('Count').reset_index() \
+        .sort_values('Count', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def place_exposure(segments):
+    """
+    Time spent and time-weighted exposure per place
+    :param segments: DataFrame (from dwell_segments)
+    :return: DataFrame indexed by Place (Hours, Share of the logged time, Exposure in ug/m3 x h, Mean in ug/m3)
+    """
+    df = segments.groupby('Place', observed=True)[['Hours', 'Covered', 'Exposure']].sum()
+    df['Share'] = df['Hours'] / df['Hours'].sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df['Mean'] = np.where(df['Covered'] > 0, df['Exposure'] / df['Covered'], np.nan)
+    return df[['Hours', 'Share', 'Exposure', 'Mean']]
@@ -0,0 +1,320 @@
+"""
+This .py file contains the incremental ingest: only rows appended to the raw logs since the previous run are read,
+and only the device-day partitions they touch are rewritten. Live batches go through RunningTotals, which keeps the
+recent totals in memory and appends only the touched buckets.
+"""
+import json
+import os
+import pandas as pd
+from calibration import apply_calibration, load_coefficients, mark_applied, recalibrate_results
+from ingest import read_device_log_tail
+from preprocessing import get_device_location, reformat
+from qc import QCStream
+from rollup import (ROLLUP_FREQUENCIES, GROUP_KEYS, TOTALS_DATASET, bucket_totals, frame_to_totals, rollup_totals,
+                    sort_frequencies, totals_to_frame)
+from storage import (RESULTS_DIR, append_delta, compact_results, dataset_path, delta_files, drop_partitions,
+                     load_results, write_results)
+from timestamps import TIMEZONE, floor_timestamps, to_timedelta
+
+WATERMARK_FILE = "watermarks.json"
+
+
+def load_watermarks(results_dir=RESULTS_DIR):
+    """
+    Load the per-file watermarks (byte offset, device and first/last timestamp already processed)
+    :param results_dir: str
+    :return watermarks: dict of file name -> dict
+    """
+    path = os.path.join(results_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_watermarks(watermarks: dict, results_dir=RESULTS_DIR):
+    """
+    Save the per-file watermarks (written to a temporary file first so a crash never leaves a partial file)
+    :param watermarks: dict of file name -> dict
+    :param results_dir: str
+    :return: None
+    """
+    path = os.path.join(results_dir, WATERMARK_FILE)
+    os.makedirs(results_dir, exist_ok=True)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(watermarks, f, indent=2)
+    os.replace(path + ".tmp", path)
+    return
+
+
+def file_watermark(device_name: str, df, offset: int, watermark=None, stream=None):
+    """
+    Advance the watermark of one log past rows that were stored
+    :param device_name: str
+    :param df: DataFrame (reformatted rows read up to offset)
+    :param offset: int (byte offset after the last complete line read)
+    :param watermark: dict (previous watermark of the file; None when the file was read from the start)
+    :param stream: qc.QCStream (QC state of the log, kept with the watermark: the rows read but held back and
+                   the end of the stored rows)
+    :return watermark: dict (offset, device_name, first_timestamp, last_timestamp, qc)
+    """
+    watermark = dict(watermark or {}, offset=offset)
+    if stream is not None:
+        watermark['qc'] = stream.state()
+    if df.empty:
+        return watermark
+    first_timestamp, last_timestamp = df['PT DateTime'].min(), df['PT DateTime'].max()
+    if watermark.get('first_timestamp') is not None:
+        first_timestamp = min(first_timestamp, pd.Timestamp(watermark['first_timestamp']))
+    if watermark.get('last_timestamp') is not None:
+        last_timestamp = max(last_timestamp, pd.Timestamp(watermark['last_timestamp']))
+    watermark.update(device_name=device_name, first_timestamp=first_timestamp.isoformat(),
+                     last_timestamp=last_timestamp.isoformat())
+    return watermark
+
+
+def drop_stale_partitions(watermark: dict, freqs=ROLLUP_FREQUENCIES, results_dir=RESULTS_DIR):
+    """
+    Delete what was stored from the previous content of a truncated or replaced log: the partitions of its device
+    between the days of the first and last timestamp of its watermark, in the bucket totals and every frequency
+    :param watermark: dict (watermark of the previous content)
+    :param freqs: list of frequency names
+    :param results_dir: str
+    :return dropped: set of (device, date) partitions that were deleted
+    """
+    if watermark.get('device_name') is None or watermark.get('last_timestamp') is None:
+        return set()
+    start_date = None
+    if watermark.get('first_timestamp') is not None:
+        start_date = pacific_dates([pd.Timestamp(watermark['first_timestamp'])])[0]
+    end_date = pacific_dates([pd.Timestamp(watermark['last_timestamp'])])[0]
+    dropped = set()
+    for name in [TOTALS_DATASET] + list(freqs):
+        dropped |= drop_partitions(name, watermark['device_name'], start_date, end_date, results_dir)
+    return dropped
+
+
+def pacific_dates(times):
+    """
+    Find the Pacific calendar day (partition key) of timestamps
+    :param times: Index or Series of tz-aware datetimes
+    :return: array of str (YYYY-MM-DD)
+    """
+    return pd.Series(times).dt.tz_convert(TIMEZONE).dt.date.astype(str).values
+
+
+def store_frame(device_name: str, df, freqs=ROLLUP_FREQUENCIES, results_dir=RESULTS_DIR, calibration=None,
+                merge=True):
+    """
+    Add reformatted rows of one device to the result store (see store_totals)
+    :param device_name: str
+    :param df: DataFrame (reformatted data of this device)
+    :param freqs: list of frequency names
+    :param results_dir: str
+    :param calibration: dict (coefficient store version, see calibration.load_coefficients; None uses the active one)
+    :param merge: bool (False when the device has nothing stored yet)
+    :return touched: set of (device, date) partitions that were rewritten
+    """
+    freqs = sort_frequencies(freqs)
+    sums, counts = bucket_totals(df, freqs[0])
+    return store_totals(device_name, sums, counts, freqs, results_dir, calibration, merge)
+
+
+def store_totals(device_name: str, sums, counts, freqs=ROLLUP_FREQUENCIES, results_dir=RESULTS_DIR,
+                 calibration=None, merge=True):
+    """
+    Add finest bucket totals of one device to the result store. The totals of every touched day are merged with
+    the stored ones (so partially filled 10-minute/hour buckets stay exact), then all frequencies are recomputed
+    for those days and only their partitions are rewritten.
+    :param device_name: str
+    :param sums: DataFrame (sums indexed by GROUP_KEYS, bucketed at the finest of freqs)
+    :param counts: DataFrame (counts, same index)
+    :param freqs: list of frequency names
+    :param results_dir: str
+    :param calibration: dict (coefficient store version, see calibration.load_coefficients; None uses the active one)
+    :param merge: bool, or set of dates (YYYY-MM-DD) whose stored totals are merged; any other touched day is
+                  overwritten
+    :return touched: set of (device, date) partitions that were rewritten
+    """
+    freqs = sort_frequencies(freqs)
+    dates = pacific_dates(sums.index.get_level_values('PT DateTime'))
+    touched = {(device_name, date) for date in set(dates)}
+    merged = set(dates) if merge is True else set(merge or ()) & set(dates)
+    if merged and (os.path.exists(dataset_path(TOTALS_DATASET, results_dir))
+                   or delta_files(TOTALS_DATASET, results_dir)):
+        df_old = load_results(TOTALS_DATASET, devices=device_name, start=min(merged) + " 00:00",
+                              end=max(merged) + " 23:59:59.999999", results_dir=results_dir)
+        if not df_old.empty:
+            df_old = df_old[pd.Series(pacific_dates(df_old['PT DateTime'])).isin(sorted(merged)).values]
+            sums_old, counts_old = frame_to_totals(df_old)
+            sums = pd.concat([sums_old, sums]).groupby(level=GROUP_KEYS).sum()
+            counts = pd.concat([counts_old, counts]).groupby(level=GROUP_KEYS).sum()
+    write_results(totals_to_frame(sums, counts), TOTALS_DATASET, results_dir, partitions=touched)
+    for freq, df_final in rollup_totals(sums, counts, freqs).items():
+        write_results(apply_calibration(df_final, calibration), freq, results_dir, partitions=touched)
+    return touched
+
+
+class RunningTotals:
+    """
+    Finest bucket totals of the recent coarsest buckets (hours) of every device, kept in memory between the batches
+    of the live-ingest server. A batch of any number of devices is merged into them and only the buckets it
+    touched are written, as one delta file per dataset (see storage.append_delta), so a flush neither reads stored
+    totals back nor rewrites whole device-days. Hours older than keep before the newest one are evicted; the stored
+    totals of a device-hour that is not in memory are read once, when a (late) record reaches it.
+    """
+
+    def __init__(self, freqs=ROLLUP_FREQUENCIES, results_dir=RESULTS_DIR, keep="1h"):
+        """
+        :param freqs: list of frequency names
+        :param results_dir: str
+        :param keep: str or Timedelta (how long an hour stays in memory after a newer one started)
+        """
+        self.freqs = sort_frequencies(freqs)
+        self.results_dir = results_dir
+        self.keep = to_timedelta(keep)
+        self.hours = {}
+        self.newest = None
+
+    def add(self, df, calibration=None):
+        """
+        Merge a batch into the running totals and append the buckets it touched to the result store
+        :param df: DataFrame (reformatted data of any number of devices)
+        :param calibration: dict (coefficient store version, see calibration.load_coefficients; None uses the active one)
+        :return touched: set of (device, date) partitions that received rows
+        """
+        if df.empty:
+            return set()
+        sums, counts = bucket_totals(df, self.freqs[0])
+        times = sums.index.get_level_values('PT DateTime')
+        hours = pd.DatetimeIndex(floor_timestamps(pd.Series(times), self.freqs[-1]))
+        devices = sums.index.get_level_values('Device Name')
+        self._load(hours, devices)
+        totals = []
+        finals = {freq: [] for freq in self.freqs}
+        for hour in hours.unique():
+            rows = hours == hour
+            held_sums, held_counts, held_devices = self.hours.get(hour, (None, None, set()))
+            hour_sums = pd.concat([held_sums, sums[rows]]).groupby(level=GROUP_KEYS).sum()
+            hour_counts = pd.concat([held_counts, counts[rows]]).groupby(level=GROUP_KEYS).sum()
+            batch_devices = devices[rows].unique()
+            self.hours[hour] = (hour_sums, hour_counts, held_devices | set(batch_devices))
+            totals.append(totals_to_frame(hour_sums.reindex(sums.index[rows]),
+                                          hour_counts.reindex(sums.index[rows])))
+            # Only devices of the batch are rolled up, and only the buckets holding its rows are kept
+            batch = hour_sums.index.get_level_values('Device Name').isin(batch_devices)
+            for freq, df_final in rollup_totals(hour_sums[batch], hour_counts[batch], self.freqs).items():
+                buckets = pd.MultiIndex.from_arrays([devices[rows], floor_timestamps(pd.Series(times[rows]), freq)])
+                keys = pd.MultiIndex.from_arrays([df_final['Device Name'], df_final['PT DateTime']])
+                finals[freq].append(df_final[keys.isin(buckets)])
+        append_delta(pd.concat(totals, ignore_index=True), TOTALS_DATASET, self.results_dir)
+        for freq in self.freqs:
+            append_delta(apply_calibration(pd.concat(finals[freq], ignore_index=True), calibration), freq,
+                         self.results_dir)
+        self.newest = hours.max() if self.newest is None else max(self.newest, hours.max())
+        for hour in [hour for hour in self.hours if hour < self.newest - self.keep]:
+            del self.hours[hour]
+        return set(zip(devices, pacific_dates(times)))
+
+    def _load(self, hours, devices):
+        """
+        Read the stored totals of the device-hours of a batch that are not in memory, in one read. Hours after the
+        newest one seen are skipped: only these running totals write them.
+        :param hours: DatetimeIndex (hour of every batch bucket)
+        :param devices: Index (device of every batch bucket)
+        :return: None
+        """
+        wanted = [(device, hour) for device, hour in pd.MultiIndex.from_arrays([devices, hours]).unique()
+                  if device not in self.hours.get(hour, (None, None, ()))[2]
+                  and (self.newest is None or hour <= self.newest)]
+        if not wanted:
+            return
+        for hour in {hour for _, hour in wanted}:
+            # Device-hours are looked up once, whether or not anything was stored for them
+            held_sums, held_counts, held_devices = self.hours.get(hour, (None, None, set()))
+            self.hours[hour] = (held_sums, held_counts, held_devices | {device for device, h in wanted if h == hour})
+        if not (os.path.exists(dataset_path(TOTALS_DATASET, self.results_dir))
+                or delta_files(TOTALS_DATASET, self.results_dir)):
+            return
+        first, last = min(hour for _, hour in wanted), max(hour for _, hour in wanted)
+        df_old = load_results(TOTALS_DATASET, devices=sorted({device for device, _ in wanted}), start=first,
+                              end=last + to_timedelta(self.freqs[-1]) - pd.Timedelta(1, 'ns'),
+                              results_dir=self.results_dir)
+        if df_old.empty:
+            return
+        old_hours = pd.DatetimeIndex(floor_timestamps(df_old['PT DateTime'], self.freqs[-1]))
+        df_old = df_old[pd.MultiIndex.from_arrays([df_old['Device Name'], old_hours]).isin(wanted)]
+        old_sums, old_counts = frame_to_totals(df_old)
+        old_hours = pd.DatetimeIndex(floor_timestamps(pd.Series(old_sums.index.get_level_values('PT DateTime')),
+                                                      self.freqs[-1]))
+        for hour in old_hours.unique():
+            rows = old_hours == hour
+            held_sums, held_counts, held_devices = self.hours[hour]
+            self.hours[hour] = (pd.concat([held_sums, old_sums[rows]]), pd.concat([held_counts, old_counts[rows]]),
+                                held_devices)
+        return
+
+    def compact(self):
+        """
+        Fold the delta files of the bucket totals and every frequency into their partitions (see
+        storage.compact_results)
+        :return compacted: set of (device, date) partitions that were rewritten
+        """
+        compacted = set()
+        for name in [TOTALS_DATASET] + self.freqs:
+            compacted |= compact_results(name, self.results_dir)
+        return compacted
+
+
+def update_device(fileloc: str, watermark: dict, freqs=ROLLUP_FREQUENCIES, results_dir=RESULTS_DIR,
+                  calibration=None):
+    """
+    Process the rows appended to one device log since its watermark (see store_frame)
+    :param fileloc: str (file location)
+    :param watermark: dict (previous watermark of this file, empty on the first run)
+    :param freqs: list of frequency names
+    :param results_dir: str
+    :param calibration: dict (coefficient store version, see calibration.load_coefficients; None uses the active one)
+    :return watermark: dict (updated watermark)
+    :return touched: set of (device, date) partitions that were rewritten or deleted
+    """
+    offset = watermark.get('offset', 0)
+    dropped = set()
+    if os.path.getsize(fileloc) < offset:
+        # The file was truncated or replaced: what its old content wrote is deleted and it is read from the start
+        dropped = drop_stale_partitions(watermark, freqs, results_dir)
+        watermark, offset = {}, 0
+    # The rows QC held back last time are flagged with the new ones, as if the log were read at once
+    stream = QCStream(state=watermark.get('qc'))
+    device_name, df, end_offset = read_device_log_tail(fileloc, offset)
+    if not df.empty:
+        device_name, df = get_device_location(df, device_name)
+        df = reformat(df, device_name, stream)
+    if df.empty:
+        return file_watermark(device_name, df, end_offset, watermark, stream), dropped
+    touched = store_frame(device_name, df, freqs, results_dir, calibration, merge=offset > 0)
+    return file_watermark(device_name, df, end_offset, watermark, stream), touched | dropped
+
+
+def run_incremental(filelocs: list, freqs=ROLLUP_FREQUENCIES, results_dir=RESULTS_DIR):
+    """
+    Bring the Parquet results up to date with every device log
+    :param filelocs: list of file locations (Beta/Breakout logs)
+    :param freqs: list of frequency names
+    :param results_dir: str
+    :return touched: set of (device, date) partitions that were rewritten
+    """
+    watermarks = load_watermarks(results_dir)
+    # Stored days are brought to the current coefficients first, so new partitions never mix versions
+    calibration = load_coefficients()
+    recalibrate_results(freqs, results_dir)
+    touched = set()
+    for fileloc in filelocs:
+        key = os.path.basename(fileloc)
+        watermarks[key], touched_device = update_device(fileloc, watermarks.get(key, {}), freqs, results_dir,
+                                                        calibration)
+        save_watermarks(watermarks, results_dir)
+        touched |= touched_device
+        print("Updated " + fileloc + ": " + str(len(touched_device)) + " partitions")
+    mark_applied(freqs, calibration, results_dir)
+    return touched
@@ -0,0 +1,296 @@
+"""
+This .py file contains the readers that parse raw Beta/Breakout sensor logs into typed DataFrames. Both CSV
+backends get the same record lines: device-name and header lines written after a restart are dropped, malformed
+lines (wrong number of fields) are dropped and counted, and garbage values are coerced to NaN.
+"""
+import io
+import logging
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+BREAKOUT_COLUMNS = ['Date', 'Time', 'Battery', 'Fix', 'Latitude', 'Longitude', 'Dp>0.3', 'Dp>0.5', 'Dp>1.0',
+                    'Dp>2.5', 'Dp>5.0', 'Dp>10.0', 'PM1_Std', 'PM2.5_Std', 'PM10_Std', 'PM1_Env', 'PM2.5_Env',
+                    'PM10_Env']
+BETA_COLUMNS = BREAKOUT_COLUMNS + ['Temp(C)', 'RH(%)', 'P(hPa)', 'Alti(m)']
+STRING_COLUMNS = ['Date', 'Time']
+COLUMN_DTYPES = {'Battery': np.float32, 'Fix': 'Int8', 'Latitude': np.float64, 'Longitude': np.float64}
+for _column in BREAKOUT_COLUMNS[6:]:
+    COLUMN_DTYPES[_column] = np.float32
+NEWLINE = ord('\n')
+COMMA = ord(',')
+HEADER_START = ord('D')
+
+logger = logging.getLogger(__name__)
+
+
+def get_layout(fileloc: str):
+    """
+    Find the column layout of a raw sensor log from its file name
+    :param fileloc: str (file location)
+    :return columns: list of all column names in the file
+    """
+    if 'Beta' in fileloc:
+        return BETA_COLUMNS
+    elif 'Breakout' in fileloc:
+        return BREAKOUT_COLUMNS
+    raise ValueError("Unknown sensor log layout: " + fileloc)
+
+
+def default_engine():
+    """
+    Pick the fastest CSV backend that is installed
+    :return: str ('pyarrow' or 'c')
+    """
+    return 'c' if pa is None else 'pyarrow'
+
+
+def read_device_name(fileloc: str):
+    """
+    Read the device name stored on the first line of a raw sensor log
+    :param fileloc: str (file location)
+    :return device_name: str
+    """
+    with open(fileloc, 'r') as f:
+        return f.readline().split(',')[0].strip()
+
+
+def read_device_log(fileloc: str, engine=None):
+    """
+    Read a raw Beta/Breakout log into typed columns in a single pass. The first line (device name) and the
+    second line (header) are skipped; Temp/RH/P/Alti of the Beta layout are never parsed.
+    :param fileloc: str (file location)
+    :param engine: 'pyarrow' or 'c' (pandas C engine); defaults to pyarrow when it is installed
+    :return device_name: str
+    :return df: DataFrame (Date/Time as stripped strings, every other column float32/Int8/float64)
+    """
+    device_name = read_device_name(fileloc)
+    with open(fileloc, 'rb') as f:
+        f.readline()
+        f.readline()
+        data = f.read()
+    return device_name, parse_log_bytes(data, get_layout(fileloc), engine, fileloc)
+
+
+def read_device_log_tail(fileloc: str, offset=0, engine=None):
+    """
+    Read the rows appended to a raw log after a byte offset. Only complete lines are parsed, so a line that is
+    still being written is left for the next read.
+    :param fileloc: str (file location)
+    :param offset: int (byte offset where the previous read stopped; 0 reads the whole file)
+    :param engine: 'pyarrow' or 'c'
+    :return device_name: str
+    :return df: DataFrame (typed data, same layout as read_device_log)
+    :return offset: int (byte offset after the last complete line)
+    """
+    device_name = read_device_name(fileloc)
+    with open(fileloc, 'rb') as f:
+        if offset == 0:
+            f.readline()
+            f.readline()
+            offset = f.tell()
+        f.seek(offset)
+        data = f.read()
+    data = data[:data.rfind(b'\n') + 1]
+    return device_name, parse_log_bytes(data, get_layout(fileloc), engine, fileloc), offset + len(data)
+
+
+def iter_device_log(fileloc: str, chunk_bytes=64 * 2 ** 20, engine=None, offsets=False):
+    """
+    Read a raw log in chunks of about chunk_bytes, split on line boundaries, so memory stays bounded by the
+    chunk size whatever the file length
+    :param fileloc: str (file location)
+    :param chunk_bytes: int (bytes read per chunk)
+    :param engine: 'pyarrow' or 'c'
+    :param offsets: bool (also yield the byte offset after every chunk; a last line that is still being written is
+                    then left for the next read, as in read_device_log_tail)
+    :return: generator of (device_name, DataFrame) with the layout of read_device_log, or of
+             (device_name, DataFrame, offset) with offsets
+    """
+    device_name = read_device_name(fileloc)
+    columns = get_layout(fileloc)
+    with open(fileloc, 'rb') as f:
+        f.readline()
+        f.readline()
+        offset = f.tell()
+        remainder = b''
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            data = remainder + block
+            end = data.rfind(b'\n') + 1
+            remainder = data[end:]
+            if end > 0:
+                offset += end
+                df = parse_log_bytes(data[:end], columns, engine, fileloc)
+                yield (device_name, df, offset) if offsets else (device_name, df)
+        if remainder.strip() and not offsets:
+            yield device_name, parse_log_bytes(remainder + b'\n', columns, engine, fileloc)
+
+
+def parse_log_bytes(data: bytes, columns, engine=None, source="log"):
+    """
+    Parse raw log lines held in memory. Only record lines are parsed (see record_lines); the number of malformed
+    lines is logged.
+    :param data: bytes (complete lines)
+    :param columns: list of column names in the file
+    :param engine: 'pyarrow' or 'c'
+    :param source: str (file location or device name, for the log message)
+    :return df: DataFrame (typed data)
+    """
+    engine = _check_engine(engine)
+    data, malformed = record_lines(data, len(columns))
+    if malformed:
+        logger.warning("%s: skipped %d malformed lines", source, malformed)
+    return _parse_records(data, columns, engine)
+
+
+def parse_log_batch(chunks: dict, columns, engine=None):
+    """
+    Parse the raw lines of several logs of one layout in one pass (e.g. the devices of a live flush). The lines of
+    every log are filtered on their own (see record_lines; malformed lines are logged per log), so every log
+    gets exactly one row per record line.
+    :param chunks: dict of source (device name or file location) -> bytes (complete lines)
+    :param columns: list of column names in the logs
+    :param engine: 'pyarrow' or 'c'
+    :return df: DataFrame (typed data, the rows of every log contiguous, in the order of chunks)
+    :return rows: 1-D int array (number of rows of every log)
+    """
+    engine = _check_engine(engine)
+    records = []
+    for source, data in chunks.items():
+        data, malformed = record_lines(data, len(columns))
+        if malformed:
+            logger.warning("%s: skipped %d malformed lines", source, malformed)
+        records.append(data if not data or data.endswith(b'\n') else data + b'\n')
+    rows = np.array([data.count(b'\n') for data in records], dtype=np.int64)
+    return _parse_records(b''.join(records), columns, engine), rows
+
+
+def _check_engine(engine):
+    """
+    :param engine: 'pyarrow', 'c' or None (see default_engine)
+    :return: str
+    """
+    if engine is None:
+        engine = default_engine()
+    if engine not in ('pyarrow', 'c'):
+        raise ValueError("Wrong engine. Choose either pyarrow or c")
+    return engine
+
+
+def _parse_records(data: bytes, columns, engine):
+    """
+    :param data: bytes (record lines, see record_lines)
+    :param columns: list of column names in the file
+    :param engine: 'pyarrow' or 'c'
+    :return df: DataFrame (typed data)
+    """
+    if not data.strip():
+        return empty_log()
+    if engine == 'pyarrow':
+        try:
+            return _read_pyarrow(io.BytesIO(data), columns)
+        except pa.ArrowInvalid:
+            # Garbage values that arrow refuses to convert fall back to the coercing pandas reader
+            pass
+    return _read_pandas(io.BytesIO(data), columns)
+
+
+def record_lines(data: bytes, n_fields: int):
+    """
+    Keep the record lines of a log: device-name lines (and blank lines) and the header lines written after every
+    restart are dropped, and so are malformed lines with another number of fields (e.g. cut by a power loss)
+    :param data: bytes
+    :param n_fields: int (fields of the log layout)
+    :return data: bytes (record lines, in order)
+    :return malformed: int (number of malformed lines dropped)
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if not len(buffer):
+        return data, 0
+    ends = np.flatnonzero(buffer == NEWLINE)
+    if not len(ends) or ends[-1] != len(buffer) - 1:
+        ends = np.r_[ends, len(buffer) - 1]
+    starts = np.r_[0, ends[:-1] + 1]
+    commas = np.add.reduceat(buffer == COMMA, starts, dtype=np.int64)
+    header = buffer[starts] == HEADER_START
+    record = (commas == n_fields - 1) & ~header
+    if record.all():
+        return data, 0
+    malformed = int(np.count_nonzero(~record & ~header & (commas > 0)))
+    # Runs of consecutive record lines are copied as one slice
+    edges = np.diff(np.r_[0, record.astype(np.int8), 0])
+    first, last = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+    return b''.join(data[starts[a]:ends[b] + 1] for a, b in zip(first, last)), malformed
+
+
+def empty_log():
+    """
+    Build an empty DataFrame with the typed layout returned by read_device_log
+    :return df: DataFrame
+    """
+    df = pd.DataFrame({column: pd.Series(dtype=object) for column in STRING_COLUMNS})
+    for column, dtype in COLUMN_DTYPES.items():
+        df[column] = pd.Series(dtype=dtype)
+    return df
+
+
+def _read_pyarrow(source, columns):
+    """
+    Parse record lines with the pyarrow CSV reader
+    :param source: binary file object
+    :param columns: list of column names in the file
+    :return df: DataFrame (typed data)
+    """
+    read_options = pa_csv.ReadOptions(column_names=columns)
+    column_types = {column: pa.string() for column in STRING_COLUMNS}
+    for column in BREAKOUT_COLUMNS[2:]:
+        column_types[column] = pa.int8() if column == 'Fix' else pa.from_numpy_dtype(COLUMN_DTYPES[column])
+    convert_options = pa_csv.ConvertOptions(column_types=column_types, include_columns=BREAKOUT_COLUMNS,
+                                            strings_can_be_null=False)
+    table = pa_csv.read_csv(source, read_options=read_options, convert_options=convert_options)
+    for column in STRING_COLUMNS:
+        table = table.set_column(table.schema.get_field_index(column), column,
+                                 pc.utf8_trim_whitespace(table[column]))
+    return table.to_pandas(types_mapper={pa.int8(): pd.Int8Dtype()}.get)
+
+
+def _read_pandas(source, columns):
+    """
+    Parse record lines with the pandas C engine. Columns holding garbage values are coerced to NaN.
+    :param source: binary file object
+    :param columns: list of column names in the file
+    :return df: DataFrame (typed data)
+    """
+    kwargs = dict(header=None, names=columns, usecols=BREAKOUT_COLUMNS, skipinitialspace=True, engine='c')
+    try:
+        df = pd.read_csv(source, dtype=dict(COLUMN_DTYPES, Date=str, Time=str), **kwargs)
+    except (ValueError, TypeError):
+        source.seek(0)
+        df = pd.read_csv(source, dtype=str, **kwargs)
+    return _clean(df)
+
+
+def _clean(df):
+    """
+    Strip the string columns and coerce any remaining string columns to their numeric dtypes
+    :param df: DataFrame (parsed data)
+    :return df: DataFrame (typed data)
+    """
+    for column in STRING_COLUMNS:
+        df[column] = df[column].str.strip()
+    for column, dtype in COLUMN_DTYPES.items():
+        if not pd.api.types.is_numeric_dtype(df[column]):
+            values = pd.to_numeric(df[column], errors='coerce')
+            if dtype == 'Int8':
+                values = values.where(values == values.round())
+            df[column] = values.astype(dtype)
+    return df
@@ -0,0 +1,249 @@
+"""
+This .py file contains the live-ingest service: sensors (or replay.py) stream line-oriented Beta/Breakout records
+over TCP or UDP, the lines are buffered per device and periodically parsed with the log layout of Analysis.py and
+merged into running totals held in memory. Every flush appends the touched buckets of all devices to the Parquet
+result store at once, and the appended files are compacted into the device-day partitions now and then.
+TCP: one connection per device, sending the log as written on the SD card (device name line, optional header
+line, then records). UDP: every line is prefixed with the device name ("Beta-01,2020/9/10,10:00:00,...").
+Run from the Analysis folder: python live.py --tcp-port 9000 --udp-port 9001
+"""
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import time
+import numpy as np
+import pandas as pd
+from calibration import load_coefficients
+from incremental import RunningTotals
+from ingest import get_layout, parse_log_batch
+from preprocessing import get_devices_location, reformat
+from qc import QCStream
+from rollup import ROLLUP_FREQUENCIES
+from storage import RESULTS_DIR
+
+
+class IngestServer:
+    """
+    Buffers incoming records per device and writes them to the result store in batches, either every
+    flush_seconds or as soon as flush_rows records are waiting. Writes run in one background thread, so the event
+    loop keeps accepting records while a batch is stored.
+    """
+
+    def __init__(self, freqs=ROLLUP_FREQUENCIES, results_dir=RESULTS_DIR, flush_seconds=60.0, flush_rows=200000,
+                 aggregator=None, compact_flushes=60):
+        """
+        :param freqs: list of frequency names
+        :param results_dir: str
+        :param flush_seconds: float (longest time a record waits before being stored)
+        :param flush_rows: int (number of waiting records that triggers an early flush)
+        :param aggregator: online.OnlineAggregator (optional, updated with the rows of every flush once their QC
+                           flags are settled, for live snapshots)
+        :param compact_flushes: int (flushes between two compactions of the appended files; they are also
+                                compacted when the server stops)
+        """
+        self.freqs = list(freqs)
+        self.results_dir = results_dir
+        self.flush_seconds = flush_seconds
+        self.flush_rows = flush_rows
+        self.aggregator = aggregator
+        self.compact_flushes = compact_flushes
+        self.totals = RunningTotals(self.freqs, results_dir)
+        self.streams = {}
+        self.buffers = {}
+        self.waiting = 0
+        self.received = 0
+        self.stored = 0
+        self.flushes = 0
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self._flush_task = None
+
+    def add_line(self, device_name: str, line: bytes):
+        """
+        Buffer one record of a device
+        :param device_name: str
+        :param line: bytes (one log line, with or without the trailing newline)
+        :return: bool (False for blank lines, header lines and unknown layouts)
+        """
+        if not line.strip() or line.lstrip().startswith(b'Date'):
+            return False
+        buffer = self.buffers.get(device_name)
+        if buffer is None:
+            try:
+                get_layout(device_name)
+            except ValueError:
+                return False
+            buffer = self.buffers[device_name] = []
+        buffer.append(line if line.endswith(b'\n') else line + b'\n')
+        self.waiting += 1
+        self.received += 1
+        if self.waiting >= self.flush_rows and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.ensure_future(self.flush())
+        return True
+
+    def store(self, batch: dict, final=False):
+        """
+        Parse one batch and store the rows of all its devices at once (see settle and write)
+        :param batch: dict of device name -> list of lines
+        :param final: bool (the server stops: the rows every device held back are stored as well)
+        :return: int (number of stored rows)
+        """
+        return self.write(self.settle(batch, final))
+
+    def settle(self, batch: dict, final=False):
+        """
+        Parse one batch and flag its rows (runs in the writer thread). The devices of a log layout are parsed,
+        located, reformatted and flagged together, in one pass per layout. The QC flags of every device are carried
+        over from its previous batches (see qc.QCStream, one per layout): the last rows of a device wait for its
+        next batch, or for the final one.
+        bench_live.py --devices 2000 --flushes 10 (6 records per device and flush): 0.21 s per flush, against
+        16.9 s with a parse, reformat and QC pass per device.
+        :param batch: dict of device name -> list of lines
+        :param final: bool (the server stops: the rows every device held back are settled as well)
+        :return df: DataFrame (settled rows with the QC column) or None
+        """
+        layouts = {}
+        for device_name, lines in batch.items():
+            layouts.setdefault(tuple(get_layout(device_name)), {})[device_name] = b''.join(lines)
+        frames = []
+        for layout, chunks in layouts.items():
+            df, rows = parse_log_batch(chunks, list(layout))
+            if df.empty:
+                continue
+            df = get_devices_location(df, np.repeat(np.array(list(chunks), dtype=object), rows))
+            df = reformat(df, None, self.streams.setdefault(layout, QCStream()))
+            if not df.empty:
+                frames.append(df)
+        if final:
+            for stream in self.streams.values():
+                held = stream.finish()
+                if held is not None:
+                    frames.append(held)
+            self.streams = {}
+        if not frames:
+            return None
+        return pd.concat(frames, ignore_index=True)
+
+    def write(self, df):
+        """
+        Merge settled rows into the running totals and append the touched buckets to the result store (runs in the
+        writer thread)
+        :param df: DataFrame (from settle) or None
+        :return: int (number of stored rows)
+        """
+        if df is None:
+            return 0
+        self.totals.add(df, load_coefficients())
+        return len(df)
+
+    async def flush(self, final=False):
+        """
+        Hand the buffered records over to the writer thread
+        :param final: bool (last flush before the server stops, see store)
+        :return: int (number of stored rows)
+        """
+        if self.waiting == 0 and not final:
+            return 0
+        batch = self.buffers
+        self.buffers = {}
+        self.waiting = 0
+        loop = asyncio.get_running_loop()
+        df = await loop.run_in_executor(self.executor, self.settle, batch, final)
+        # The statistics are read by the event loop, so they are only updated here
+        if self.aggregator is not None and df is not None:
+            self.aggregator.add_frame(df)
+        stored = await loop.run_in_executor(self.executor, self.write, df)
+        self.stored += stored
+        self.flushes += 1
+        if self.flushes % self.compact_flushes == 0:
+            await loop.run_in_executor(self.executor, self.totals.compact)
+        return stored
+
+    async def handle_tcp(self, reader, writer):
+        """
+        Read one device's stream: the first line names the device (as in the raw log files), every other line is
+        a record
+        """
+        first = await reader.readline()
+        device_name = first.decode(errors='replace').split(',')[0].strip()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            self.add_line(device_name, line)
+        writer.close()
+        await writer.wait_closed()
+
+    def datagram(self, data: bytes):
+        """
+        Split a UDP datagram into device-prefixed records
+        :param data: bytes (one or more lines "<device name>,<record>")
+        :return: None
+        """
+        for line in data.splitlines():
+            device_name, _, record = line.partition(b',')
+            self.add_line(device_name.decode(errors='replace').strip(), record)
+
+    async def serve(self, host="0.0.0.0", tcp_port=9000, udp_port=None, duration=None):
+        """
+        Accept records until cancelled (or for duration seconds), flushing every flush_seconds
+        :param host: str
+        :param tcp_port: int (None disables TCP)
+        :param udp_port: int (None disables UDP)
+        :param duration: float (seconds to run; None runs until cancelled)
+        :return: None
+        """
+        loop = asyncio.get_running_loop()
+        server = None
+        transport = None
+        if tcp_port is not None:
+            server = await asyncio.start_server(self.handle_tcp, host, tcp_port)
+        if udp_port is not None:
+            transport, _ = await loop.create_datagram_endpoint(lambda: _DatagramProtocol(self),
+                                                               local_addr=(host, udp_port))
+        start = time.monotonic()
+        try:
+            while duration is None or time.monotonic() - start < duration:
+                await asyncio.sleep(self.flush_seconds if duration is None
+                                    else min(self.flush_seconds, max(duration - (time.monotonic() - start), 0)))
+                await self.flush()
+                print("Received %d, stored %d rows in %d flushes" % (self.received, self.stored, self.flushes))
+        finally:
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+            if transport is not None:
+                transport.close()
+            if self._flush_task is not None:
+                await self._flush_task
+            await self.flush(final=True)
+            await loop.run_in_executor(self.executor, self.totals.compact)
+        return
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    """
+    Forwards UDP datagrams to an IngestServer
+    """
+
+    def __init__(self, server: IngestServer):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        self.server.datagram(data)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Receive live sensor records and store them as rollups")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--tcp-port", type=int, default=9000)
+    parser.add_argument("--udp-port", type=int, default=None)
+    parser.add_argument("--flush-seconds", type=float, default=60.0,
+                        help="longest time a record waits before it is written to the result store")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--compact-flushes", type=int, default=60,
+                        help="flushes between two compactions of the appended files into the device-day partitions")
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    args = parser.parse_args()
+    ingest_server = IngestServer(results_dir=args.results_dir, flush_seconds=args.flush_seconds,
+                                 compact_flushes=args.compact_flushes)
+    asyncio.run(ingest_server.serve(args.host, args.tcp_port, args.udp_port, args.duration))
@@ -0,0 +1,412 @@
+"""
+This .py file contains the online statistics engine for live monitoring: sensor records are consumed one at a time
+and every per-device statistic (rolling means, EWMA, running quantiles, I/O ratio against the paired outdoor device)
+is updated in O(1), so snapshots for plotting never re-run get_averages. Readings that fail the QC checks are
+skipped as in the batch averages, and late records are slotted into the windows at their own time.
+"""
+import calendar
+from collections import deque
+from datetime import datetime
+import math
+import numpy as np
+import pandas as pd
+from ingest import get_layout
+from qc import QC_COLUMN, load_thresholds
+from registry import device_info, user_pairs
+from timestamps import TIMEZONE, to_timedelta
+
+
+def record_time(date: str, time: str):
+    """
+    Convert the Date and Time fields of one log record to UTC seconds, with the rules of
+    timestamps.normalize_timestamps: '2020/...' dates are Pacific time, other dates are UTC (GPS time), a reset
+    clock (2005) is moved to 2020, and garbage dates ('0/0/0', dates containing '80') are rejected
+    :param date: str (e.g. '20/9/10')
+    :param time: str (e.g. '17:00:10')
+    :return: float (seconds since the epoch) or None
+    """
+    date = date.strip()
+    time = time.strip()
+    if date == '0/0/0' or '80' in date:
+        return None
+    try:
+        if len(date.split('/')[0]) == 4:
+            parsed = datetime.strptime(date + ' ' + time, '%Y/%m/%d %H:%M:%S')
+        else:
+            parsed = datetime.strptime(date + ' ' + time, '%y/%m/%d %H:%M:%S')
+    except ValueError:
+        return None
+    if parsed.year == 2005:
+        parsed = parsed.replace(year=2020)
+    if '2020/' in date:
+        timestamp = pd.Timestamp(parsed).tz_localize(TIMEZONE, ambiguous='NaT', nonexistent='shift_forward')
+        return None if pd.isna(timestamp) else timestamp.timestamp()
+    return calendar.timegm(parsed.timetuple())
+
+
+def parse_line(line: str, device_name: str):
+    """
+    Parse one line of a raw Beta/Breakout log
+    :param line: str (comma separated, in the layout of the device's log)
+    :param device_name: str (picks the Beta or Breakout layout)
+    :return record: dict of column -> value (Date/Time as str, every other column float, NaN if unreadable)
+    """
+    fields = [field.strip() for field in line.split(',')]
+    record = {}
+    for column, field in zip(get_layout(device_name), fields):
+        if column in ('Date', 'Time'):
+            record[column] = field
+            continue
+        try:
+            record[column] = float(field)
+        except ValueError:
+            record[column] = math.nan
+    return record
+
+
+class P2Quantile:
+    """
+    Running quantile estimate with the P-square algorithm (Jain and Chlamtac, 1985): five markers, O(1) memory
+    and time per value
+    """
+
+    def __init__(self, q: float):
+        """
+        :param q: float in [0, 1]
+        """
+        self.q = q
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * q, 4 * q, 2 + 2 * q, 4]
+        self.increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def add(self, x: float):
+        """
+        :param x: float
+        :return: None
+        """
+        heights = self.heights
+        if len(heights) < 5:
+            heights.append(x)
+            heights.sort()
+            return
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= heights[k + 1]:
+                k += 1
+        positions = self.positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+        for i in range(1, 4):
+            d = self.desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + d * (heights[i + d] - heights[i]) / (positions[i + d] - positions[i])
+                heights[i] = height
+                positions[i] += d
+
+    def _parabolic(self, i: int, d: int):
+        """
+        Piecewise-parabolic prediction of marker i moved by d
+        """
+        h = self.heights
+        n = self.positions
+        return h[i] + d / (n[i + 1] - n[i - 1]) * ((n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+                                                   + (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self):
+        """
+        :return: float (current estimate; exact for the first five values, NaN before any value)
+        """
+        heights = self.heights
+        if len(heights) == 0:
+            return math.nan
+        if len(heights) < 5 or self.positions[4] == 4:
+            position = (len(heights) - 1) * self.q
+            lower = int(math.floor(position))
+            upper = int(math.ceil(position))
+            return heights[lower] + (heights[upper] - heights[lower]) * (position - lower)
+        return heights[2]
+
+
+class RollingMean:
+    """
+    Mean over a trailing time window (values newer than time - window), with a running sum. Values are kept in time
+    order: a late value is slotted in at its own time (found from the newest end, so slightly late values stay
+    cheap), or dropped when it is already outside the window.
+    """
+
+    def __init__(self, window: float):
+        """
+        :param window: float (seconds)
+        """
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+
+    def add(self, t: float, x: float):
+        """
+        :param t: float (seconds)
+        :param x: float
+        :return: None
+        """
+        values = self.values
+        if values and t < values[-1][0]:
+            if t <= values[-1][0] - self.window:
+                return
+            position = len(values)
+            while position and values[position - 1][0] > t:
+                position -= 1
+            values.insert(position, (t, x))
+            self.total += x
+            return
+        values.append((t, x))
+        self.total += x
+        self.expire(t)
+
+    def expire(self, t: float):
+        """
+        Drop values that left the window ending at t (amortized O(1): each value is dropped once)
+        :param t: float (seconds)
+        :return: None
+        """
+        values = self.values
+        while values and values[0][0] <= t - self.window:
+            self.total -= values.popleft()[1]
+        if not values:
+            # Reset so rounding errors of the running sum never carry over
+            self.total = 0.0
+
+    def value(self):
+        """
+        :return: float (NaN for an empty window)
+        """
+        return self.total / len(self.values) if self.values else math.nan
+
+
+class Ewma:
+    """
+    Exponentially weighted moving average over time: the weight of a value halves every halflife of its age, so
+    irregular logging intervals are handled (pandas ewm(halflife=..., times=...).mean() of the values so far). The
+    weights only depend on the times, so a late value gets the weight of its age and the order does not matter.
+    """
+
+    def __init__(self, halflife: float):
+        """
+        :param halflife: float (seconds)
+        """
+        self.halflife = halflife
+        self.total = 0.0
+        self.weight = 0.0
+        self.time = None
+
+    def add(self, t: float, x: float):
+        """
+        :param t: float (seconds)
+        :param x: float
+        :return: None
+        """
+        if self.time is None or t >= self.time:
+            decay = 0.5 ** ((t - self.time) / self.halflife) if self.time is not None else 0.0
+            self.total = decay * self.total + x
+            self.weight = decay * self.weight + 1.0
+            self.time = t
+        else:
+            weight = 0.5 ** ((self.time - t) / self.halflife)
+            self.total += weight * x
+            self.weight += weight
+
+    def value(self):
+        """
+        :return: float (NaN before any value)
+        """
+        return self.total / self.weight if self.weight else math.nan
+
+
+class DeviceStats:
+    """
+    Every online statistic of one device
+    """
+
+    def __init__(self, device_name: str, windows: dict, halflife: float, quantiles: list):
+        """
+        :param device_name: str
+        :param windows: dict of label -> window in seconds
+        :param halflife: float (seconds)
+        :param quantiles: list of float
+        """
+        self.device_name = device_name
+        self.in_or_out = device_info(device_name)['In or Out']
+        self.count = 0
+        self.time = None
+        self.last = math.nan
+        self.means = {label: RollingMean(window) for label, window in windows.items()}
+        self.ewma = Ewma(halflife)
+        self.quantiles = [P2Quantile(q) for q in quantiles]
+
+    def add(self, t: float, x: float):
+        """
+        :param t: float (UTC seconds)
+        :param x: float
+        :return: None
+        """
+        self.count += 1
+        if self.time is None or t >= self.time:
+            self.time = t
+            self.last = x
+        for mean in self.means.values():
+            mean.add(t, x)
+        self.ewma.add(t, x)
+        for quantile in self.quantiles:
+            quantile.add(x)
+
+
+class OnlineAggregator:
+    """
+    Live per-device statistics of one column. Feed records with add() (or raw log lines with add_line(), or rows
+    flagged by the QC stage with add_frame()) and read the current state with snapshot(). Readings that fail the QC
+    checks do not update the statistics: rows carry their QC flags from the batch QC stage (qc.QCStream, which
+    also needs the rows after a reading), while raw records only get the checks one record allows (battery
+    brownout, PMS saturation).
+    """
+
+    def __init__(self, df_users=None, column="PM2.5_Env", windows=("10Min", "hour"), halflife="10Min",
+                 quantiles=(0.05, 0.5, 0.95)):
+        """
+        :param df_users: DataFrame (users sheet; pairs each indoor device with its outdoor device)
+        :param column: str (e.g. 'PM2.5_Env')
+        :param windows: list of rolling windows (frequency names or Timedeltas); the first one gives the I/O ratio
+        :param halflife: halflife of the EWMA (frequency name or Timedelta)
+        :param quantiles: list of float (running quantiles)
+        """
+        self.column = column
+        self.windows = {str(window): to_timedelta(window).total_seconds() for window in windows}
+        self.halflife = to_timedelta(halflife).total_seconds()
+        self.quantiles = list(quantiles)
+        self.thresholds = load_thresholds()
+        self.devices = {}
+        self.pairs = {}
+        if df_users is not None:
+            self.pairs = {device_in: device_out for device_in, device_out in user_pairs(df_users, 'In', 'Out')
+                          if pd.notna(device_in) and pd.notna(device_out)}
+
+    def device(self, device_name: str):
+        """
+        :param device_name: str
+        :return: DeviceStats (created on the first record of the device)
+        """
+        stats = self.devices.get(device_name)
+        if stats is None:
+            stats = DeviceStats(device_name, self.windows, self.halflife, self.quantiles)
+            self.devices[device_name] = stats
+        return stats
+
+    def add(self, device_name: str, record: dict):
+        """
+        Consume one record
+        :param device_name: str
+        :param record: dict with the log columns (Date and Time, or a 'PT DateTime' timestamp) and self.column;
+                       with a QC entry (see qc.qc_flags), or else Battery and the QC column of qc.json
+        :return: bool (False when the record was dropped: garbage date, missing value or failed QC check)
+        """
+        if not self.passes_qc(record):
+            return False
+        if 'PT DateTime' in record:
+            t = pd.Timestamp(record['PT DateTime'])
+            t = None if pd.isna(t) else (t.tz_localize(TIMEZONE) if t.tzinfo is None else t).timestamp()
+        else:
+            t = record_time(record['Date'], record['Time'])
+        x = record.get(self.column, math.nan)
+        if t is None or x is None or math.isnan(x):
+            return False
+        self.device(device_name).add(t, float(x))
+        return True
+
+    def passes_qc(self, record: dict):
+        """
+        :param record: dict (see add)
+        :return: bool (False when the QC flags of the record are set, or else when its battery voltage or PM
+                 reading fail the checks of qc.json)
+        """
+        if QC_COLUMN in record:
+            return not record[QC_COLUMN]
+        battery = record.get('Battery', math.nan)
+        value = record.get(self.thresholds['column'], math.nan)
+        return not (battery < self.thresholds['battery']['min_volts'] or value >= self.thresholds['saturation'])
+
+    def add_frame(self, df):
+        """
+        Consume reformatted rows in row order (e.g. the rows a live flush settled; rows with QC flags are skipped)
+        :param df: DataFrame (Device Name, PT DateTime, self.column and the QC column)
+        :return: int (number of rows that updated the statistics)
+        """
+        good = ((df[QC_COLUMN].to_numpy() == 0) & df[self.column].notna().to_numpy()
+                & df['PT DateTime'].notna().to_numpy())
+        seconds = (df['PT DateTime'][good] - pd.Timestamp(0, tz='UTC')) / pd.Timedelta(1, 's')
+        values = df[self.column][good].to_numpy(dtype=np.float64)
+        for device_name, t, x in zip(df['Device Name'][good], seconds, values):
+            self.device(device_name).add(t, float(x))
+        return int(good.sum())
+
+    def add_line(self, device_name: str, line: str):
+        """
+        Consume one line of a raw Beta/Breakout log
+        :param device_name: str
+        :param line: str
+        :return: bool
+        """
+        return self.add(device_name, parse_line(line, device_name))
+
+    def io_ratio(self, device_name: str):
+        """
+        I/O ratio of an indoor device: its rolling mean over the first window divided by the one of its paired
+        outdoor device
+        :param device_name: str (indoor device)
+        :return: float (NaN without a paired device or data)
+        """
+        paired = self.devices.get(self.pairs.get(device_name))
+        stats = self.devices.get(device_name)
+        if paired is None or stats is None:
+            return math.nan
+        label = next(iter(self.windows))
+        outdoor = paired.means[label].value()
+        return stats.means[label].value() / outdoor if outdoor else math.nan
+
+    def snapshot(self, now=None):
+        """
+        Current state of every device, one row each (rolling windows end at now, or at each device's last record)
+        :param now: Timestamp (end of the rolling windows; None uses each device's latest record)
+        :return df: DataFrame ('Device Name', 'PT DateTime', 'In or Out', 'Count', 'Last', 'Mean <window>',
+                    'EWMA', 'P<quantile>', 'Paired Device', 'I/O Ratio')
+        """
+        if now is not None:
+            now = pd.Timestamp(now)
+            now = (now.tz_localize(TIMEZONE) if now.tzinfo is None else now).timestamp()
+        rows = []
+        for device_name, stats in self.devices.items():
+            for mean in stats.means.values():
+                mean.expire(stats.time if now is None else now)
+            row = {'Device Name': device_name, 'PT DateTime': stats.time, 'In or Out': stats.in_or_out,
+                   'Count': stats.count, 'Last': stats.last}
+            for label, mean in stats.means.items():
+                row['Mean ' + label] = mean.value()
+            row['EWMA'] = stats.ewma.value()
+            for quantile in stats.quantiles:
+                row['P%g' % (quantile.q * 100)] = quantile.value()
+            row['Paired Device'] = self.pairs.get(device_name)
+            row['I/O Ratio'] = self.io_ratio(device_name)
+            rows.append(row)
+        df = pd.DataFrame(rows)
+        if not df.empty:
+            df['PT DateTime'] = pd.to_datetime(df['PT DateTime'], unit='s', utc=True).dt.tz_convert(TIMEZONE)
+        return df
@@ -0,0 +1,161 @@
+"""
+This .py file contains the per-device preprocessing pipeline used by Analysis.py.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+from incremental import file_watermark, pacific_dates, store_totals
+from ingest import iter_device_log, read_device_log, read_device_log_tail
+from preprocessing import get_device_location, reformat
+from qc import QCStream
+from rollup import TOTALS_DATASET, RollupAccumulator, rollup
+
+RAW_DATA_DIR = "D://UW//AeroSpec - Sensor Network//2020 Wildfire//Wildfire 2020 Raw Data//"
+RESULT_FILES = {"hour": "Results/1_HourAverage.csv", "10Min": "Results/2_10MinAverage.csv",
+                "1Min": "Results/4_1MinAverage.csv", "10S": "Results/3_10SecAverage.csv"}
+WATERMARK = "watermark"
+
+
+def device_file(device: str, data_dir=RAW_DATA_DIR):
+    """
+    Find the raw data file of a device
+    :param device: str (device name, e.g. Beta-01 or Puget-Bellevue)
+    :param data_dir: str (folder containing the raw data files)
+    :return fileloc: str (file location)
+    """
+    if "Puget" in device:
+        return os.path.join(data_dir, device + ".csv")
+    return os.path.join(data_dir, device + ".txt")
+
+
+def process_device(fileloc: str, freqs=("10Min",), chunk_bytes=None, state=False, results_dir=None,
+                   calibration=None):
+    """
+    Read, locate, reformat and average a single device log at every requested frequency in one pass
+    :param fileloc: str (file location)
+    :param freqs: averaging frequencies ("hour", "10Min", "1Min", "10S")
+    :param chunk_bytes: int (read the log in chunks of this many bytes; None reads it whole)
+    :param state: bool (also return what an incremental run continues from: the finest bucket totals under
+                  TOTALS_DATASET and the file watermark under WATERMARK, with the QC state of the end of the log;
+                  every row is averaged, flagged as the log reads now)
+    :param results_dir: str (chunked reads only: write every closed day to this result store instead of returning
+                        the averages, see process_device_chunked)
+    :param calibration: dict (coefficient store version used with results_dir; None uses the active one)
+    :return finals: dict of frequency -> DataFrame (averaged data)
+    """
+    if chunk_bytes is not None:
+        return process_device_chunked(fileloc, freqs, chunk_bytes, state, results_dir, calibration)
+    if state:
+        # Only complete lines are read, so the watermark offset is exact even if the log is still being written
+        device_name, df, offset = read_device_log_tail(fileloc)
+    else:
+        device_name, df = read_device_log(fileloc)
+    device_name, df = get_device_location(df, device_name)
+    stream = QCStream() if state else None
+    df = reformat(df, device_name, stream, final=True)
+    finals = rollup(df, freqs, totals=state)
+    if state:
+        finals[WATERMARK] = file_watermark(device_name, df, offset, stream=stream)
+    return finals
+
+
+def store_sink(freqs, results_dir: str, calibration=None):
+    """
+    Build a RollupAccumulator sink writing closed days to the result store with their bucket totals. The first
+    delivery of a device-day overwrites its partitions; later ones (late rows) are merged with what this sink wrote.
+    :param freqs: averaging frequencies
+    :param results_dir: str
+    :param calibration: dict (coefficient store version; None uses the active one)
+    :return: function(sums, counts)
+    """
+    written = {}
+
+    def sink(sums, counts):
+        devices = sums.index.get_level_values('Device Name')
+        for device_name in devices.unique():
+            rows = devices == device_name
+            dates = set(pacific_dates(sums.index[rows].get_level_values('PT DateTime')))
+            store_totals(device_name, sums[rows], counts[rows], freqs, results_dir, calibration,
+                         merge=written.get(device_name, set()))
+            written.setdefault(device_name, set()).update(dates)
+    return sink
+
+
+def process_device_chunked(fileloc: str, freqs=("10Min",), chunk_bytes=64 * 2 ** 20, state=False,
+                           results_dir=None, calibration=None):
+    """
+    Same as process_device, but the log is streamed in chunks. With results_dir, every day is written to the
+    result store (averages and bucket totals) as soon as a chunk closes it, so memory stays bounded by the chunk
+    size plus one day of bucket totals for multi-GB logs; otherwise the averages of the whole log are returned.
+    :param fileloc: str (file location)
+    :param freqs: averaging frequencies
+    :param chunk_bytes: int (bytes read per chunk)
+    :param state: bool (also return the bucket totals and the file watermark, see process_device)
+    :param results_dir: str (result store written day by day; None returns the averages)
+    :param calibration: dict (coefficient store version used with results_dir; None uses the active one)
+    :return finals: dict of frequency -> DataFrame (averaged data; only the watermark with results_dir)
+    """
+    sink = None if results_dir is None else store_sink(freqs, results_dir, calibration)
+    accumulator = RollupAccumulator(freqs, totals=state and sink is None, sink=sink)
+    watermark = {}
+    # Chunks are flagged as one log; the rows held back at the end are settled after the last chunk
+    stream = QCStream()
+    device_name, offset = None, 0
+    for chunk in iter_device_log(fileloc, chunk_bytes, offsets=state):
+        device_name, df = get_device_location(chunk[1], chunk[0])
+        df = reformat(df, device_name, stream)
+        accumulator.add(df)
+        if state:
+            offset = chunk[2]
+            watermark = file_watermark(device_name, df, offset, watermark, stream)
+    held = stream.finish()
+    if held is not None:
+        accumulator.add(held)
+        if state:
+            watermark = file_watermark(device_name, held, offset, watermark, stream)
+    finals = accumulator.finish()
+    if state:
+        finals[WATERMARK] = watermark
+    return finals
+
+
+def run_pipeline(filelocs: list, freqs=("10Min",), workers=None, chunk_bytes=None, watermarks=None,
+                 results_dir=None, calibration=None):
+    """
+    Process device logs in parallel and collect their averages in input order
+    :param filelocs: list of file locations (Beta/Breakout logs)
+    :param freqs: averaging frequencies
+    :param workers: number of worker processes (None uses every core, 1 runs serially in this process)
+    :param chunk_bytes: int (stream each log in chunks of this many bytes; None reads logs whole)
+    :param watermarks: dict (filled with the watermark of every file, keyed like incremental.load_watermarks; the
+                       finest bucket totals are then returned under TOTALS_DATASET, so an incremental run can
+                       continue from this one)
+    :param results_dir: str (with chunk_bytes: every device writes its days and bucket totals to this result store
+                        as they close, and nothing is returned; the store should not hold these devices yet)
+    :param calibration: dict (coefficient store version used with results_dir; None uses the active one)
+    :return finals: dict of frequency -> list of DataFrames, ordered like filelocs (empty with results_dir)
+    """
+    state = watermarks is not None
+    if chunk_bytes is None:
+        results_dir = None
+    arguments = (freqs, chunk_bytes, state, results_dir, calibration)
+    results = [None] * len(filelocs)
+    if workers == 1:
+        for count, fileloc in enumerate(filelocs, 0):
+            results[count] = process_device(fileloc, *arguments)
+            print("Finished " + fileloc)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(process_device, fileloc, *arguments): count
+                       for count, fileloc in enumerate(filelocs, 0)}
+            for future in as_completed(futures):
+                count = futures[future]
+                results[count] = future.result()
+                print("Finished " + filelocs[count])
+    finals = {}
+    if results_dir is None:
+        for freq in list(freqs) + ([TOTALS_DATASET] if state else []):
+            finals[freq] = [result[freq] for result in results]
+    if state:
+        for fileloc, result in zip(filelocs, results):
+            watermarks[os.path.basename(fileloc)] = result[WATERMARK]
+    return finals
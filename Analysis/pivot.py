@@ -0,0 +1,118 @@
+"""
+This .py file contains the wide (time x device) matrix engine behind average() and the ratio engine: one pivot into a
+dense NumPy matrix on a common time grid and NaN-aware row reductions, cached per table, device set, column and window.
+"""
+import warnings
+import numpy as np
+import pandas as pd
+from query import cached_by_table, table_query
+
+_AVERAGES = {}
+
+
+def nanquantile_rows(matrix, quantiles):
+    """
+    Row-wise quantiles ignoring NaN, with the linear interpolation of DataFrame.quantile(axis=1). Every row is
+    sorted once (NaN last) and all quantiles are gathered from that sort, instead of the per-row loop of
+    np.nanquantile.
+    :param matrix: 2-D array (time x device)
+    :param quantiles: list of float in [0, 1]
+    :return: 2-D array (quantile x time), NaN for rows without any value
+    """
+    values = np.sort(matrix, axis=1)
+    counts = np.sum(~np.isnan(matrix), axis=1)
+    rows = np.arange(matrix.shape[0])
+    result = np.full((len(quantiles), matrix.shape[0]), np.nan)
+    valid = counts > 0
+    for i, q in enumerate(quantiles):
+        position = (counts[valid] - 1) * q
+        lower = np.floor(position).astype(int)
+        upper = np.ceil(position).astype(int)
+        low = values[rows[valid], lower]
+        high = values[rows[valid], upper]
+        result[i, valid] = low + (high - low) * (position - lower)
+    return result
+
+
+def time_grid(df, devices: list, column: str, start=None, end=None):
+    """
+    Find the common time axis of several devices: every timestamp at which one of them has a row in the window
+    :param df: DataFrame or TableQuery (result table)
+    :param devices: list of Device Names
+    :param column: str
+    :param start: start of the window
+    :param end: end of the window
+    :return grid: DatetimeIndex (sorted, unique)
+    """
+    query = table_query(df)
+    indexes = [query.series(device, column, start, end).index for device in devices]
+    grid = pd.DatetimeIndex(np.unique(np.concatenate([index.values for index in indexes])))
+    if query.tz is not None:
+        grid = grid.tz_localize('UTC').tz_convert(query.tz)
+    return grid
+
+
+def pivot_devices(df, devices: list, column: str, start=None, end=None, grid=None):
+    """
+    Pivot one column of several devices into a dense (time x device) matrix. Devices with several rows per
+    timestamp (the moving sensor at several locations) are averaged per timestamp first.
+    :param df: DataFrame or TableQuery (result table)
+    :param devices: list of Device Names (matrix columns, in this order)
+    :param column: str (e.g. 'PM2.5_Env')
+    :param start: start of the window
+    :param end: end of the window
+    :param grid: DatetimeIndex (time axis; None uses every timestamp of the devices in the window)
+    :return grid: DatetimeIndex
+    :return matrix: 2-D float64 array, NaN where a device has no value
+    """
+    query = table_query(df)
+    series = []
+    for device in devices:
+        values = query.series(device, column, start, end)
+        if not values.index.is_unique:
+            values = values.groupby(level=0).mean()
+        series.append(values)
+    if grid is None:
+        grid = time_grid(query, devices, column, start, end)
+    grid = grid.unique()
+    matrix = np.full((len(grid), len(devices)), np.nan)
+    for j, values in enumerate(series):
+        positions = grid.get_indexer(values.index)
+        found = positions >= 0
+        matrix[positions[found], j] = values.to_numpy(dtype=np.float64)[found]
+    return grid, matrix
+
+
+def device_average(df, devices: list, column: str, start=None, end=None, labels=None, quantiles=(0.05, 0.95)):
+    """
+    Build the wide table of average(): the time axis is the first device's timestamps in the window, one column
+    per device, then the row-wise Average and the Q1/Q3 quantiles (5% and 95% by default) ignoring missing
+    devices. Results are cached per (table, devices, column, window, quantiles), so the hour/10-minute x
+    indoor/outdoor calls of the notebooks are computed once (for the TableQuery of df, see query.invalidate_table
+    after editing df in place).
+    :param df: DataFrame (result table at one resolution)
+    :param devices: list of Device Names
+    :param column: str (e.g. 'PM2.5_Env')
+    :param start: start of the window
+    :param end: end of the window
+    :param labels: list of column labels for the devices (defaults to the device names)
+    :param quantiles: tuple of two floats (Q1 and Q3)
+    :return df: DataFrame ('PT DateTime', device columns, 'Average', 'Q1', 'Q3')
+    """
+    labels = list(devices) if labels is None else list(labels)
+    query = table_query(df)
+
+    def build():
+        grid = query.series(devices[0], column, start, end).index
+        grid, matrix = pivot_devices(query, devices, column, start, end, grid)
+        df_final = pd.DataFrame(matrix, columns=labels)
+        df_final.insert(0, 'PT DateTime', grid)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            df_final['Average'] = np.nanmean(matrix, axis=1)
+        df_final['Q1'], df_final['Q3'] = nanquantile_rows(matrix, quantiles)
+        return df_final
+
+    df_final = cached_by_table(_AVERAGES, query, (tuple(devices), tuple(labels), column, start, end, tuple(quantiles)),
+                               build)
+    return df_final.copy()
@@ -0,0 +1,602 @@
+"""
+This .py file contains the plotting functions: per-device line plots, I/O and indoor/outdoor vs public sensor ratio
+plots, box plots and the personal exposure comparisons.
+"""
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from calibration import CALIBRATED_SUFFIX
+from downsample import downsample, plot_series
+from exposure import personal_frame
+from figures import show_figure
+from geofence import NO_FIX, dwell_segments
+from preprocessing import user_case
+from qc import tukey_fences
+from query import table_query
+from ratios import gov_ratio_table, io_ratio_table
+from resample import regular_grid
+from storage import write_results
+
+
+def plot_wrapper(df, df_users, plot_style: str, particle_size: str, public_sensors, line_or_box=None, hour_or_10=None,
+                 start="9/10/2020 0:00", end="9/19/2020 0:00"):
+    """
+    High level plot function wrappers that calls specific plot functions specified by users
+    :param df: DataFrame (FullData)
+    :param df_users: DataFrame (users and corresponding device names)
+    :param plot_style: Plot style (Separate, I/O Ratio, or I/G Ratio)
+    :param particle_size: Size of particles (column names of df)
+    :param public_sensors: list of public sensors
+    :param line_or_box: Line plot or box plot
+    :param hour_or_10: hour average or ten-minute average
+    :return: None
+    """
+    if plot_style == "Separate":
+        line_plots(df, df_users, particle_size, public_sensors)
+    elif plot_style == "I/O Ratio":
+        io_ratio(df, df_users, line_or_box, hour_or_10, particle_size, start, end)
+    elif plot_style == "I/G Ratio":
+        ig_ratio(df, df_users, line_or_box, particle_size, public_sensors, start, end)
+    elif plot_style == "O/G Ratio":
+        og_ratio(df, df_users, line_or_box, particle_size, public_sensors, start, end)
+    else:
+        raise ValueError("Wrong input_style. Choose either Separate, I/O Ratio, or I/G Ratio")
+    return
+
+
+def line_plots(df, df_users, particle_size: str, public_sensors: list):
+    """
+    Plots specified separate line plots
+    :param df: DataFrame (FullData)
+    :param df_users: DataFrame (users and corresponding device names)
+    :param particle_size: Size of particles (column names of df)
+    :param public_sensors: list of public sensors
+    :return: None
+    """
+    plot_in_or_out(df, df_users, 'Out', particle_size, public_sensors)  # plot outdoor
+    plot_in_or_out(df, df_users, 'In', particle_size, public_sensors)  # plot indoor
+    if particle_size == "PM2.5_Std":
+        plot_both(df, df_users, public_sensors)  # plot both
+    return
+
+
+def io_ratio(df, df_users, line_or_box, hour_or_10: str, particle_size: str, start, end):
+    """
+    Plots Indoor/Outdoor Ratio line plots or box plots
+    :param df: DataFrame (FullData)
+    :param df_users: DataFrame (users and corresponding device names)
+    :param line_or_box: Line plot or box plot
+    :param hour_or_10: hour average or ten-minute average
+    :param particle_size: Size of particles (column names of df)
+    :return: None
+    """
+    df_final, df_users2 = io_ratio_table(df, df_users, particle_size, start, end)
+    # Ratios of the calibrated column are stored under the same names as the raw ones
+    particle = particle_size[:-len(CALIBRATED_SUFFIX)] if particle_size.endswith(CALIBRATED_SUFFIX) else particle_size
+    if hour_or_10 == "hour":
+        if particle == "PM2.5_Std":
+            write_results(df_final, 'IORatioStd', device_column='Device Name_x')
+        elif particle == "PM2.5_Env":
+            write_results(df_final, 'IORatioEnv', device_column='Device Name_x')
+    elif hour_or_10 == "10":
+        if particle == "PM2.5_Std":
+            write_results(df_final, 'IORatio10Std', device_column='Device Name_x')
+        elif particle == "PM2.5_Env":
+            write_results(df_final, 'IORatio10Env', device_column='Device Name_x')
+    else:
+        pass
+    if line_or_box == "line":
+        plot_ratio(df_final, df_users2)
+    elif line_or_box == "box":
+        if hour_or_10 == "hour":
+            boxplots(df_final, df_users2, title="I/O Ratio for Hour Average", yaxis=particle_size)
+        elif hour_or_10 == "10":
+            boxplots(df_final, df_users2, title="I/O Ratio for 10min Average", yaxis=particle_size)
+    else:
+        raise ValueError("Choose line or box")
+    return
+
+
+def ig_ratio(df, df_users, line_or_box, particle_size: str, public_sensors: list, start, end):
+    """
+    Plots Indoor/Public Sensors Ratio line plots or box plots
+    :param df: DataFrame (FullData)
+    :param df_users: DataFrame (users and corresponding device names)
+    :param line_or_box: Line plot or box plot
+    :param particle_size: Size of particles (column names of df)
+    :param public_sensors: list of public sensors
+    :return: None
+    """
+    # locations = ["Bellevue 12th SE", "Lake Forest Park", "Seattle 10th & Weller"]
+    df_ratio = gov_ratio_table(df, df_users, 'In', particle_size, public_sensors, start, end)
+    dfs_final = [df_ratio[df_ratio['Device Name_y'] == location].reset_index(drop=True)
+                 for location in public_sensors]
+    # if particle_size == "PM2.5_Std":
+    #     dfs_final[0].to_csv('Results/I_Bellevue_RatioStd.csv', index=False)
+    #     dfs_final[1].to_csv('Results/I_LFP_RatioStd.csv', index=False)
+    #     dfs_final[2].to_csv('Results/I_Seattle_RatioStd.csv', index=False)
+    # if particle_size == "PM2.5_Env":
+    #     dfs_final[0].to_csv('Results/I_Bellevue_RatioEnv.csv', index=False)
+    #     dfs_final[1].to_csv('Results/I_LFP_RatioEnv.csv', index=False)
+    #     dfs_final[2].to_csv('Results/I_Seattle_RatioEnv.csv', index=False)
+    if line_or_box == "line":
+        for count, location in enumerate(public_sensors, 0):
+            plot_ratio(dfs_final[count], df_users, location)
+    elif line_or_box == "box":
+        for count, location in enumerate(public_sensors, 0):
+            boxplots(dfs_final[count], df_users, title="Indoor/" + location + " Ratio", yaxis=particle_size)
+    else:
+        raise ValueError("Choose line or box")
+    return
+
+
+def og_ratio(df, df_users, line_or_box, particle_size: str, public_sensors: list, start, end):
+    """
+    Plots Outdoor/Public Sensors Ratio line plots or box plots
+    :param df: DataFrame (FullData)
+    :param df_users: DataFrame (users and corresponding device names)
+    :param line_or_box: Line plot or box plot
+    :param particle_size: Size of particles (column names of df)
+    :param public_sensors: list of public sensors
+    :return: None
+    """
+    df_ratio = gov_ratio_table(df, df_users, 'Out', particle_size, public_sensors, start, end)
+    dfs_final = [df_ratio[df_ratio['Device Name_y'] == location].reset_index(drop=True)
+                 for location in public_sensors]
+    # if particle_size == "PM2.5_Std":
+    #     dfs_final[0].to_csv('Results/O_Bellevue_RatioStd.csv', index=False)
+    #     dfs_final[1].to_csv('Results/O_LFP_RatioStd.csv', index=False)
+    #     dfs_final[2].to_csv('Results/O_Seattle_RatioStd.csv', index=False)
+    # if particle_size == "PM2.5_Env":
+    #     dfs_final[0].to_csv('Results/O_Bellevue_RatioEnv.csv', index=False)
+    #     dfs_final[1].to_csv('Results/O_LFP_RatioEnv.csv', index=False)
+    #     dfs_final[2].to_csv('Results/O_Seattle_RatioEnv.csv', index=False)
+    if line_or_box == "line":
+        for count, location in enumerate(public_sensors, 0):
+            plot_ratio(dfs_final[count], df_users, location, "Out")
+    elif line_or_box == "box":
+        for count, location in enumerate(public_sensors, 0):
+            boxplots(dfs_final[count], df_users, in_or_out="Out", title="Outdoor/" + location + " Ratio",
+                     yaxis=particle_size)
+    else:
+        raise ValueError("Choose line or box")
+    return
+
+
+def plot_in_or_out(df, df_users, in_or_out: str, particle_size: str, public_sensors: list):
+    """
+    Plot indoor plot or outdoor plot.
+    :param df: DataFrame (data to be plotted)
+    :param df_users: DataFrame (users with their corresponding device names)
+    :param in_or_out: Indoor or Outdoor
+    :param particle_size: Size of particles (column names of df)
+    :param public_sensors: list of public sensors
+    :return: None (show plots)
+    """
+    devices = list(pd.unique(df[df['In or Out'] == in_or_out]['Device Name']))
+    if in_or_out == 'In':
+        for sensor in public_sensors:
+            devices.append(sensor)
+    else:
+        devices_temp = devices
+        for device in devices_temp:
+            if "Beta" in device or "Breakout" in device:
+                continue
+            if device not in public_sensors:
+                devices.remove(device)
+    query = table_query(df)
+    ymin = float('inf')
+    ymax = 0
+
+    for device in devices:
+        values = query.series(device, particle_size)
+        if values.max() > ymax:
+            ymax = values.max()
+        if values.min() < ymin:
+            ymin = values.min()
+
+    if ymax > 500:
+        ymax = 500
+    fig = plt.figure()
+    gs = fig.add_gridspec(len(devices), 1)
+    for count, device in enumerate(devices, 0):
+        ax1 = fig.add_subplot(gs[count, :])
+        if device not in public_sensors:
+            color = 'blue'
+        else:
+            color = 'red'
+        values = plot_series(query, device, particle_size, "9/10/2020 0:00", "9/19/2020 0:00")
+        plt.plot(values.index, values, color)
+        user = user_case(df_users, in_or_out, device)
+        ax1.set_title(device + '\n' + user, x=1.07, y=-0.01)
+        plt.ylim([ymin, ymax])
+    for ax in plt.gcf().axes:
+        try:
+            ax.label_outer()
+        except:
+            pass
+    fig.text(0.04, 0.5, particle_size, va='center', rotation='vertical', fontsize=20)
+    plt.suptitle(in_or_out, fontsize=30)
+
+    show_figure()
+    return
+
+
+def plot_both(df, df_users, public_sensors: list):
+    """
+    Plot both indoor plot and outdoor plot.
+    :param df: DataFrame (data to be plotted)
+    :param df_users: DataFrame (users with their corresponding device names)
+    :param public_sensors: list of public sensors
+    :return: None (show plots)
+    """
+    users = pd.unique(df_users['User'])
+    users = np.delete(users, np.where(users == 'Charlie'))
+    query = table_query(df)
+    ymin = float('inf')
+    ymax = 0
+    for device in query.devices:
+        values = query.series(device, 'PM2.5_Std')
+        if values.max() > ymax:
+            ymax = values.max()
+        if values.min() < ymin:
+            ymin = values.min()
+    if ymax > 500:
+        ymax = 500
+    fig = plt.figure()
+    gs = fig.add_gridspec(len(users) + 2, 1)
+    for count, user in enumerate(users, 0):
+        ax1 = fig.add_subplot(gs[count, :])
+        if user != "Igor":
+            for device in df_users[df_users['User'] == user][['In', 'Out']].values.tolist()[0]:
+                if device in query.slices:
+                    values = query.series(device, 'PM2.5_Std', "9/10/2020 0:00", "9/19/2020 0:00")
+                    plt.plot(values.index, values, label=query.frame(device)['In or Out'].values[0])
+        else:
+            for i in range(2):
+                for device in df_users[df_users['User'] == user][['In', 'Out']].values.tolist()[i]:
+                    if device in query.slices:
+                        if device == "Beta-11" or device == "Beta-14":
+                            label = query.frame(device)['In or Out'].values[0] + " " + device
+                        else:
+                            label = query.frame(device)['In or Out'].values[0]
+                        values = query.series(device, 'PM2.5_Std', "9/10/2020 0:00", "9/19/2020 0:00")
+                        plt.plot(values.index, values, label=label)
+        ax1.set_title(user, x=1.07, y=-0.01)
+        plt.ylim([ymin, ymax])
+        plt.legend()
+    for count, device in enumerate(public_sensors, len(users)):
+        ax1 = fig.add_subplot(gs[count, :])
+        values = query.series(device, 'PM2.5_Std', "9/10/2020 0:00", "9/19/2020 0:00")
+        plt.plot(values.index, values, 'red', label='Out')
+        ax1.set_title(device, x=1.07, y=-0.01)
+        plt.ylim([ymin, ymax])
+        plt.legend()
+    for ax in plt.gcf().axes:
+        try:
+            ax.label_outer()
+        except:
+            pass
+    fig.text(0.04, 0.5, 'PM2.5(μg/m^3)', va='center', rotation='vertical', fontsize=20)
+    plt.suptitle('Indoor v Outdoor', fontsize=30)
+    show_figure()
+    return
+
+
+def plot_ratio(df, df_users, location=None, in_or_out="In"):
+    """
+    Plot line plots for Indoor/Outdoor Ratio
+    :param df: DataFrame (I/O Ratio)
+    :param df_users: DataFrame (Users and corresponding device names)
+    :param location: location name
+    :param in_or_out: Indoor or Outdoor
+    :return: None (shows plot)
+    """
+    devices = pd.unique(df['Device Name_x'])
+    xmin = df['PT DateTime'].min()
+    xmax = df['PT DateTime'].max()
+    ymin = 0
+    ymax = 3
+    fig = plt.figure()
+    gs = fig.add_gridspec(len(devices), 1)
+    for count, device in enumerate(devices, 0):
+        ax1 = fig.add_subplot(gs[count, :])
+        plt.axhline(y=1, color='r', linestyle='--')
+        plt.plot(df[df['Device Name_x'] == device]['PT DateTime'], df[df['Device Name_x'] == device]['I/O Ratio'],
+                 'blue')
+        user = user_case(df_users, in_or_out, device)
+        ax1.set_title(user, x=1.07, y=-0.01)
+        plt.xlim([xmin, xmax])
+        plt.ylim([ymin, ymax])
+    for ax in plt.gcf().axes:
+        try:
+            ax.label_outer()
+        except:
+            pass
+
+    fig.text(0.04, 0.5, 'I/O Ratio', va='center', rotation='vertical', fontsize=20)
+    if location is None:
+        plt.suptitle('I/O Ratio', fontsize=20)
+    else:
+        plt.suptitle("Indoor/" + location + " Ratio", fontsize=20)
+    show_figure()
+    return
+
+
+def boxplots(df, df_users, title: str, yaxis: str, in_or_out="In", upper=None):
+    """
+    Plot boxplots
+    :param df: DataFrame (I/O Ratio)
+    :param df_users: DataFrame (Users and corresponding device names)
+    :param title: Plot title
+    :param yaxis: Y-axis title
+    :param upper: float (ratios at or above are left out; None uses the upper Tukey fence of all ratios)
+    :return: None (Show plots)
+    """
+    import plotly.graph_objects as go
+    if upper is None:
+        upper = tukey_fences(df["I/O Ratio"])[1]
+    fig = go.Figure()
+    for device in pd.unique(df["Device Name_x"]):
+        user = user_case(df_users, in_or_out, device)
+        fig.add_trace(
+            go.Box(y=df[df["Device Name_x"] == device][df["I/O Ratio"] < upper]["I/O Ratio"].values, name=user))
+        # fig.add_trace(
+        #     go.Box(y=df[df["Device Name_x"] == device]["I/O Ratio"].values, name=user))
+    fig.update_layout(
+        title=title,
+        yaxis_title=yaxis,
+        yaxis=dict(
+            range=[0, upper]
+        ),
+        paper_bgcolor='rgba(255,255,255,1)',
+        plot_bgcolor='rgba(255,255,255,1)'
+    )
+    fig.update_xaxes(showline=True, linewidth=2, linecolor='black')
+    fig.update_yaxes(showline=True, linewidth=2, linecolor='black', gridcolor='black')
+
+    show_figure(fig)
+    return
+
+
+def individual_vs_all(df, df_users, particle_size: str, public_sensors=None
+                      , end_date="9/19/2020 0:00"):
+    """
+    Draws subplots that plot individual sensor's air particle data against its average and public sensors' data
+    :param df: DataFrame (FullData)
+    :param df_users: DataFrame (Users and corresponding device names)
+    :param df_ave: DataFrame (Includes Average column)
+    :param particle_size: Size of particles (column names of df)
+    :param in_or_out: Indoor or Outdoor
+    :param public_sensors: list of public sensors
+    :return: None
+    """
+    first = True
+    plt.rc('xtick', labelsize=15)
+    plt.rc('ytick', labelsize=15)
+    devices = []
+    devices_out = []
+    igor_ = False
+    igors = []
+    query = table_query(df)
+    hourly = regular_grid(query, "hour")
+    for device in list(df_users["In"].dropna()):
+        if device in query.slices:
+            if device == "Beta-11" or device == "Beta-14":
+                if igor_ is False:
+                    devices.append("Igor")
+                    igor_ = True
+                igors.append(device)
+            else:
+                devices.append(device)
+    # for device in list(df_users["Out"].dropna()):
+    #     if device in df_devices:
+    #         if device not in devices_out:
+    #             devices_out.append(device)
+
+
+    fig = plt.figure()
+    for count, device in enumerate(devices, 1):
+        # fig = plt.figure()
+        user_out = df_users[df_users["In"] == device]["Out"].reset_index(drop=True)[0]
+        # if device != "Igor":
+        if device == "Beta-12":
+            start_date = "9/13/2020 0:00"
+        else:
+            start_date = "9/10/2020 0:00"
+        plt.subplot(np.ceil(len(devices)/2), 2, count)
+        # if device != "Breakout-02" and device != "Breakout-02 test":
+        if device != "Igor":
+            values = downsample(hourly.series(device, particle_size, "9/10/2020 0:00", end_date))
+            plt.plot(values.index, values, label=user_case(df_users, "In", device))
+        else:
+            linestyle = "-"
+            for igor in igors:
+                values = downsample(hourly.series(igor, particle_size, "9/10/2020 0:00", end_date))
+                plt.plot(values.index, values, color="#1f77b4", linestyle=linestyle, label=user_case(df_users,
+                                                                                                      "In", igor))
+                linestyle = "-."
+        plt.legend(prop={'size': 20})
+
+
+        values = downsample(hourly.series(user_out, particle_size, "9/10/2020 0:00", end_date))
+        plt.plot(values.index, values,
+                 label=user_case(df_users, "Out", user_out),
+                 color="purple")
+        if public_sensors is not None:
+            color = "#ff7f0e"
+            for place in public_sensors:
+                if place == "Lake Forest Park":
+                    abbrev = "LFP"
+                if place == "Seattle 10th & Weller":
+                    abbrev = "S&W"
+                values = plot_series(query, place, "PM2.5_Std", "9/10/2020 0:00", end_date)
+                plt.plot(values.index, values, color=color,label="Reference Monitor " + abbrev)
+                color = "#2ca02c"
+        dtfmt = mdates.DateFormatter("%m-%d")
+        plt.gca().xaxis.set_major_formatter(dtfmt)
+
+        plt.ylim([0, 450])
+
+    fig.text(0.04, 0.5, "PM2.5 Concentration (µg/$m^{3}$)", va='center', rotation='vertical', fontsize=30)
+    fig.text(0.5, 0.04, 'Date', ha='center', fontsize=30)
+    show_figure()
+    return
+
+
+def moving_vs_static(df, df_users, particle_size, freq: str, df2=None, start="9/10/2020 0:00", end="9/19/2020 0:00"):
+    df_test = personal_frame(df)
+    fig = plt.figure()
+    plt.plot(
+        df_test[(df_test["PT DateTime"] >= start) & (df_test["PT DateTime"] <= end)] \
+            ["PT DateTime"], df_test \
+            [(df_test["PT DateTime"] >= start) & (df_test["PT DateTime"] <= end)] \
+            [particle_size], label=user_case(df_users, None, "Breakout-02")
+    )
+
+    if df2 is None:
+        df2 = df
+    query2 = table_query(df2)
+
+    for device in ["Beta-11", "Beta-14"]:
+        values = query2.series(device, particle_size, start, end)
+        plt.plot(values.index, values, label=user_case(df_users, "In", device) + " Indoor")
+    values = query2.series("Beta-16", particle_size, start, end)
+    plt.plot(values.index, values, label="Location 1 Outdoor")
+    values = query2.series("Seattle 10th & Weller", "PM2.5_Std", start, end)
+    plt.plot(values.index, values, label="Seattle 10th & Weller")
+    fmt = "%m/%d/%Y %H:%S"
+    tdelta = datetime.strptime(end, fmt) - datetime.strptime(start, fmt)
+    if tdelta.days > 2:
+        dtfmt = mdates.DateFormatter("%m-%d")
+        plt.gca().xaxis.set_major_formatter(dtfmt)
+    plt.legend(prop={'size': 20})
+    plt.ylim([0,250])
+    plt.ylabel("PM2.5_Env Concentration", fontsize=25)
+    plt.xlabel("Date", fontsize=25)
+    fig.suptitle("Personal Exposure " + freq, fontsize=45)
+    show_figure()
+    return
+
+
+def freq_comparison(df, df_10min, df_1min, particle_size: str, df2=None, additional=None,
+                    start="9/10/2020 0:00", end="9/19/2020 0:00",
+                    public_sensors=False):
+    dfs = [df, df_10min, df_1min]
+    df_tests = []
+    for df in dfs:
+        df_test = personal_frame(df)
+        df_tests.append(df_test)
+    freqs = ["Hour", "10 min", "1 min"]
+    fig, ax = plt.subplots(nrows=3, ncols=1, sharex=True)
+    for count, row in enumerate(ax, 0):
+        df_window = df_tests[count][(df_tests[count]["PT DateTime"] >= start) & (df_tests[count]["PT DateTime"] <= end)]
+        values = downsample(df_window.set_index("PT DateTime")[particle_size])
+        row.plot(values.index, values, label="Personal Exposure")
+        if public_sensors:
+            values = plot_series(dfs[count], "Seattle 10th & Weller", "PM2.5_Std", start, end)
+            row.plot(values.index, values, "r", label="Seattle 10th & Weller")
+        if additional:
+            if df2 is None:
+                df2 = dfs[count]
+            query2 = table_query(df2)
+            if additional == "Indoor 1":
+                values = plot_series(query2, "Beta-11", particle_size, start, end)
+                row.plot(values.index, values, "g", label="Location 1-1 Indoor")
+            elif additional == "Indoor 2":
+                values = plot_series(query2, "Beta-14", particle_size, start, end)
+                row.plot(values.index, values, "orange", label="Location 1-2 Indoor")
+            elif additional == "Outdoor":
+                values = plot_series(query2, "Beta-16", particle_size, start, end)
+                row.plot(values.index, values, "purple", label="Location 1 Outdoor")
+        row.set_title(freqs[count], size=20)
+        row.set_ylim([0,250])
+    fmt = "%m/%d/%Y %H:%S"
+    tdelta = datetime.strptime(end, fmt) - datetime.strptime(start, fmt)
+    if tdelta.days > 2:
+        dtfmt = mdates.DateFormatter("%m-%d")
+        plt.gca().xaxis.set_major_formatter(dtfmt)
+    plt.legend()
+    plt.suptitle("Personal Exposure Frequency Comparison", fontsize=45)
+    fig.text(0.04, 0.5, "PM2.5 Concentration (ug/m^3)", va='center', rotation='vertical', fontsize=20)
+    fig.text(0.5, 0.04, 'Date', ha='center', fontsize=20)
+    show_figure()
+    return
+
+
+def moving_vs_static2(df, additionals: list, particle_size, freq,
+                      df2=None, start="9/10/2020 0:00", end="9/19/2020 0:00", places=None):
+    """
+    Plot the personal exposure of the moving sensor against placed sensors
+    :param df: DataFrame (table holding Breakout-02)
+    :param additionals: list of placed sensors to add ("Indoor 1", "Indoor 2", "Outdoor", "public", "MEB")
+    :param particle_size: Size of particles (column names of df)
+    :param freq: str (time step of the personal series, e.g. "10min")
+    :param df2: DataFrame (table holding the placed sensors)
+    :param start: start of the window
+    :param end: end of the window
+    :param places: list of places (see geofence.load_places) to shade where the personal sensor dwelled; None
+                   shades the night hours
+    :return: None (shows plots)
+    """
+    plt.rc('xtick', labelsize=15)
+    plt.rc('ytick', labelsize=15)
+    values = downsample(regular_grid(df, freq).series("Breakout-02", particle_size, start, end))
+    plt.plot(values.index, values, linewidth=0.6, label="Personal Exposure")
+    if places is not None:
+        segments = dwell_segments(table_query(df).frame("Breakout-02", start, end), places, particle_size)
+        segments = segments[segments['Dwell'] & (segments['Place'] != NO_FIX)]
+        shades = {}
+        for place, segment_start, segment_end in zip(segments['Place'], segments['Start'], segments['End']):
+            label = "_" + place if place in shades else place
+            shades.setdefault(place, plt.cm.tab10(len(shades) % 10))
+            plt.axvspan(segment_start, segment_end, color=shades[place], alpha=0.3, lw=0, label=label)
+    else:
+        start_date = datetime.strptime(start, "%m/%d/%Y %H:%M")
+        end_date = datetime.strptime(end, "%m/%d/%Y %H:%M")
+        plt.axvspan(start_date, start_date + timedelta(hours=6), color='grey', alpha=0.5, lw=0)
+        start_date += timedelta(hours=21)
+        while start_date < end_date:
+            if end_date.day - start_date.day == 1:
+                plt.axvspan(start_date, start_date + timedelta(hours=3), color='grey', alpha=0.5, lw=0)
+            else:
+                plt.axvspan(start_date, start_date + timedelta(hours=9), color='grey', alpha=0.5, lw=0)
+            start_date += timedelta(days=1)
+
+    for add in additionals:
+        if add == "Indoor 1":
+            color = "g"
+            device = "Beta-11"
+            label = "L2-a Indoor"
+        if add == "Indoor 2":
+            color = "orange"
+            device = "Beta-14"
+            label = "L2-b Indoor"
+        if add == "Outdoor":
+            color = "purple"
+            device = "Beta-16"
+            label = "L2 Outdoor"
+        if add == "public":
+            color = "red"
+            device = "Seattle 10th & Weller"
+            label = "Reference Monitor #2"
+        if add == "MEB":
+            color = "brown"
+            device = "Beta-08"
+            label = "Location 0 Indoor"
+        values = plot_series(df2, device, particle_size, start, end)
+        plt.plot(values.index, values, color, linewidth=0.6, label=label)
+    fmt = "%m/%d/%Y %H:%S"
+    tdelta = datetime.strptime(end, fmt) - datetime.strptime(start, fmt)
+    if tdelta.days > 2:
+        dtfmt = mdates.DateFormatter("%m-%d")
+        plt.gca().xaxis.set_major_formatter(dtfmt)
+    plt.legend(prop={'size': 20})
+    # plt.title("Personal Exposure (1 min) vs Placed Sensors (10 min)", fontsize=45)
+    plt.ylabel("PM2.5 Concentration (µg/$m^{3}$)", fontsize=30)
+    plt.xlabel('Date', fontsize=30)
+    plt.ylim([0, 250])
+    show_figure()
+    return
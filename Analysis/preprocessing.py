@@ -0,0 +1,185 @@
+"""
+This .py file contains the preprocessing functions: device location and indoor/outdoor tagging, timestamp
+reformatting, time-bucket averages and the Puget Sound public sensor reformat. It only needs pandas and NumPy, so the
+preprocessing pipeline starts without the plotting and geo stacks.
+"""
+import numpy as np
+import pandas as pd
+from assembly import assemble_frames
+from qc import QC_COLUMN, good_rows, qc_flags
+from registry import device_by_file, device_info, device_user
+from timestamps import TIMEZONE, floor_timestamps, garbage_rows, localize_wall_time, normalize_timestamps
+
+
+def get_device_location(df, device_name=None):
+    """
+    Organize datasets, then set coordinates, classify indoor/outdoor according to the device registry
+    :param df: Dataframe (Raw Data)
+    :param device_name: str (if None, the device name is taken from the first row of df)
+    :return device_name: str
+    :return df: cleaned DataFrame
+    """
+    if device_name is None:
+        device_name = df['Date'][0]
+        df.drop([0], inplace=True)
+    df.insert(0, column='Device Name', value=device_name)
+    df.reset_index(drop=True, inplace=True)
+    device = device_info(device_name)
+    df.insert(5, column='In or Out', value=device['In or Out'])
+    # Fixed sensors get their registered coordinates; the others keep their logged GPS position
+    if not np.isnan(device['Latitude']):
+        df['Latitude'] = device['Latitude']
+        df['Longitude'] = device['Longitude']
+    return device_name, df
+
+
+def get_devices_location(df, device_names):
+    """
+    Set the device names, coordinates and indoor/outdoor tags of the rows of several devices at once (see
+    get_device_location), looking every device up once
+    :param df: DataFrame (Raw Data of several devices, without device-name rows)
+    :param device_names: 1-D array of str (device of every row)
+    :return df: DataFrame (cleaned data, same columns as get_device_location)
+    """
+    names, codes = np.unique(np.asarray(device_names, dtype=object), return_inverse=True)
+    devices = [device_info(name) for name in names]
+    df.insert(0, column='Device Name', value=names[codes])
+    df.reset_index(drop=True, inplace=True)
+    df.insert(5, column='In or Out', value=np.array([device['In or Out'] for device in devices], dtype=object)[codes])
+    # Fixed sensors get their registered coordinates; the others keep their logged GPS position
+    latitude = np.array([device['Latitude'] for device in devices], dtype=np.float64)[codes]
+    fixed = ~np.isnan(latitude)
+    if fixed.any():
+        longitude = np.array([device['Longitude'] for device in devices], dtype=np.float64)[codes]
+        df['Latitude'] = np.where(fixed, latitude, df['Latitude'].to_numpy(dtype=np.float64))
+        df['Longitude'] = np.where(fixed, longitude, df['Longitude'].to_numpy(dtype=np.float64))
+    return df
+
+
+def get_averages(df, freq: str):
+    """
+    Calculate averages over time buckets of all columns other than 'Date','Time','Battery','Fix','Latitude',
+    'Longitude', skipping the rows flagged by the QC stage
+    :param df: DataFrame (reformatted data)
+    :param freq: str ("hour", "10Min", "1Min", "10S")
+    :return df: DataFrame (with averages; PT DateTime is the start of each bucket)
+    """
+    cols_average = df.columns.drop(['Device Name', 'Date', 'Time', 'PT DateTime', 'Battery', 'Fix',
+                                    'Latitude', 'Longitude', 'In or Out', QC_COLUMN], errors='ignore')
+    # Frames read by ingest.read_device_log are already typed; only coerce columns still holding strings
+    cols_object = [column for column in cols_average if not pd.api.types.is_numeric_dtype(df[column])]
+    if cols_object:
+        df[cols_object] = df[cols_object].apply(pd.to_numeric, errors='coerce')
+    buckets = floor_timestamps(df['PT DateTime'], freq)
+    # Rows flagged by the QC stage are left out of the means (their buckets stay, NaN if nothing is left)
+    df_final = df[cols_average].where(pd.Series(good_rows(df), index=df.index), axis=0).groupby(
+        [df['Device Name'], buckets, df['Latitude'], df['Longitude'], df['In or Out']])[cols_average].mean()
+    df_final.reset_index(inplace=True)
+    return df_final
+
+
+def get_hour_averages(df):
+    """
+    Calculate hourly averages of all columns other than 'Date','Time','Battery','Fix','Latitude','Longitude'
+    :param df: DataFrame (cleaned data)
+    :return df: DataFrame (with hourly averages)
+    """
+    return get_averages(df, "hour")
+
+
+def get_minute_averages(df):
+    """
+    (This function was not used but I kept it in case we need it in the future)
+    Calculate minute averages of all columns other than 'Date','Time','Battery','Fix','Latitude','Longitude'
+    :param df: DataFrame (cleaned data)
+    :return df: DataFrame (with minute averages)
+    """
+    return get_averages(df, "1Min")
+
+
+def get_10min_averages(df):
+    """
+    Calculate ten-minute averages of all columns other than 'Date','Time','Battery','Fix','Latitude','Longitude'
+    :param df: DataFrame (cleaned data)
+    :return df: DataFrame (with ten-minute averages)
+    """
+    return get_averages(df, "10Min")
+
+
+def UTC_to_PST(df):
+    """
+    Convert UTC to PT (DST aware)
+    :param df: DataFrame (cleaned data, naive PT DateTime in UTC)
+    :return df: DataFrame (with datetime converted to PT)
+    """
+    df['PT DateTime'] = pd.to_datetime(df['PT DateTime']).dt.tz_localize('UTC').dt.tz_convert(TIMEZONE)
+    return df
+
+
+def reformat(df, device_name, stream=None, final=False):
+    """
+    Remove rows with incorrect dates, add the column PT DateTime (tz-aware datetime in America/Los_Angeles) and the
+    QC flag column (see qc.qc_flags). AM/PM labels are not stored; use timestamps.am_pm where a plot needs them.
+    :param df: DataFrame (cleaned data)
+    :param device_name: str (None when df holds the rows of several devices, see get_devices_location)
+    :param stream: qc.QCStream (df is the next batch of a longer log: the rows its flags are settled for are
+                   returned, see QCStream.add; None flags df as a whole log)
+    :param final: bool (with stream: df ends the log, so every row is returned)
+    :return df: DataFrame (reformatted data)
+    """
+    df = df[~garbage_rows(df['Date'])].reset_index(drop=True)
+    keys = df['Device Name'].to_numpy() if 'Device Name' in df.columns else None
+    df.insert(3, column='PT DateTime', value=normalize_timestamps(df['Date'], df['Time'], keys=keys))
+    # if device_name == 'Breakout-08':
+    #     print("in")
+    #     df = UTC_to_PST(df)
+    df = df[df['PT DateTime'].notna()].reset_index(drop=True)
+    if stream is not None:
+        return stream.add(df, final)
+    df[QC_COLUMN] = qc_flags(df)
+    return df
+
+
+def concat_df(dfs: list):
+    """
+    Concatenate a list of Dataframe
+    :param dfs: list
+    :return df: DataFrame (concatenated DataFrame)
+    """
+    return assemble_frames(dfs)
+
+
+def puget_air_reformat(df, fileloc, columns):
+    """
+    Reformat Puget Air data to match our data's format
+    :param df: DataFrame (Raw Data)
+    :param fileloc: str (file location)
+    :param columns:  list
+    :return df: DataFrame (cleaned data)
+    """
+    device = device_by_file(fileloc)
+    df.insert(0, column='Device Name', value=device['Device Name'])
+    df.insert(2, column='Latitude', value=device['Latitude'])
+    df.insert(3, column='Longitude', value=device['Longitude'])
+    # The hourly rows are in time order, so the repeated hour of the DST change is resolved from their order
+    df['PT DateTime'] = localize_wall_time(pd.to_datetime(df['PT DateTime']))
+    df = df[df['PT DateTime'].notna()].reset_index(drop=True)
+    for column in columns:
+        if column in df.columns:
+            continue
+        if column == 'In or Out':
+            df[column] = device['In or Out']
+            continue
+        df[column] = 0
+    return df[list(columns)]
+
+
+def user_case(df_users, in_or_out: str, device_name: str):
+    """
+    Find user/owner of DataFrame/device names.
+    :param df_users: DataFrame (users and corresponding device names)
+    :param in_or_out: str
+    :param device_name: str
+    :return user: str
+    """
+    return device_user(df_users, in_or_out, device_name)
@@ -0,0 +1,355 @@
+"""
+This .py file contains the quality control stage that flags bad raw readings before they are averaged: Hampel
+filters (rolling median / MAD), stuck-value and zero runs, battery brownouts and PMS saturation are written as bits
+of one compact flag column, and the aggregations skip flagged rows. Paired indoor/outdoor devices are cross-checked
+on the ratio grid, and outlier fences are computed from the data. Thresholds are read from qc.json.
+Logs that arrive in batches (live flushes, incremental runs, chunks) go through a QCStream, so they get the flags
+of the whole log read at once.
+"""
+from functools import lru_cache
+import json
+import os
+import numpy as np
+import pandas as pd
+from timestamps import TIMEZONE
+
+QC_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "qc.json")
+QC_COLUMN = 'QC'
+HAMPEL = 1
+STUCK = 2
+ZERO = 4
+BATTERY = 8
+SATURATED = 16
+FLAGS = {"Hampel": HAMPEL, "Stuck": STUCK, "Zero": ZERO, "Battery": BATTERY, "Saturated": SATURATED}
+MAD_TO_SIGMA = 1.4826
+
+
+@lru_cache(maxsize=None)
+def load_thresholds(config=QC_FILE):
+    """
+    Load the QC thresholds once per process
+    :param config: str (location of qc.json)
+    :return: dict (column, channels, hampel, stuck, zero, battery, saturation, pair)
+    """
+    with open(config, 'r') as f:
+        return json.load(f)
+
+
+def hampel_matrix(matrix, window: int, n_sigmas: float, min_deviation=0.0):
+    """
+    Hampel filter of every column at once: a value is an outlier when it is further from the centered rolling
+    median than n_sigmas robust standard deviations (1.4826 x rolling MAD), and further than min_deviation (so
+    flat stretches with a MAD of 0 do not flag every small change)
+    :param matrix: 2-D float array (samples x series), NaN where there is no value
+    :param window: int (samples per window, centered)
+    :param n_sigmas: float
+    :param min_deviation: float (in the units of matrix)
+    :return: 2-D boolean array (True for outliers; NaN values are never outliers)
+    """
+    values = pd.DataFrame(matrix)
+    median = values.rolling(window, center=True, min_periods=1).median()
+    deviation = (values - median).abs()
+    mad = deviation.rolling(window, center=True, min_periods=1).median()
+    limit = np.maximum(n_sigmas * MAD_TO_SIGMA * mad.to_numpy(), min_deviation)
+    with np.errstate(invalid='ignore'):
+        return deviation.to_numpy() > limit
+
+
+def hampel(values, window: int, n_sigmas: float, min_deviation=0.0, groups=None):
+    """
+    Hampel filter of one series (see hampel_matrix)
+    :param values: 1-D float array
+    :param groups: 1-D int array (contiguous series codes, e.g. devices; windows never span two series; None for one)
+    :return: 1-D boolean array
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if groups is None:
+        return hampel_matrix(values[:, None], window, n_sigmas, min_deviation)[:, 0]
+    # Contiguous groups come out of an unsorted groupby in their own order, so the result is in row order
+    series = pd.Series(values)
+    median = series.groupby(groups, sort=False).rolling(window, center=True, min_periods=1).median().to_numpy()
+    deviation = pd.Series(np.abs(values - median))
+    mad = deviation.groupby(groups, sort=False).rolling(window, center=True, min_periods=1).median().to_numpy()
+    limit = np.maximum(n_sigmas * MAD_TO_SIGMA * mad, min_deviation)
+    with np.errstate(invalid='ignore'):
+        return deviation.to_numpy() > limit
+
+
+def run_starts(keys):
+    """
+    Find the runs of equal consecutive keys
+    :param keys: 1-D array, or 2-D array whose rows are compared as a whole (NaN never repeats, so it ends a run)
+    :return: 1-D int array (first row of every run)
+    """
+    keys = np.asarray(keys)
+    changed = keys[1:] != keys[:-1]
+    if keys.ndim > 1:
+        changed = changed.any(axis=1)
+    return np.flatnonzero(np.r_[True, changed])
+
+
+def long_runs(keys, nanoseconds, min_duration, where=None):
+    """
+    Find the rows of runs of equal consecutive keys lasting at least min_duration (first to last sample)
+    :param keys: 1-D or 2-D array (see run_starts)
+    :param nanoseconds: 1-D int64 array (sample times, in log order)
+    :param min_duration: str or Timedelta
+    :param where: 1-D boolean array (only runs starting on a True row count; None counts every run)
+    :return: 1-D boolean array
+    """
+    keys = np.asarray(keys)
+    if not len(keys):
+        return np.zeros(0, dtype=bool)
+    starts = run_starts(keys)
+    stops = np.r_[starts[1:], len(keys)] - 1
+    long_enough = nanoseconds[stops] - nanoseconds[starts] >= pd.Timedelta(min_duration).value
+    if where is not None:
+        long_enough &= np.asarray(where, dtype=bool)[starts]
+    return np.repeat(long_enough, stops - starts + 1)
+
+
+def channel_matrix(df, thresholds):
+    """
+    :param df: DataFrame (reformatted data of one device)
+    :param thresholds: dict (see load_thresholds)
+    :return: 2-D float64 array (row x PM and particle count channel of qc.json present in df)
+    """
+    return df[[column for column in thresholds['channels'] if column in df.columns]].to_numpy(dtype=np.float64)
+
+
+def device_codes(df):
+    """
+    :param df: DataFrame (reformatted data, the rows of every device contiguous)
+    :return: 1-D int64 array (code of the Device Name of every row, in order of appearance; 0 without the column)
+    """
+    if 'Device Name' not in df.columns:
+        return np.zeros(len(df), dtype=np.int64)
+    return pd.factorize(df['Device Name'])[0].astype(np.int64)
+
+
+def run_keys(channels, codes):
+    """
+    :param channels: 2-D float array (see channel_matrix)
+    :param codes: 1-D int array (see device_codes)
+    :return: 2-D float64 array (the channels after the device code, so runs end where a device does)
+    """
+    return np.column_stack([codes.astype(np.float64), channels])
+
+
+def qc_flags(df, thresholds=None):
+    """
+    Flag the raw readings of device logs in log order. The Hampel test runs on the QC column of qc.json
+    (PM2.5_Std by default). A stuck or zero run needs every PM and particle count channel of qc.json frozen (at 0
+    for a zero run): clean air reads 0 ug/m3 for hours, while the counts of a working sensor keep moving.
+    Several devices are flagged at once when their rows are contiguous, every device on its own.
+    Batches of a longer log need a QCStream to get the flags of the whole log.
+    :param df: DataFrame (reformatted data of one or more devices, with PT DateTime and Battery)
+    :param thresholds: dict (see load_thresholds; None uses qc.json)
+    :return: 1-D uint8 array (bits HAMPEL, STUCK, ZERO, BATTERY, SATURATED; 0 for good rows)
+    """
+    if thresholds is None:
+        thresholds = load_thresholds()
+    flags = np.zeros(len(df), dtype=np.uint8)
+    if not len(df):
+        return flags
+    values = df[thresholds['column']].to_numpy(dtype=np.float64)
+    times = pd.DatetimeIndex(df['PT DateTime'])
+    nanoseconds = np.asarray((times - times[0]) // pd.Timedelta(1, 'ns'), dtype=np.int64)
+    codes = device_codes(df)
+    groups = codes if codes[-1] else None
+    settings = thresholds['hampel']
+    flags[hampel(values, settings['window'], settings['n_sigmas'], settings['min_deviation'], groups)] |= HAMPEL
+    channels = channel_matrix(df, thresholds)
+    keys = channels if groups is None else run_keys(channels, codes)
+    zeros = (channels == 0).all(axis=1)
+    flags[long_runs(keys, nanoseconds, thresholds['stuck']['min_duration'], ~zeros)] |= STUCK
+    flags[long_runs(keys, nanoseconds, thresholds['zero']['min_duration'], zeros)] |= ZERO
+    with np.errstate(invalid='ignore'):
+        flags[df['Battery'].to_numpy(dtype=np.float64) < thresholds['battery']['min_volts']] |= BATTERY
+        flags[values >= thresholds['saturation']] |= SATURATED
+    return flags
+
+
+def unsettled_from(df, thresholds=None):
+    """
+    Find, for every device, the first row whose flags could still change when more rows of its log follow: the
+    last `window` rows (the Hampel windows of their neighbours reach past the end), and a trailing frozen run that
+    is not long enough to be flagged yet
+    :param df: DataFrame (reformatted data of one or more devices, the rows of every device contiguous)
+    :param thresholds: dict (see load_thresholds; None uses qc.json)
+    :return starts: 1-D int array (first row of every device)
+    :return cut: 1-D int array (first unsettled row of every device; the end of the device when every row is settled)
+    """
+    if thresholds is None:
+        thresholds = load_thresholds()
+    if not len(df):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    codes = device_codes(df)
+    starts = run_starts(codes)
+    stops = np.r_[starts[1:], len(df)]
+    cut = np.maximum(stops - thresholds['hampel']['window'], starts)
+    channels = channel_matrix(df, thresholds)
+    runs = run_starts(run_keys(channels, codes))
+    last = stops - 1
+    run = runs[np.searchsorted(runs, last, side='right') - 1]
+    times = pd.DatetimeIndex(df['PT DateTime'])
+    nanoseconds = np.asarray((times - times[0]) // pd.Timedelta(1, 'ns'), dtype=np.int64)
+    limit = np.where((channels[last] == 0).all(axis=1), pd.Timedelta(thresholds['zero']['min_duration']).value,
+                     pd.Timedelta(thresholds['stuck']['min_duration']).value)
+    short = nanoseconds[last] - nanoseconds[run] < limit
+    return starts, np.where(short, np.minimum(cut, run), cut)
+
+
+class QCStream:
+    """
+    Quality control of device logs that arrive in batches (live flushes, incremental runs, chunks). Every batch is
+    flagged together with the end of the rows before it, and the rows a later batch could still change the flags
+    of (see unsettled_from) are held back until one settles them, so the flags are those of the whole log read at
+    once. A batch may hold many devices (a live flush): they are flagged in one pass, every device on its own. The
+    state (a few dozen rows per device) can be saved with the watermark of the log.
+    """
+
+    def __init__(self, thresholds=None, state=None):
+        """
+        :param thresholds: dict (see load_thresholds; None uses qc.json)
+        :param state: dict (from state(); None starts at the beginning of the log)
+        """
+        self.thresholds = load_thresholds() if thresholds is None else thresholds
+        self.context = None
+        self.held = None
+        if state is not None:
+            self.context = _rows_from_json(state.get('context'))
+            self.held = _rows_from_json(state.get('held'))
+
+    def add(self, df, final=False):
+        """
+        Flag a batch
+        :param df: DataFrame (reformatted rows following the previous batch, without the QC column; with a Device
+            Name column when the stream carries more than one device)
+        :param final: bool (the logs end here: the held rows are settled as well)
+        :return df: DataFrame (rows settled by this batch with the QC column, device by device in order of first
+            appearance, the held rows of every device first)
+        """
+        parts = [part for part in (self.context, self.held, df) if part is not None and len(part)]
+        if not parts:
+            return df.assign(**{QC_COLUMN: np.zeros(len(df), dtype=np.uint8)})
+        frame = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0].reset_index(drop=True)
+        context = np.zeros(len(frame), dtype=bool)
+        context[:0 if self.context is None else len(self.context)] = True
+        codes = device_codes(frame)
+        if codes.any():
+            order = np.argsort(codes, kind='stable')
+            frame = frame.iloc[order].reset_index(drop=True)
+            context = context[order]
+        starts, cut = unsettled_from(frame, self.thresholds)
+        if final:
+            cut = np.r_[starts[1:], len(frame)]
+        cut = np.maximum(cut, starts + np.add.reduceat(context.astype(np.int64), starts))
+        sizes = np.diff(np.r_[starts, len(frame)])
+        position = np.arange(len(frame))
+        stop = np.repeat(cut, sizes)
+        flags = qc_flags(frame, self.thresholds)
+        settled_rows = ~context & (position < stop)
+        settled = frame[settled_rows].reset_index(drop=True)
+        settled[QC_COLUMN] = flags[settled_rows]
+        self.held = frame[position >= stop].reset_index(drop=True)
+        # Context: the Hampel windows of the next rows, and the first row of a frozen run they may continue
+        window = self.thresholds['hampel']['window']
+        keep = (position >= np.repeat(np.maximum(cut - window, starts), sizes)) & (position < stop)
+        done = cut[cut > starts]
+        runs = run_starts(run_keys(channel_matrix(frame, self.thresholds), device_codes(frame)))
+        keep[runs[np.searchsorted(runs, done - 1, side='right') - 1]] = True
+        self.context = frame[keep].reset_index(drop=True)
+        return settled
+
+    def finish(self):
+        """
+        Settle the held rows at the end of the log
+        :return df: DataFrame (the held rows with the QC column)
+        """
+        if self.held is None or not len(self.held):
+            return None
+        return self.add(self.held.iloc[:0], final=True)
+
+    def state(self):
+        """
+        :return: dict (JSON-serializable context and held rows)
+        """
+        return {'context': _rows_to_json(self.context), 'held': _rows_to_json(self.held)}
+
+
+def _rows_to_json(df):
+    """
+    :param df: DataFrame or None
+    :return: dict of column -> list (PT DateTime as ISO strings), or None
+    """
+    if df is None:
+        return None
+    rows = {column: df[column].tolist() for column in df.columns}
+    rows['PT DateTime'] = [timestamp.isoformat() for timestamp in df['PT DateTime']]
+    return rows
+
+
+def _rows_from_json(rows):
+    """
+    :param rows: dict from _rows_to_json, or None
+    :return: DataFrame or None
+    """
+    if rows is None:
+        return None
+    df = pd.DataFrame(rows)
+    df['PT DateTime'] = pd.to_datetime(df['PT DateTime'], format='ISO8601', utc=True).dt.tz_convert(TIMEZONE)
+    return df
+
+
+def cross_check(x, y, thresholds=None):
+    """
+    Cross-check paired devices on a common time grid: a timestep is flagged when the log ratio of the pair leaves
+    its rolling Hampel band, i.e. one device jumps while its partner does not
+    :param x: 2-D float array (time x pair, first devices)
+    :param y: 2-D float array (time x pair, second devices)
+    :param thresholds: dict (see load_thresholds; None uses qc.json)
+    :return: 2-D boolean array (True where the pair disagrees)
+    """
+    if thresholds is None:
+        thresholds = load_thresholds()
+    settings = thresholds['pair']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_ratio = np.where((x > 0) & (y > 0), np.log(x / y), np.nan)
+    return hampel_matrix(log_ratio, settings['window'], settings['n_sigmas'], settings['min_deviation'])
+
+
+def good_rows(df):
+    """
+    :param df: DataFrame (reformatted data, with or without the QC column)
+    :return: 1-D boolean array (True for rows without any flag)
+    """
+    if QC_COLUMN not in df.columns:
+        return np.ones(len(df), dtype=bool)
+    return df[QC_COLUMN].to_numpy() == 0
+
+
+def flag_summary(df):
+    """
+    Count the flagged rows per device and flag
+    :param df: DataFrame (reformatted data with the QC column)
+    :return: DataFrame indexed by Device Name (Rows, Flagged, Percentage, then one count per flag)
+    """
+    flags = df[QC_COLUMN].to_numpy()
+    counts = {'Rows': np.ones(len(df), dtype=np.int64), 'Flagged': (flags != 0).astype(np.int64)}
+    for name, bit in FLAGS.items():
+        counts[name] = ((flags & bit) != 0).astype(np.int64)
+    summary = pd.DataFrame(counts, index=df.index).groupby(df['Device Name']).sum()
+    summary.insert(2, 'Percentage', summary['Flagged'] / summary['Rows'] * 100)
+    return summary
+
+
+def tukey_fences(values, k=1.5):
+    """
+    Outlier fences of a sample: k interquartile ranges below the first and above the third quartile
+    :param values: array or Series (NaN ignored)
+    :param k: float
+    :return: list [lower fence, upper fence]
+    """
+    q1, q3 = np.nanpercentile(np.asarray(values, dtype=np.float64), [25, 75])
+    return [q1 - k * (q3 - q1), q3 + k * (q3 - q1)]
@@ -0,0 +1,146 @@
+"""
+This .py file contains the indexed query object over the consolidated result table: rows are sorted by device and
+PT DateTime once, each device is a contiguous slice, and time windows are found by binary search.
+"""
+import weakref
+import numpy as np
+import pandas as pd
+
+_QUERIES = {}
+# Every cache filled through cached_by_table, so invalidate_table reaches all of them
+_CACHES = {}
+
+
+def to_bound(bound, tz):
+    """
+    Convert a window bound (e.g. "9/10/2020 0:00") to a Timestamp in the table's time zone; naive bounds are taken
+    as wall-clock times in that zone, the same way pandas compares strings with a tz-aware column
+    :param bound: str, datetime or Timestamp
+    :param tz: time zone of the table (None for naive tables)
+    :return: Timestamp
+    """
+    timestamp = pd.Timestamp(bound)
+    if tz is None:
+        return timestamp.tz_localize(None) if timestamp.tzinfo is not None else timestamp
+    if timestamp.tzinfo is None:
+        return timestamp.tz_localize(tz)
+    return timestamp.tz_convert(tz)
+
+
+def cached_by_table(cache: dict, table, key: tuple, build):
+    """
+    Get a result cached for a table, or build it. Entries belong to the table object, not to its content: they are
+    dropped when the table is collected or passed to invalidate_table. Results derived from a result table are
+    cached for its TableQuery, a sorted copy that never changes.
+    :param cache: dict (module cache)
+    :param table: TableQuery or DataFrame (the key holds its id)
+    :param key: tuple (the other arguments of the result)
+    :param build: function without arguments
+    :return: the cached or built result
+    """
+    _CACHES[id(cache)] = cache
+    key = (id(table),) + tuple(key)
+    cached = cache.get(key)
+    if cached is not None and cached[0]() is table:
+        return cached[1]
+    value = build()
+    cache[key] = (weakref.ref(table, lambda ref, key=key: cache.pop(key, None)), value)
+    return value
+
+
+def invalidate_table(table):
+    """
+    Drop every result cached for a table. Call it after editing a DataFrame in place: the next table_query builds a
+    new TableQuery from its current content, and the results cached for the old one go with it once it is no
+    longer referenced.
+    :param table: DataFrame or TableQuery
+    :return: None
+    """
+    for cache in _CACHES.values():
+        for key in [key for key in cache if key[0] == id(table)]:
+            del cache[key]
+
+
+class TableQuery:
+    """
+    Sorted, indexed view of a result table. device/time lookups are O(log n) slices instead of boolean scans, and
+    series() returns views of the sorted columns (no per-call copy).
+    """
+
+    def __init__(self, df, device_column='Device Name'):
+        """
+        :param df: DataFrame (result table with a device column and PT DateTime)
+        :param device_column: str (e.g. 'Device Name_x' for ratio tables)
+        """
+        self.device_column = device_column
+        if not pd.api.types.is_datetime64_any_dtype(df['PT DateTime']):
+            df = df.assign(**{'PT DateTime': pd.to_datetime(df['PT DateTime'])})
+        self.df = df.sort_values([device_column, 'PT DateTime'], kind='mergesort').reset_index(drop=True)
+        self.index = pd.DatetimeIndex(self.df['PT DateTime'])
+        self.tz = self.index.tz
+        self._columns = {}
+        devices = self.df[device_column].to_numpy()
+        starts = np.flatnonzero(np.r_[True, devices[1:] != devices[:-1]]) if len(devices) else np.array([], int)
+        stops = np.r_[starts[1:], len(devices)]
+        self.slices = {devices[start]: (start, stop) for start, stop in zip(starts, stops)}
+
+    @property
+    def devices(self):
+        """
+        :return: list of device names in the table
+        """
+        return list(self.slices)
+
+    def bounds(self, device: str, start=None, end=None):
+        """
+        Find the row range of one device within a time window (both ends inclusive)
+        :param device: str
+        :param start: start of the window (None for no lower bound)
+        :param end: end of the window (None for no upper bound)
+        :return lo: int
+        :return hi: int
+        """
+        lo, hi = self.slices.get(device, (0, 0))
+        if start is not None:
+            lo += self.index[lo:hi].searchsorted(to_bound(start, self.tz), side='left')
+        if end is not None:
+            hi = lo + self.index[lo:hi].searchsorted(to_bound(end, self.tz), side='right')
+        return lo, hi
+
+    def frame(self, device: str, start=None, end=None):
+        """
+        Rows of one device within a time window
+        :param device: str
+        :param start: start of the window
+        :param end: end of the window
+        :return: DataFrame (slice of the sorted table)
+        """
+        lo, hi = self.bounds(device, start, end)
+        return self.df.iloc[lo:hi]
+
+    def series(self, device: str, column: str, start=None, end=None):
+        """
+        One column of one device within a time window, indexed by PT DateTime
+        :param device: str
+        :param column: str (e.g. 'PM2.5_Std')
+        :param start: start of the window
+        :param end: end of the window
+        :return: Series
+        """
+        if column not in self._columns:
+            self._columns[column] = self.df[column].to_numpy()
+        lo, hi = self.bounds(device, start, end)
+        return pd.Series(self._columns[column][lo:hi], index=self.index[lo:hi], name=device, copy=False)
+
+
+def table_query(df, device_column='Device Name'):
+    """
+    Get the TableQuery of a result table, building it once per DataFrame (later calls reuse the sorted copy until
+    df is collected or passed to invalidate_table)
+    :param df: DataFrame or TableQuery
+    :param device_column: str
+    :return: TableQuery
+    """
+    if isinstance(df, TableQuery):
+        return df
+    return cached_by_table(_QUERIES, df, (device_column,), lambda: TableQuery(df, device_column))
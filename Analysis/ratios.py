@@ -0,0 +1,236 @@
+"""
+This .py file contains the ratio math: the batch ratio engine behind the I/O, I/G and O/G ratios (the data is
+pivoted once and every numerator/denominator device pair is divided on the aligned time grid), the per-user ratio
+tables, the multi-device averages and the personal exposure statistics.
+"""
+import numpy as np
+import pandas as pd
+from calibration import calibrated_column
+from exposure import personal_frame
+from pivot import device_average, pivot_devices, time_grid
+from preprocessing import user_case
+from qc import cross_check, tukey_fences
+from query import table_query
+from registry import public_devices, user_pairs
+
+RATIO_COLUMN = 'I/O Ratio'
+# Column written by calibration.apply_calibration; the ratio tables read it unless told otherwise
+CALIBRATED_PM25 = calibrated_column('PM2.5_Env')
+
+
+def ratio_table(df, pairs: list, numerator_column: str, denominator_column=None, start=None, end=None, qc=False):
+    """
+    Compute the ratio of several device pairs at once. Timestamps where either device has no value or the
+    denominator is zero are dropped, and with qc the timestamps where the pair fails the cross-check (see
+    qc.cross_check).
+    :param df: DataFrame or TableQuery (result table)
+    :param pairs: list of (numerator device, denominator device)
+    :param numerator_column: str (e.g. 'PM2.5_Env')
+    :param denominator_column: str (defaults to numerator_column; 'PM2.5_Std' for public sensors)
+    :param start: start of the window
+    :param end: end of the window
+    :param qc: bool (drop the timesteps where one device of the pair jumps while the other does not)
+    :return df: DataFrame in long format, pair by pair in time order, with the columns 'Device Name_x',
+                'Device Name_y', 'PT DateTime', '<numerator_column>_x', '<denominator_column>_y', 'I/O Ratio'
+    """
+    if denominator_column is None:
+        denominator_column = numerator_column
+    if len(pairs) == 0:
+        return pd.DataFrame(columns=['Device Name_x', 'Device Name_y', 'PT DateTime', numerator_column + "_x",
+                                     denominator_column + "_y", RATIO_COLUMN])
+    query = table_query(df)
+    numerators = list(dict.fromkeys(pair[0] for pair in pairs))
+    denominators = list(dict.fromkeys(pair[1] for pair in pairs))
+    grid = time_grid(query, numerators + denominators, numerator_column, start, end)
+    _, x = pivot_devices(query, numerators, numerator_column, start, end, grid)
+    _, y = pivot_devices(query, denominators, denominator_column, start, end, grid)
+    x = x[:, [numerators.index(pair[0]) for pair in pairs]]
+    y = y[:, [denominators.index(pair[1]) for pair in pairs]]
+    valid = ~np.isnan(x) & ~np.isnan(y) & (y != 0)
+    if qc:
+        valid &= ~cross_check(x, y)
+    # Transposed so that rows come out pair by pair, each in time order
+    pair_index, time_index = np.nonzero(valid.T)
+    x = x[time_index, pair_index]
+    y = y[time_index, pair_index]
+    return pd.DataFrame({'Device Name_x': np.array([pair[0] for pair in pairs], dtype=object)[pair_index],
+                         'Device Name_y': np.array([pair[1] for pair in pairs], dtype=object)[pair_index],
+                         'PT DateTime': grid[time_index],
+                         numerator_column + "_x": x,
+                         denominator_column + "_y": y,
+                         RATIO_COLUMN: x / y})
+
+
+def split_pairs(df):
+    """
+    Split a long-format ratio table into one DataFrame per device pair, in pair order
+    :param df: DataFrame (from ratio_table)
+    :return dfs: list of DataFrames
+    """
+    return [df_pair for _, df_pair in df.groupby(['Device Name_x', 'Device Name_y'], sort=False)]
+
+
+def io_ratio_table(df, df_users, particle_size=CALIBRATED_PM25, start=None, end=None, qc=False):
+    """
+    Calculate the Indoor/Outdoor Ratio of every user in one pass
+    :param df: DataFrame (FullData)
+    :param df_users: DataFrame (Users and corresponding device names)
+    :param particle_size: Size of particles (column names of df; the calibrated PM2.5_Env_Cal by default)
+    :param start: start of the window
+    :param end: end of the window
+    :param qc: bool (drop the timesteps failing the indoor/outdoor cross-check, see ratio_table)
+    :return: df_ratio --- DataFrame (long format, see ratios.ratio_table)
+             df_users: cleaned df_users
+    """
+    df_users = df_users[df_users['Out'].notna()].reset_index(drop=True)
+    pairs = [(device_in, device_out) for device_in, device_out in user_pairs(df_users, 'In', 'Out')
+             if pd.notna(device_in)]
+    return ratio_table(df, pairs, particle_size, start=start, end=end, qc=qc), df_users
+
+
+def gov_ratio_table(df, df_users, in_or_out: str, particle_size=CALIBRATED_PM25, public_sensors=None, start=None,
+                    end=None, qc=False):
+    """
+    Calculate the ratio of every user's indoor (or outdoor) device to every public sensor in one pass
+    :param df: DataFrame (FullData)
+    :param df_users: DataFrame (Users and corresponding device names)
+    :param in_or_out: 'In' for Indoor/Public Sensors, 'Out' for Outdoor/Public Sensors
+    :param particle_size: Size of particles (column names of df; the calibrated PM2.5_Env_Cal by default)
+    :param public_sensors: list of public sensors (None uses every public sensor of devices.json)
+    :param start: start of the window
+    :param end: end of the window
+    :param qc: bool (drop the timesteps failing the cross-check, see ratio_table)
+    :return: DataFrame (long format, see ratios.ratio_table)
+    """
+    if public_sensors is None:
+        public_sensors = public_devices()
+    df_users = df_users[df_users[in_or_out].notna()].reset_index(drop=True)
+    devices = df_users.drop_duplicates('User')[in_or_out]
+    pairs = [(device, sensor) for sensor in public_sensors for device in devices]
+    return ratio_table(df, pairs, particle_size, 'PM2.5_Std', start, end, qc)
+
+
+def input_output_ratio(df, df_users, particle_size: str, start, end, a=1):
+    """
+    Calculate Indoor/Outdoor Ratio
+    :param df: DataFrame (FullData)
+    :param df_users: DataFrame (Users and corresponding device names)
+    :param particle_size: Size of particles (column names of df)
+    :param a: float (extra factor of the outdoor sensors; leave at 1 for the calibrated '<column>_Cal' columns)
+    :return: dfs --- list of DataFrames
+             df_users: cleaned df_users
+    """
+    df_ratio, df_users = io_ratio_table(df, df_users, particle_size, start, end)
+    if a != 1:
+        df_ratio[RATIO_COLUMN] = df_ratio[RATIO_COLUMN] / a
+    return split_pairs(df_ratio), df_users
+
+
+def input_gov_ratio(df, df_users, particle_size: str, public_sensors: list, start, end):
+    """
+    Calculate Indoor/Public Sensors Ratio
+    :param df: DataFrame (FullData)
+    :param df_users: DataFrame (Users and corresponding device names)
+    :param particle_size: Size of particles (column names of df)
+    :param public_sensors: list of public sensors
+    :return: dfs --- list of list of DataFrames
+    """
+    df_ratio = gov_ratio_table(df, df_users, 'In', particle_size, public_sensors, start, end)
+    return [split_pairs(df_ratio[df_ratio['Device Name_y'] == device]) for device in public_sensors]
+
+
+def outdoor_gov_ratio(df, df_users, particle_size: str, public_sensors: list, start, end):
+    """
+    Calculate Outdoor/Public Sensors Ratio
+    :param df: DataFrame (FullData)
+    :param df_users: DataFrame (Users and corresponding device names)
+    :param particle_size: Size of particles (column names of df)
+    :param public_sensors: list of public sensors
+    :return: dfs --- list of list of DataFrames
+    """
+    df_ratio = gov_ratio_table(df, df_users, 'Out', particle_size, public_sensors, start, end)
+    return [split_pairs(df_ratio[df_ratio['Device Name_y'] == device]) for device in public_sensors]
+
+
+def average(df, df_users, in_or_out: str, particle_size: str, breakout=False, start="9/10/2020 0:00",
+            end= "9/19/2020 0:00"):
+    """
+    Outputs a new DataFrame that has the Average column
+    :param df: DataFrame (FullData)
+    :param df_users: DataFrame (Users and corresponding device names)
+    :param in_or_out: Indoor or Outdoor
+    :param particle_size: Size of particles (column names of df)
+    :param breakout: bool (add the moving sensor Breakout-02, as a column named particle_size)
+    :param start: start of the window
+    :param end: end of the window
+    :return: DataFrame that includes a column "Average"
+    """
+    query = table_query(df)
+    meb = df_users[df_users["User"] == "MEB"][in_or_out].values[0]
+    # The MEB device sets the time axis; every other device of the sheet column follows in name order
+    devices = [meb] + sorted(device for device in set(df_users[in_or_out].dropna())
+                             if device != meb and device in query.slices)
+    labels = list(devices)
+    if breakout is True:
+        devices.append("Breakout-02")
+        labels.append(particle_size)
+    return device_average(query, devices, particle_size, start, end, labels)
+
+
+def outlier_percentage(dfs: list, df_users, fences: list, in_or_out: str):
+    """
+    Calculate number of each device's outliers and their percentages
+    :param dfs: list of DataFrame, or a long-format ratio DataFrame (one device pair after another)
+    :param df_users: DataFrame (Users and corresponding device names)
+    :param fences: list of lists of length 2 that includes lower fence and upper fence (None computes the Tukey
+                   fences of every pair, see qc.tukey_fences)
+    :param in_or_out: Indoor or Outdoor
+    :return: DataFrame that shows the number of outliers and their percentages
+    """
+    if isinstance(dfs, pd.DataFrame):
+        dfs = split_pairs(dfs)
+    percentages = {"User": [], "Outliers": [], "Total": [], "Percentage": []}
+    if fences is None:
+        fences = [tukey_fences(df["I/O Ratio"]) for df in dfs]
+    for count, df in enumerate(dfs, 0):
+        outliers = df[(df["I/O Ratio"] <= fences[count][0]) | (df["I/O Ratio"] >= fences[count][1])].shape[0]
+        total = df.shape[0]
+        percentages["User"].append(user_case(df_users, in_or_out, pd.unique(df["Device Name_x"])[0]))
+        percentages["Outliers"].append(outliers)
+        percentages["Total"].append(total)
+        percentages["Percentage"].append(outliers / total * 100)
+    df_final = pd.DataFrame(percentages)
+    return df_final
+
+
+def personal_1min_average(df_10sec):
+    return personal_frame(df_10sec)
+
+
+def correlation(df, start, end, indoor, place=None, places=None):
+    """
+    Correlate the personal sensor with an indoor sensor of its user
+    :param df: DataFrame (FullData)
+    :param start: start of the window
+    :param end: end of the window
+    :param indoor: "Indoor 1" (Beta-11) or "Indoor 2" (Beta-14)
+    :param place: str (only use the personal samples logged at this place, e.g. the user's home; None uses all)
+    :param places: list of places (see geofence.load_places)
+    :return: DataFrame (correlation matrix)
+    """
+    if indoor == "Indoor 1":
+        device = "Beta-11"
+    elif indoor == "Indoor 2":
+        device = "Beta-14"
+    else:
+        print("No indoor option selected")
+        return None
+    query = table_query(df)
+    df_test = personal_frame(df, place=place, places=places)
+
+    df_corr = pd.merge(df_test[(df_test["PT DateTime"] >= start) & (df_test["PT DateTime"] <= end)] \
+                       [["PT DateTime", "PM2.5_Env"]],
+                       query.frame(device, start, end)[["PT DateTime", "PM2.5_Env"]],
+                       on="PT DateTime")
+    # print(df_corr)
+    return df_corr[["PM2.5_Env_x", "PM2.5_Env_y"]].corr()
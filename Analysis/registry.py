@@ -0,0 +1,175 @@
+"""
+This .py file contains the device registry: where each sensor is, whether it is indoor or outdoor, who uses it and
+which raw file it logs to. Adding a sensor only needs a new entry in devices.json (or a new row in the users sheet).
+"""
+from functools import lru_cache
+import json
+import math
+import os
+import pandas as pd
+from query import cached_by_table
+
+DEVICES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "devices.json")
+USERS_FILE = "D:/UW/AeroSpec - Sensor Network/2020 Wildfire/Data/Device Locations and Users Split.xlsx"
+UNKNOWN = "Unknown"
+
+_USER_LOOKUPS = {}
+
+
+def _device_entry(entry: dict):
+    """
+    Fill in the defaults of a devices.json entry
+    :param entry: dict (as written in devices.json)
+    :return: dict
+    """
+    latitude = entry.get('latitude')
+    longitude = entry.get('longitude')
+    return {'Device Name': entry['name'],
+            'File': entry.get('file', entry['name']),
+            'In or Out': entry.get('in_or_out', UNKNOWN),
+            'Latitude': math.nan if latitude is None else float(latitude),
+            'Longitude': math.nan if longitude is None else float(longitude),
+            'User': entry.get('user'),
+            'Public': bool(entry.get('public', False)),
+            'Skip': bool(entry.get('skip', False))}
+
+
+@lru_cache(maxsize=None)
+def load_devices(config=DEVICES_FILE):
+    """
+    Load the device config once per process
+    :param config: str (location of devices.json)
+    :return devices: dict of Device Name -> dict (File, In or Out, Latitude, Longitude, User, Public, Skip);
+                     Latitude/Longitude are NaN for devices that log their own GPS position
+    """
+    with open(config, 'r') as f:
+        entries = json.load(f)
+    return {entry['name']: _device_entry(entry) for entry in entries}
+
+
+def device_info(device_name: str, config=DEVICES_FILE):
+    """
+    Look up a device; devices missing from the config are reported as Unknown with their logged GPS position
+    :param device_name: str
+    :param config: str (location of devices.json)
+    :return: dict
+    """
+    devices = load_devices(config)
+    if device_name in devices:
+        return devices[device_name]
+    return _device_entry({'name': device_name})
+
+
+def device_by_file(fileloc: str, config=DEVICES_FILE):
+    """
+    Find the device logging to a raw data file (e.g. Puget-Bellevue.csv -> Bellevue SE 12th)
+    :param fileloc: str (file location)
+    :param config: str (location of devices.json)
+    :return: dict
+    """
+    stem = os.path.splitext(os.path.basename(fileloc))[0]
+    for device in load_devices(config).values():
+        if device['File'] == stem:
+            return device
+    return device_info(stem, config)
+
+
+def registry_frame(df_users=None, config=DEVICES_FILE):
+    """
+    Build the registry as a table (one row per device, indexed by Device Name) to join on 'Device Name'
+    :param df_users: DataFrame (users sheet; None uses the config alone)
+    :param config: str (location of devices.json)
+    :return df: DataFrame
+    """
+    names = list(load_devices(config))
+    if df_users is not None:
+        sheet_names = list(df_users['In'].dropna()) + list(df_users['Out'].dropna())
+        names = list(dict.fromkeys(sheet_names + names))
+    df = pd.DataFrame([device_info(name, config) for name in names]).set_index('Device Name')
+    if df_users is not None:
+        labels = user_lookup(df_users)
+        for in_or_out in ['In', 'Out']:
+            sheet_labels = pd.Series({device: label for (column, device), label in labels.items()
+                                      if column == in_or_out}, dtype=object)
+            df['User'] = df['User'].fillna(sheet_labels)
+    df['User'] = df['User'].fillna(UNKNOWN)
+    return df
+
+
+def processed_devices(df_users=None, config=DEVICES_FILE):
+    """
+    List the raw data files to preprocess: sheet devices first (indoor, then outdoor), then the remaining
+    config devices, leaving out skipped ones
+    :param df_users: DataFrame (users sheet; None uses the config alone)
+    :param config: str (location of devices.json)
+    :return: list of str (file names without extension)
+    """
+    df = registry_frame(df_users, config)
+    return list(df.loc[~df['Skip'], 'File'])
+
+
+def public_devices(config=DEVICES_FILE):
+    """
+    List the public (reference) sensors
+    :param config: str (location of devices.json)
+    :return: list of str (Device Names)
+    """
+    return [name for name, device in load_devices(config).items() if device['Public']]
+
+
+def user_lookup(df_users):
+    """
+    Map (column, device) of the users sheet to the user label ('Location Number', else 'User'). Built once per
+    users DataFrame, so user_case is a dict lookup instead of a scan of the sheet; the entry is dropped when the
+    sheet is collected or passed to query.invalidate_table (after editing the sheet in place).
+    :param df_users: DataFrame (users and corresponding device names)
+    :return labels: dict of (in_or_out, device) -> str
+    """
+    return cached_by_table(_USER_LOOKUPS, df_users, (), lambda: _user_labels(df_users))
+
+
+def _user_labels(df_users):
+    """
+    Build the labels of user_lookup
+    :param df_users: DataFrame (users and corresponding device names)
+    :return labels: dict of (in_or_out, device) -> str
+    """
+    labels = {}
+    location_numbers = df_users['Location Number'] if 'Location Number' in df_users.columns \
+        else pd.Series(None, index=df_users.index, dtype=object)
+    for in_or_out in ['In', 'Out']:
+        if in_or_out not in df_users.columns:
+            continue
+        for device, location, user in zip(df_users[in_or_out], location_numbers, df_users['User']):
+            if pd.isna(device) or (in_or_out, device) in labels:
+                continue
+            labels[(in_or_out, device)] = location if pd.notna(location) else user
+    return labels
+
+
+def device_user(df_users, in_or_out: str, device_name: str, config=DEVICES_FILE):
+    """
+    Find the user label of a device: fixed labels from the config (public sensors, the moving sensor) first,
+    then the users sheet
+    :param df_users: DataFrame (users and corresponding device names)
+    :param in_or_out: str ('In' or 'Out', the sheet column holding the device)
+    :param device_name: str
+    :param config: str (location of devices.json)
+    :return user: str
+    """
+    user = device_info(device_name, config)['User']
+    if user is not None:
+        return user
+    return user_lookup(df_users).get((in_or_out, device_name), UNKNOWN)
+
+
+def user_pairs(df_users, numerator: str, denominator: str):
+    """
+    Pair the devices of each user (first row of every user in the sheet)
+    :param df_users: DataFrame (Users and corresponding device names)
+    :param numerator: str ('In' or 'Out')
+    :param denominator: str ('In' or 'Out')
+    :return: list of (numerator device, denominator device)
+    """
+    df_first = df_users.drop_duplicates('User')
+    return list(zip(df_first[numerator], df_first[denominator]))
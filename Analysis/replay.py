@@ -0,0 +1,111 @@
+"""
+This .py file contains the replay tool that stands in for live sensors: existing raw logs are streamed to live.py
+over TCP or UDP, paced by their own timestamps at an accelerated speed. --copies replays every log under several
+device names to load-test the server with many devices.
+Run from the Analysis folder: python replay.py Beta-01.txt Breakout-02.txt --speed 600 --copies 100
+"""
+import argparse
+import asyncio
+import time
+from ingest import read_device_name
+from online import record_time
+
+
+def read_records(fileloc: str):
+    """
+    Read the records of a raw log with their logged time
+    :param fileloc: str (file location)
+    :return device_name: str
+    :return records: list of (float UTC seconds or None, bytes line)
+    """
+    device_name = read_device_name(fileloc)
+    with open(fileloc, 'rb') as f:
+        f.readline()
+        f.readline()
+        lines = [line for line in f.read().splitlines(keepends=True) if line.strip()]
+    records = []
+    for line in lines:
+        fields = line.decode(errors='replace').split(',')
+        records.append((record_time(fields[0], fields[1]) if len(fields) > 1 else None, line))
+    return device_name, records
+
+
+async def replay(device_name: str, records: list, host: str, port: int, speed=60.0, udp=False):
+    """
+    Stream one device's records, waiting (time gap / speed) between them; records without a valid time are
+    sent right away
+    :param device_name: str (name announced to the server)
+    :param records: list of (UTC seconds or None, bytes line), from read_records
+    :param host: str
+    :param port: int
+    :param speed: float (replay speed, e.g. 60 plays one logged minute per second; 0 sends as fast as possible)
+    :param udp: bool (send device-prefixed UDP datagrams instead of a TCP stream)
+    :return: int (number of records sent)
+    """
+    loop = asyncio.get_running_loop()
+    if udp:
+        transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=(host, port))
+        prefix = device_name.encode() + b','
+
+        def send(line):
+            transport.sendto(prefix + line)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(device_name.encode() + b'\n')
+
+        def send(line):
+            writer.write(line)
+    start = time.monotonic()
+    first = next((t for t, _ in records if t is not None), None)
+    for t, line in records:
+        if speed > 0 and t is not None and first is not None:
+            delay = (t - first) / speed - (time.monotonic() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        send(line)
+        if not udp:
+            await writer.drain()
+    if udp:
+        transport.close()
+    else:
+        writer.close()
+        await writer.wait_closed()
+    return len(records)
+
+
+async def replay_all(filelocs: list, host="127.0.0.1", port=9000, speed=60.0, copies=1, udp=False):
+    """
+    Replay several logs concurrently, each under `copies` device names (Beta-01, Beta-01-r1, Beta-01-r2, ...)
+    :param filelocs: list of file locations
+    :param host: str
+    :param port: int
+    :param speed: float (replay speed)
+    :param copies: int (device names per log)
+    :param udp: bool
+    :return: int (number of records sent)
+    """
+    logs = [read_records(fileloc) for fileloc in filelocs]
+    tasks = []
+    for device_name, records in logs:
+        for copy in range(copies):
+            name = device_name if copy == 0 else device_name + "-r" + str(copy)
+            tasks.append(replay(name, records, host, port, speed, udp))
+    start = time.monotonic()
+    sent = sum(await asyncio.gather(*tasks))
+    elapsed = time.monotonic() - start
+    print("Sent %d records from %d devices in %.1f s (%.0f records/s)"
+          % (sent, len(tasks), elapsed, sent / elapsed if elapsed > 0 else float('inf')))
+    return sent
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay raw sensor logs to the live-ingest server")
+    parser.add_argument("files", nargs="+", help="raw Beta/Breakout logs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--speed", type=float, default=60.0,
+                        help="replay speed (60: one logged minute per second, 0: as fast as possible)")
+    parser.add_argument("--copies", type=int, default=1, help="replay every log under this many device names")
+    parser.add_argument("--udp", action="store_true", help="send UDP datagrams instead of TCP streams")
+    args = parser.parse_args()
+    asyncio.run(replay_all(args.files, args.host, args.port, args.speed, args.copies, args.udp))
@@ -0,0 +1,214 @@
+"""
+This .py file contains the resampling layer over a result table: every device is placed once on a shared regular
+time grid (buckets of the averaging frequency, aligned in UTC like get_averages), with a packed bitmask of the
+buckets it was observed in. Plots and maps read aligned arrays and per-device coverage and gap statistics from it
+instead of reindexing every device with asfreq.
+"""
+import numpy as np
+import pandas as pd
+from query import cached_by_table, table_query, to_bound
+from timestamps import floor_timestamps, to_timedelta
+
+_GRIDS = {}
+
+
+def runs(mask):
+    """
+    Find the runs of True in a boolean array
+    :param mask: 1-D boolean array
+    :return starts: 1-D int array (first position of every run)
+    :return stops: 1-D int array (position after every run)
+    """
+    edges = np.diff(np.r_[0, mask.astype(np.int8), 0])
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+class RegularGrid:
+    """
+    A result table on a regular time grid. Rows whose timestamp falls between two buckets are left out, the same
+    way asfreq leaves them out; devices with several rows per bucket (the moving sensor at several positions) are
+    averaged per bucket.
+    """
+
+    def __init__(self, df, freq=None):
+        """
+        :param df: DataFrame or TableQuery (result table)
+        :param freq: frequency name ("hour", "10Min", "1Min", "10S") or Timedelta; None uses the most common time
+                     step of the table
+        """
+        self.query = table_query(df)
+        index = self.query.index
+        if freq is None:
+            steps = np.diff(index.as_unit('ns').asi8)
+            steps = steps[steps > 0]
+            freq = pd.Timedelta(int(pd.Series(steps).mode().iloc[0]) if len(steps) else 60 * 10 ** 9, unit='ns')
+        self.freq = to_timedelta(freq)
+        self.step = self.freq.value
+        if len(index):
+            first = pd.Series([index.min()])
+            self.origin = (floor_timestamps(first, self.freq) if self.query.tz is not None
+                           else first.dt.floor(self.freq)).iloc[0]
+            last = index.max()
+        else:
+            self.origin = last = pd.Timestamp(0, tz=self.query.tz)
+        self.index = pd.date_range(self.origin, last, freq=self.freq)
+        self._positions = {}
+        self._values = {}
+        self.masks = {}
+        for device, (lo, hi) in self.query.slices.items():
+            nanoseconds = np.asarray((index[lo:hi] - self.origin) // pd.Timedelta(1, 'ns'), dtype=np.int64)
+            on_grid = nanoseconds % self.step == 0
+            positions = nanoseconds // self.step
+            self._positions[device] = (on_grid, positions[on_grid])
+            observed = np.zeros(len(self.index), dtype=bool)
+            observed[positions[on_grid]] = True
+            self.masks[device] = np.packbits(observed)
+
+    @property
+    def devices(self):
+        """
+        :return: list of device names on the grid
+        """
+        return list(self.masks)
+
+    def window(self, start=None, end=None):
+        """
+        Find the buckets of a time window (both ends inclusive)
+        :param start: start of the window (None for no lower bound)
+        :param end: end of the window (None for no upper bound)
+        :return lo: int
+        :return hi: int
+        """
+        lo = 0 if start is None else self.index.searchsorted(to_bound(start, self.query.tz), side='left')
+        hi = len(self.index) if end is None else self.index.searchsorted(to_bound(end, self.query.tz), side='right')
+        return lo, max(lo, hi)
+
+    def observed(self, device: str, start=None, end=None):
+        """
+        Unpack the bitmask of one device
+        :param device: str
+        :param start: start of the window
+        :param end: end of the window
+        :return: 1-D boolean array (one per bucket of the window; True where the device has a row)
+        """
+        lo, hi = self.window(start, end)
+        if device not in self.masks:
+            return np.zeros(hi - lo, dtype=bool)
+        return np.unpackbits(self.masks[device], count=len(self.index)).astype(bool)[lo:hi]
+
+    def values(self, device: str, column: str, start=None, end=None):
+        """
+        One column of one device on the grid, built once per device and column
+        :param device: str
+        :param column: str (e.g. 'PM2.5_Env')
+        :param start: start of the window
+        :param end: end of the window
+        :return: 1-D float64 array (one per bucket of the window), NaN where the device has no value
+        """
+        key = (device, column)
+        if key not in self._values:
+            values = np.full(len(self.index), np.nan)
+            if device in self._positions:
+                on_grid, positions = self._positions[device]
+                readings = self.query.series(device, column).to_numpy(dtype=np.float64)[on_grid]
+                if len(np.unique(positions)) == len(positions):
+                    values[positions] = readings
+                else:
+                    valid = ~np.isnan(readings)
+                    sums = np.bincount(positions[valid], readings[valid], minlength=len(self.index))
+                    counts = np.bincount(positions[valid], minlength=len(self.index))
+                    with np.errstate(invalid='ignore'):
+                        values = np.where(counts > 0, sums / counts, np.nan)
+            self._values[key] = values
+        lo, hi = self.window(start, end)
+        return self._values[key][lo:hi]
+
+    def series(self, device: str, column: str, start=None, end=None):
+        """
+        One column of one device on the grid, the equivalent of set_index("PT DateTime").asfreq(freq)
+        :param device: str
+        :param column: str
+        :param start: start of the window
+        :param end: end of the window
+        :return: Series indexed by the buckets of the window
+        """
+        lo, hi = self.window(start, end)
+        return pd.Series(self.values(device, column, start, end), index=self.index[lo:hi], name=device, copy=False)
+
+    def matrix(self, devices: list, column: str, start=None, end=None):
+        """
+        One column of several devices on the grid
+        :param devices: list of Device Names (matrix columns, in this order)
+        :param column: str
+        :param start: start of the window
+        :param end: end of the window
+        :return grid: DatetimeIndex (the buckets of the window)
+        :return matrix: 2-D float64 array (bucket x device), NaN where a device has no value
+        """
+        lo, hi = self.window(start, end)
+        matrix = np.empty((hi - lo, len(devices)))
+        for j, device in enumerate(devices):
+            matrix[:, j] = self.values(device, column, start, end)
+        return self.index[lo:hi], matrix
+
+    def gaps(self, device: str, start=None, end=None, min_buckets=1):
+        """
+        List the gaps of one device: runs of buckets without a row between its first and last row in the window
+        :param device: str
+        :param start: start of the window
+        :param end: end of the window
+        :param min_buckets: int (shorter gaps are left out)
+        :return: DataFrame (Start and End of every gap, Buckets, Duration)
+        """
+        lo, _ = self.window(start, end)
+        observed = self.observed(device, start, end)
+        seen = np.flatnonzero(observed)
+        missing = ~observed
+        if len(seen):
+            missing[:seen[0]] = False
+            missing[seen[-1] + 1:] = False
+        else:
+            missing[:] = False
+        starts, stops = runs(missing)
+        long_enough = stops - starts >= min_buckets
+        starts, stops = starts[long_enough] + lo, stops[long_enough] + lo
+        return pd.DataFrame({'Start': self.index[starts], 'End': self.index[stops - 1],
+                             'Buckets': stops - starts, 'Duration': (stops - starts) * self.freq})
+
+    def coverage(self, devices=None, start=None, end=None):
+        """
+        Coverage and gap statistics per device
+        :param devices: list of Device Names (None uses every device of the table)
+        :param start: start of the window
+        :param end: end of the window
+        :return: DataFrame indexed by Device Name (Buckets of the window, Observed buckets, Coverage as a fraction
+                 of the window, First and Last observed bucket, Gaps between them, Missing buckets in these gaps,
+                 Longest gap)
+        """
+        lo, hi = self.window(start, end)
+        rows = []
+        for device in (self.devices if devices is None else devices):
+            observed = self.observed(device, start, end)
+            gaps = self.gaps(device, start, end)
+            seen = np.flatnonzero(observed)
+            rows.append({'Device Name': device, 'Buckets': hi - lo, 'Observed': len(seen),
+                         'Coverage': len(seen) / (hi - lo) if hi > lo else np.nan,
+                         'First': self.index[lo + seen[0]] if len(seen) else pd.NaT,
+                         'Last': self.index[lo + seen[-1]] if len(seen) else pd.NaT,
+                         'Gaps': len(gaps), 'Missing': int(gaps['Buckets'].sum()),
+                         'Longest gap': gaps['Duration'].max() if len(gaps) else pd.Timedelta(0)})
+        columns = ['Buckets', 'Observed', 'Coverage', 'First', 'Last', 'Gaps', 'Missing', 'Longest gap']
+        return pd.DataFrame(rows, columns=['Device Name'] + columns).set_index('Device Name')
+
+
+def regular_grid(df, freq=None):
+    """
+    Get the regular grid of a result table, built on first use and then reused while the table is alive and
+    unchanged (it belongs to the TableQuery of df, see query.invalidate_table)
+    :param df: DataFrame or TableQuery (result table)
+    :param freq: frequency name or Timedelta (None infers it, see RegularGrid)
+    :return: RegularGrid
+    """
+    query = table_query(df)
+    return cached_by_table(_GRIDS, query, (None if freq is None else to_timedelta(freq),),
+                           lambda: RegularGrid(query, freq))
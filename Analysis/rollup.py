@@ -0,0 +1,220 @@
+"""
+This .py file contains the multi-resolution rollup that computes every averaging frequency from a single read.
+"""
+import numpy as np
+import pandas as pd
+from qc import QC_COLUMN, good_rows
+from timestamps import TIMEZONE, floor_timestamps, to_timedelta
+
+ROLLUP_FREQUENCIES = ["10S", "1Min", "10Min", "hour"]
+TOTALS_DATASET = "0_BucketTotals"
+COUNT_SUFFIX = " Count"
+GROUP_KEYS = ['Device Name', 'PT DateTime', 'Latitude', 'Longitude', 'In or Out']
+NON_AVERAGED = ['Device Name', 'Date', 'Time', 'PT DateTime', 'Battery', 'Fix', 'Latitude', 'Longitude', 'In or Out',
+                QC_COLUMN]
+
+
+def sort_frequencies(freqs):
+    """
+    Order frequencies from finest to coarsest and check that each one is a multiple of the previous one
+    :param freqs: list of frequency names
+    :return freqs: list of frequency names (finest first)
+    """
+    freqs = sorted(freqs, key=to_timedelta)
+    for finer, coarser in zip(freqs, freqs[1:]):
+        if to_timedelta(coarser) % to_timedelta(finer) != pd.Timedelta(0):
+            raise ValueError(coarser + " is not a multiple of " + finer)
+    return freqs
+
+
+def bucket_totals(df, freq: str):
+    """
+    Sum and count every averaged column per device/location and time bucket. Rows flagged by the QC stage are
+    counted as missing values.
+    :param df: DataFrame (reformatted data)
+    :param freq: str (finest frequency)
+    :return sums: DataFrame (float64 sums, indexed by GROUP_KEYS)
+    :return counts: DataFrame (number of non-NaN values, same index)
+    """
+    cols_average = df.columns.drop(NON_AVERAGED, errors='ignore')
+    buckets = floor_timestamps(df['PT DateTime'], freq)
+    # Sum in float64 so totals do not depend on how the rows were split into chunks; the float64 copy is the only
+    # one, flagged rows are blanked in place
+    values = df[cols_average].to_numpy(dtype=np.float64, copy=True)
+    values[~good_rows(df)] = np.nan
+    grouped = pd.DataFrame(values, columns=cols_average, index=df.index, copy=False).groupby(
+        [df['Device Name'], buckets, df['Latitude'], df['Longitude'], df['In or Out']])
+    return grouped.sum(), grouped.count()
+
+
+def coarsen_totals(sums, counts, freq: str):
+    """
+    Merge bucket totals into coarser buckets
+    :param sums: DataFrame (sums indexed by GROUP_KEYS)
+    :param counts: DataFrame (counts, same index)
+    :param freq: str (coarser frequency)
+    :return sums: DataFrame
+    :return counts: DataFrame
+    """
+    keys = [sums.index.get_level_values(level) for level in GROUP_KEYS]
+    keys[1] = pd.DatetimeIndex(floor_timestamps(pd.Series(keys[1]), freq), name='PT DateTime')
+    return sums.groupby(keys).sum(), counts.groupby(keys).sum()
+
+
+def totals_to_means(sums, counts):
+    """
+    Turn bucket totals into the averaged frame returned by get_averages
+    :param sums: DataFrame
+    :param counts: DataFrame
+    :return df: DataFrame (averages)
+    """
+    df = sums / counts.where(counts > 0)
+    return df.reset_index()
+
+
+def totals_to_frame(sums, counts):
+    """
+    Store bucket sums and counts side by side in one table
+    :param sums: DataFrame (sums indexed by GROUP_KEYS)
+    :param counts: DataFrame (counts, same index)
+    :return df: DataFrame (sum columns followed by '<column> Count' columns)
+    """
+    return sums.join(counts.add_suffix(COUNT_SUFFIX)).reset_index()
+
+
+def frame_to_totals(df):
+    """
+    Split a table written by totals_to_frame back into bucket sums and counts
+    :param df: DataFrame
+    :return sums: DataFrame
+    :return counts: DataFrame
+    """
+    df = df.set_index(GROUP_KEYS)
+    count_columns = [column for column in df.columns if column.endswith(COUNT_SUFFIX)]
+    sums = df[[column[:-len(COUNT_SUFFIX)] for column in count_columns]]
+    counts = df[count_columns].rename(columns=lambda column: column[:-len(COUNT_SUFFIX)])
+    return sums, counts
+
+
+def rollup(df, freqs=ROLLUP_FREQUENCIES, totals=False):
+    """
+    Calculate averages at several frequencies from one pass over the data. The finest buckets are summed and
+    counted once; coarser buckets merge those totals, so every mean is exact.
+    :param df: DataFrame (reformatted data)
+    :param freqs: list of frequency names ("10S", "1Min", "10Min", "hour")
+    :param totals: bool (also return the finest bucket totals under TOTALS_DATASET, see totals_to_frame)
+    :return finals: dict of frequency -> DataFrame (same layout as get_averages)
+    """
+    freqs = sort_frequencies(freqs)
+    sums, counts = bucket_totals(df, freqs[0])
+    finals = rollup_totals(sums, counts, freqs)
+    if totals:
+        finals[TOTALS_DATASET] = totals_to_frame(sums, counts)
+    return finals
+
+
+def rollup_totals(sums, counts, freqs=ROLLUP_FREQUENCIES):
+    """
+    Calculate averages at several frequencies from bucket totals at the finest frequency
+    :param sums: DataFrame (sums indexed by GROUP_KEYS, bucketed at the finest of freqs)
+    :param counts: DataFrame (counts, same index)
+    :param freqs: list of frequency names
+    :return finals: dict of frequency -> DataFrame (same layout as get_averages)
+    """
+    freqs = sort_frequencies(freqs)
+    finals = {freqs[0]: totals_to_means(sums, counts)}
+    for freq in freqs[1:]:
+        sums, counts = coarsen_totals(sums, counts, freq)
+        finals[freq] = totals_to_means(sums, counts)
+    return finals
+
+
+class RollupAccumulator:
+    """
+    Streaming rollup: feed reformatted chunks of one or more device logs with add(), then call finish() to get
+    the same averages as rollup() on the whole data. Finest-bucket totals of the last, still open coarsest bucket
+    are carried over to the next chunk; every earlier bucket is coarsened right away.
+    Without a sink the totals of every closed bucket are kept until finish(), so memory grows with the length of
+    the log (like the averages it returns). With a sink, the finest totals of every closed (Pacific) day are handed
+    over as soon as a chunk closes it and nothing is kept, so memory holds one chunk plus one day of totals.
+    """
+
+    def __init__(self, freqs=ROLLUP_FREQUENCIES, totals=False, sink=None):
+        """
+        :param freqs: list of frequency names ("10S", "1Min", "10Min", "hour")
+        :param totals: bool (finish() also returns the finest bucket totals under TOTALS_DATASET)
+        :param sink: function(sums, counts) taking the finest bucket totals of closed days (indexed by GROUP_KEYS).
+                     Late rows of a day that was already handed over come in a later call, so the sink has to add
+                     totals of a bucket it has seen before (see incremental.store_totals).
+        """
+        self.freqs = sort_frequencies(freqs)
+        self.totals = totals
+        self.sink = sink
+        self.pending = None
+        self.finished = {freq: [] for freq in self.freqs}
+
+    def add(self, df):
+        """
+        Add a chunk of reformatted data
+        :param df: DataFrame (reformatted data)
+        :return: None
+        """
+        if df.empty:
+            return
+        sums, counts = bucket_totals(df, self.freqs[0])
+        if self.pending is not None:
+            sums = pd.concat([self.pending[0], sums])
+            counts = pd.concat([self.pending[1], counts])
+        times = sums.index.get_level_values('PT DateTime')
+        cutoff = floor_timestamps(pd.Series([times.max()]), self.freqs[-1])[0]
+        if self.sink is not None:
+            cutoff = min(cutoff, times.max().tz_convert(TIMEZONE).normalize())
+        done = times < cutoff
+        self.pending = (sums[~done], counts[~done])
+        if done.any():
+            self._flush(sums[done], counts[done])
+        return
+
+    def _flush(self, sums, counts):
+        """
+        Coarsen completed finest-bucket totals into every frequency
+        :param sums: DataFrame
+        :param counts: DataFrame
+        :return: None
+        """
+        sums = sums.groupby(level=GROUP_KEYS).sum()
+        counts = counts.groupby(level=GROUP_KEYS).sum()
+        if self.sink is not None:
+            self.sink(sums, counts)
+            return
+        self.finished[self.freqs[0]].append((sums, counts))
+        for freq in self.freqs[1:]:
+            sums, counts = coarsen_totals(sums, counts, freq)
+            self.finished[freq].append((sums, counts))
+        return
+
+    def finish(self):
+        """
+        Flush the carried bucket and compute the averages. Buckets seen in several chunks (late or out-of-order
+        rows) are merged through their totals, so every mean is exact.
+        :return finals: dict of frequency -> DataFrame (same layout as get_averages; empty with a sink, which
+                        received every bucket)
+        """
+        if self.pending is not None and not self.pending[0].empty:
+            self._flush(*self.pending)
+        self.pending = None
+        finals = {}
+        if self.sink is not None:
+            return finals
+        for freq in self.freqs:
+            if len(self.finished[freq]) == 0:
+                finals[freq] = pd.DataFrame(columns=GROUP_KEYS)
+                if self.totals and freq == self.freqs[0]:
+                    finals[TOTALS_DATASET] = pd.DataFrame(columns=GROUP_KEYS)
+                continue
+            sums = pd.concat([totals[0] for totals in self.finished[freq]]).groupby(level=GROUP_KEYS).sum()
+            counts = pd.concat([totals[1] for totals in self.finished[freq]]).groupby(level=GROUP_KEYS).sum()
+            finals[freq] = totals_to_means(sums, counts)
+            if self.totals and freq == self.freqs[0]:
+                finals[TOTALS_DATASET] = totals_to_frame(sums, counts)
+        return finals
@@ -0,0 +1,253 @@
+"""
+This .py file contains the spatial interpolation engine behind the smoke maps: for a fixed set of sensor locations the
+interpolation weights of every map pixel (Voronoi / nearest sensor, inverse distance weighting or ordinary kriging)
+are built once, so every timestep is rendered with one weight-matrix x readings product. Weights are cached per
+pattern of missing sensors (the most recently used ones), engines per sensor set, and the clip geometry and basemap tiles per extent.
+Maps are computed in Web Mercator (EPSG:3857), the projection of the basemap tiles; distances are scaled back to
+ground meters at the latitude of the sensors.
+"""
+from collections import OrderedDict
+from functools import lru_cache
+import hashlib
+import os
+import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS = 6378137.0
+METHODS = ("voronoi", "idw", "kriging")
+BASEMAP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Figures", ".basemaps")
+# Weight matrices kept per engine (one per pattern of missing sensors, pixels x sensors float32 each)
+WEIGHT_PATTERNS = 32
+
+_ENGINES = {}
+_BASEMAPS = {}
+
+
+def to_mercator(longitudes, latitudes):
+    """
+    Project WGS84 coordinates to Web Mercator
+    :param longitudes: array of float (degrees)
+    :param latitudes: array of float (degrees)
+    :return x: 1-D float array (meters)
+    :return y: 1-D float array (meters)
+    """
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    return EARTH_RADIUS * np.radians(longitudes), EARTH_RADIUS * np.log(np.tan(np.pi / 4 + np.radians(latitudes) / 2))
+
+
+def clip_mask(polygons: list, x, y):
+    """
+    Find the points inside a clip area
+    :param polygons: list of (exterior, holes) with exterior a (n, 2) array and holes a list of (n, 2) arrays,
+                     in the coordinates of x and y
+    :param x: array of float
+    :param y: array of float
+    :return: boolean array shaped like x
+    """
+    from matplotlib.path import Path
+    points = np.column_stack((np.ravel(x), np.ravel(y)))
+    inside = np.zeros(len(points), dtype=bool)
+    for exterior, holes in polygons:
+        within = Path(exterior).contains_points(points)
+        for hole in holes:
+            within &= ~Path(hole).contains_points(points)
+        inside |= within
+    return inside.reshape(np.shape(x))
+
+
+@lru_cache(maxsize=None)
+def clip_polygons(path=None):
+    """
+    Read a clip area once per process and project it to Web Mercator
+    :param path: str (any file geopandas reads; None uses the contiguous USA shapefile shipped with geoplot)
+    :return: list of (exterior, holes) as taken by clip_mask
+    """
+    import geopandas as gpd
+    if path is None:
+        import geoplot
+        path = geoplot.datasets.get_path('contiguous_usa')
+    polygons = []
+    for geometry in gpd.read_file(path).to_crs("EPSG:3857").geometry:
+        for polygon in getattr(geometry, 'geoms', [geometry]):
+            polygons.append((np.asarray(polygon.exterior.coords)[:, :2],
+                             [np.asarray(ring.coords)[:, :2] for ring in polygon.interiors]))
+    return polygons
+
+
+def basemap(extent: tuple, zoom="auto"):
+    """
+    Get the basemap tiles of an extent, downloaded once and then kept in memory and in Figures/.basemaps
+    :param extent: tuple (west, east, south, north) in Web Mercator meters
+    :param zoom: int or "auto"
+    :return image: 3-D array (rows x columns x RGB(A))
+    :return extent: tuple (west, east, south, north) of the image
+    """
+    key = tuple(round(float(value)) for value in extent) + (zoom,)
+    if key in _BASEMAPS:
+        return _BASEMAPS[key]
+    path = os.path.join(BASEMAP_DIR, hashlib.sha1(repr(key).encode()).hexdigest() + ".npz")
+    if os.path.exists(path):
+        with np.load(path) as cached:
+            result = (cached["image"], tuple(cached["extent"]))
+    else:
+        import contextily as ctx
+        west, east, south, north = extent
+        image, image_extent = ctx.bounds2img(west, south, east, north, zoom=zoom)
+        result = (image, tuple(image_extent))
+        os.makedirs(BASEMAP_DIR, exist_ok=True)
+        np.savez_compressed(path, image=image, extent=np.asarray(image_extent))
+    _BASEMAPS[key] = result
+    return result
+
+
+class SpatialEngine:
+    """
+    Interpolation weights of a fixed sensor set on a raster grid. render() maps readings (one row per timestep) to
+    images with one matrix product per pattern of missing sensors.
+    """
+
+    def __init__(self, longitudes, latitudes, method="idw", resolution=200, margin=0.1, power=2.0,
+                 variogram_range=10000.0, nugget=0.0, clip=None):
+        """
+        :param longitudes: array of float (sensor longitudes, degrees)
+        :param latitudes: array of float (sensor latitudes, degrees)
+        :param method: "voronoi" (nearest sensor), "idw" (inverse distance weighting) or "kriging" (ordinary
+                       kriging with an exponential variogram)
+        :param resolution: int (pixels along the longer side of the map)
+        :param margin: float (map padding around the sensors, as a fraction of their extent)
+        :param power: float (IDW distance exponent)
+        :param variogram_range: float (kriging: practical range in ground meters)
+        :param nugget: float (kriging: nugget as a fraction of the sill)
+        :param clip: list of polygons (see clip_mask; None keeps every pixel)
+        """
+        if method not in METHODS:
+            raise ValueError("Wrong method. Choose either voronoi, idw or kriging")
+        self.method = method
+        self.power = power
+        self.variogram_range = variogram_range
+        self.nugget = nugget
+        self.sensor_x, self.sensor_y = to_mercator(longitudes, latitudes)
+        # Mercator stretches distances by 1 / cos(latitude); over a city the factor is constant
+        self.scale = np.cos(np.radians(np.nanmean(latitudes)))
+        west, east = self.sensor_x.min(), self.sensor_x.max()
+        south, north = self.sensor_y.min(), self.sensor_y.max()
+        pad = margin * max(east - west, north - south, 1000.0)
+        self.extent = (west - pad, east + pad, south - pad, north + pad)
+        step = max(self.extent[1] - self.extent[0], self.extent[3] - self.extent[2]) / resolution
+        self.x = np.arange(self.extent[0] + step / 2, self.extent[1], step)
+        self.y = np.arange(self.extent[2] + step / 2, self.extent[3], step)
+        grid_x, grid_y = np.meshgrid(self.x, self.y)
+        self.inside = np.ones(grid_x.shape, dtype=bool) if clip is None else clip_mask(clip, grid_x, grid_y)
+        self.pixels = np.column_stack((grid_x[self.inside], grid_y[self.inside])) * self.scale
+        self.sensors = np.column_stack((self.sensor_x, self.sensor_y)) * self.scale
+        self._weights = OrderedDict()
+
+    @property
+    def shape(self):
+        """
+        :return: tuple (rows, columns) of the rendered images; row 0 is the southern edge
+        """
+        return self.inside.shape
+
+    def weights(self, valid):
+        """
+        Interpolation weights of the inside pixels from the sensors that have a reading, cached for the
+        WEIGHT_PATTERNS most recently used patterns
+        :param valid: boolean array (one per sensor)
+        :return: 2-D float32 array (inside pixels x valid sensors)
+        """
+        valid = np.asarray(valid, dtype=bool)
+        key = valid.tobytes()
+        cached = self._weights.get(key)
+        if cached is not None:
+            self._weights.move_to_end(key)
+            return cached
+        sensors = self.sensors[valid]
+        if self.method == "voronoi":
+            _, nearest = cKDTree(sensors).query(self.pixels)
+            weights = np.zeros((len(self.pixels), len(sensors)), dtype=np.float32)
+            weights[np.arange(len(self.pixels)), nearest] = 1
+        else:
+            distances = np.sqrt(((self.pixels[:, None, :] - sensors[None, :, :]) ** 2).sum(axis=2))
+            if self.method == "idw":
+                # Pixels on top of a sensor take its reading
+                weights = 1 / np.maximum(distances, 1.0) ** self.power
+                weights /= weights.sum(axis=1, keepdims=True)
+            else:
+                weights = self._kriging_weights(sensors, distances)
+            weights = weights.astype(np.float32)
+        self._weights[key] = weights
+        if len(self._weights) > WEIGHT_PATTERNS:
+            self._weights.popitem(last=False)
+        return weights
+
+    def _kriging_weights(self, sensors, distances):
+        """
+        Solve the ordinary kriging system once for every pixel
+        :param sensors: 2-D array (valid sensors x 2, ground meters)
+        :param distances: 2-D array (pixels x valid sensors)
+        :return: 2-D array (pixels x valid sensors)
+        """
+        n = len(sensors)
+        system = np.ones((n + 1, n + 1))
+        system[n, n] = 0
+        between = np.sqrt(((sensors[:, None, :] - sensors[None, :, :]) ** 2).sum(axis=2))
+        system[:n, :n] = self.variogram(between)
+        np.fill_diagonal(system[:n, :n], 0)
+        targets = np.ones((n + 1, len(distances)))
+        targets[:n] = self.variogram(distances).T
+        # Sensors sharing a location make the system singular; the pseudo-inverse splits their weight
+        return (np.linalg.pinv(system) @ targets)[:n].T
+
+    def variogram(self, distances):
+        """
+        Exponential variogram with unit sill
+        :param distances: array of float (ground meters)
+        :return: array of float
+        """
+        return self.nugget + (1 - self.nugget) * (1 - np.exp(-3 * distances / self.variogram_range))
+
+    def render(self, readings):
+        """
+        Interpolate readings to images
+        :param readings: 1-D array (one reading per sensor) or 2-D array (timesteps x sensors), NaN where a sensor
+                         has no reading
+        :return: 2-D or 3-D float32 array ([timestep,] row, column), NaN outside the clip area and for timesteps
+                 without any reading
+        """
+        readings = np.asarray(readings, dtype=np.float64)
+        single = readings.ndim == 1
+        readings = np.atleast_2d(readings)
+        images = np.full((len(readings),) + self.shape, np.nan, dtype=np.float32)
+        valid = ~np.isnan(readings)
+        patterns, inverse = np.unique(valid, axis=0, return_inverse=True)
+        inside = np.full((len(readings), len(self.pixels)), np.nan, dtype=np.float32)
+        for number, pattern in enumerate(patterns):
+            if not pattern.any():
+                continue
+            rows = np.flatnonzero(inverse.ravel() == number)
+            inside[rows] = readings[np.ix_(rows, pattern)] @ self.weights(pattern).T
+        images[:, self.inside] = inside
+        return images[0] if single else images
+
+
+def sensor_engine(longitudes, latitudes, method="idw", resolution=200, clip_path=False, **kwargs):
+    """
+    Get the engine of a sensor set, built on first use and then reused
+    :param longitudes: array of float (degrees)
+    :param latitudes: array of float (degrees)
+    :param method: "voronoi", "idw" or "kriging"
+    :param resolution: int (pixels along the longer side of the map)
+    :param clip_path: str (clip area file), None for the contiguous USA, False for no clipping
+    :param kwargs: other SpatialEngine parameters
+    :return: SpatialEngine
+    """
+    key = (tuple(np.round(np.asarray(longitudes, dtype=np.float64), 6)),
+           tuple(np.round(np.asarray(latitudes, dtype=np.float64), 6)),
+           method, resolution, clip_path, tuple(sorted(kwargs.items())))
+    engine = _ENGINES.get(key)
+    if engine is None:
+        clip = None if clip_path is False else clip_polygons(clip_path)
+        engine = _ENGINES[key] = SpatialEngine(longitudes, latitudes, method, resolution, clip=clip, **kwargs)
+    return engine
@@ -0,0 +1,354 @@
+"""
+This .py file contains the Parquet result store: averaged results partitioned by device and day. Writers that
+update many devices at once (the live-ingest server) append one delta file per batch instead, which load_results
+merges over the partitions until compact_results folds them in.
+"""
+import os
+import shutil
+from urllib.parse import quote
+import pandas as pd
+from timestamps import TIMEZONE, localize_wall_time
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+RESULTS_DIR = "Results"
+RESULT_DATASETS = {"hour": "1_HourAverage", "10Min": "2_10MinAverage", "1Min": "4_1MinAverage",
+                   "10S": "3_10SecAverage"}
+# Columns identifying one averaged bucket (rollup.GROUP_KEYS): a delta row replaces the stored row of its bucket
+DELTA_KEYS = ['Device Name', 'PT DateTime', 'Latitude', 'Longitude', 'In or Out']
+
+
+def _require_pyarrow():
+    """
+    Raise a readable error when pyarrow is missing
+    :return: None
+    """
+    if pa is None:
+        raise ImportError("The Parquet result store needs pyarrow (pip install pyarrow)")
+
+
+def dataset_path(name: str, results_dir=RESULTS_DIR):
+    """
+    Find the folder of a result dataset
+    :param name: str (frequency name such as "10Min", or a dataset name such as "IORatioStd")
+    :param results_dir: str
+    :return: str (folder location)
+    """
+    return os.path.join(results_dir, RESULT_DATASETS.get(name, name) + ".parquet")
+
+
+def delta_path(name: str, results_dir=RESULTS_DIR):
+    """
+    Find the folder of the delta files of a result dataset
+    :param name: str (frequency name or dataset name)
+    :param results_dir: str
+    :return: str (folder location)
+    """
+    return os.path.join(results_dir, RESULT_DATASETS.get(name, name) + ".delta")
+
+
+def delta_files(name: str, results_dir=RESULTS_DIR):
+    """
+    List the delta files of a result dataset, oldest first
+    :param name: str (frequency name or dataset name)
+    :param results_dir: str
+    :return: list of file locations
+    """
+    path = delta_path(name, results_dir)
+    if not os.path.isdir(path):
+        return []
+    return [os.path.join(path, entry) for entry in sorted(os.listdir(path)) if entry.endswith(".parquet")]
+
+
+def partition_dir(path: str, device: str, date):
+    """
+    Find the folder holding one device-day partition (hive layout, URI-encoded values)
+    :param path: str (dataset folder)
+    :param device: str (Device Name)
+    :param date: datetime.date or str (YYYY-MM-DD)
+    :return: str (folder location)
+    """
+    return os.path.join(path, "Device Name=" + quote(device, safe=''), "Date=" + str(date))
+
+
+def delete_results(name: str, results_dir=RESULTS_DIR):
+    """
+    Delete a whole result dataset (before it is written again partition by partition)
+    :param name: str (frequency name or dataset name)
+    :param results_dir: str
+    :return: None
+    """
+    for path in [dataset_path(name, results_dir), delta_path(name, results_dir)]:
+        if os.path.exists(path):
+            shutil.rmtree(path)
+    return
+
+
+def result_columns(name: str, results_dir=RESULTS_DIR):
+    """
+    List the columns of a stored dataset without reading it, in the order load_results returns them
+    :param name: str (frequency name or dataset name)
+    :param results_dir: str
+    :return: list of column names
+    """
+    _require_pyarrow()
+    names = ds.dataset(dataset_path(name, results_dir), format="parquet").schema.names
+    return ['Device Name'] + [column for column in names if column not in ['Device Name', 'Date']]
+
+
+def drop_partitions(name: str, device: str, start_date=None, end_date=None, results_dir=RESULTS_DIR):
+    """
+    Delete the partitions of one device between two days
+    :param name: str (frequency name or dataset name)
+    :param device: str (Device Name)
+    :param start_date: datetime.date or str (YYYY-MM-DD, inclusive; None for no lower bound)
+    :param end_date: datetime.date or str (YYYY-MM-DD, inclusive; None for no upper bound)
+    :param results_dir: str
+    :return dropped: set of (device, date) partitions that were deleted
+    """
+    # Delta rows are folded in first, so none of them outlives the partitions it belongs to
+    compact_results(name, results_dir)
+    folder = os.path.dirname(partition_dir(dataset_path(name, results_dir), device, ""))
+    dropped = set()
+    if not os.path.isdir(folder):
+        return dropped
+    for entry in os.listdir(folder):
+        date = entry[len("Date="):]
+        if not entry.startswith("Date=") or (start_date is not None and date < str(start_date)) \
+                or (end_date is not None and date > str(end_date)):
+            continue
+        shutil.rmtree(os.path.join(folder, entry))
+        dropped.add((device, date))
+    return dropped
+
+
+def write_results(df, name: str, results_dir=RESULTS_DIR, partitions=None, device_column='Device Name'):
+    """
+    Write an averaged result table as a Parquet dataset partitioned by device and (Pacific) date.
+    PT DateTime keeps its time zone (naive times are taken as Pacific) and every column keeps its dtype.
+    A full rewrite drops the delta files of the dataset; they are folded in before a partial one.
+    :param df: DataFrame (with a device column and PT DateTime)
+    :param name: str (frequency name or dataset name)
+    :param results_dir: str
+    :param partitions: set of (device, date) pairs to rewrite; None rewrites the whole dataset
+    :param device_column: str (column holding the partition device, e.g. 'Device Name_x' for ratio tables)
+    :return: str (dataset folder)
+    """
+    _require_pyarrow()
+    path = dataset_path(name, results_dir)
+    if partitions is None:
+        for folder in [path, delta_path(name, results_dir)]:
+            if os.path.exists(folder):
+                shutil.rmtree(folder)
+    else:
+        compact_results(name, results_dir)
+    _write_partitions(_localize(df), path, partitions, device_column)
+    return path
+
+
+def _localize(df):
+    """
+    Take naive PT DateTime values as Pacific time (the repeated hour of the DST change is resolved per device from
+    the row order, see timestamps.localize_wall_time)
+    :param df: DataFrame
+    :return df: DataFrame (PT DateTime tz-aware)
+    """
+    if df['PT DateTime'].dt.tz is None:
+        keys = df['Device Name'].to_numpy() if 'Device Name' in df.columns else None
+        df = df.assign(**{'PT DateTime': localize_wall_time(df['PT DateTime'], TIMEZONE, keys)})
+    return df
+
+
+def _write_partitions(df, path: str, partitions, device_column: str):
+    """
+    Write the device-day partitions of a table, replacing what they held
+    :param df: DataFrame (PT DateTime tz-aware)
+    :param path: str (dataset folder)
+    :param partitions: set of (device, date) pairs to rewrite; None writes every partition of df
+    :param device_column: str
+    :return: None
+    """
+    dates = df['PT DateTime'].dt.tz_convert(TIMEZONE).dt.date.astype(str)
+    if partitions is not None:
+        partitions = {(device, str(date)) for device, date in partitions}
+        for device, date in partitions:
+            folder = partition_dir(path, device, date)
+            if os.path.exists(folder):
+                shutil.rmtree(folder)
+    for (device, date), df_part in df.groupby([df[device_column], dates], sort=False):
+        if partitions is not None and (device, date) not in partitions:
+            continue
+        folder = partition_dir(path, device, date)
+        os.makedirs(folder, exist_ok=True)
+        table = pa.Table.from_pandas(df_part.drop(columns=[device_column]), preserve_index=False)
+        pq.write_table(table, os.path.join(folder, "part-0.parquet"))
+    return
+
+
+def append_delta(df, name: str, results_dir=RESULTS_DIR):
+    """
+    Append rows of any number of devices and days to a result dataset as one delta file, without touching its
+    partitions. A delta row replaces the stored row of the same bucket (DELTA_KEYS) when the dataset is loaded.
+    :param df: DataFrame (with Device Name and PT DateTime)
+    :param name: str (frequency name or dataset name)
+    :param results_dir: str
+    :return: str (file location)
+    """
+    _require_pyarrow()
+    files = delta_files(name, results_dir)
+    sequence = int(os.path.basename(files[-1])[len("flush-"):-len(".parquet")]) + 1 if files else 0
+    path = delta_path(name, results_dir)
+    os.makedirs(path, exist_ok=True)
+    fileloc = os.path.join(path, "flush-%08d.parquet" % sequence)
+    # Written under a temporary name first, so a reader never opens a partial file
+    pq.write_table(pa.Table.from_pandas(_localize(df), preserve_index=False), fileloc + ".tmp")
+    os.replace(fileloc + ".tmp", fileloc)
+    return fileloc
+
+
+def compact_results(name: str, results_dir=RESULTS_DIR):
+    """
+    Fold the delta files of a result dataset into its partitions: every device-day they touch is read once,
+    merged with the delta rows (the newest row of every bucket wins) and rewritten, then the delta files are removed
+    :param name: str (frequency name or dataset name)
+    :param results_dir: str
+    :return compacted: set of (device, date) partitions that were rewritten
+    """
+    files = delta_files(name, results_dir)
+    if not files:
+        return set()
+    _require_pyarrow()
+    df = _read_deltas(files)
+    dates = df['PT DateTime'].dt.tz_convert(TIMEZONE).dt.date.astype(str)
+    compacted = set(zip(df['Device Name'], dates))
+    path = dataset_path(name, results_dir)
+    if os.path.exists(path):
+        df_old = _read_dataset(path, sorted(set(df['Device Name'])), dates.min() + " 00:00",
+                               dates.max() + " 23:59:59.999999")
+        df = pd.concat([df_old, df], ignore_index=True)
+    _write_partitions(_latest(df), path, compacted, 'Device Name')
+    for fileloc in files:
+        os.remove(fileloc)
+    return compacted
+
+
+def _bounds(start, end):
+    """
+    :param start: start of the time window (Pacific time when naive), inclusive; None for no bound
+    :param end: end of the time window, inclusive; None for no bound
+    :return: list of (tz-aware Timestamp, bool is_start)
+    """
+    bounds = []
+    for bound, is_start in [(start, True), (end, False)]:
+        if bound is None:
+            continue
+        timestamp = pd.Timestamp(bound)
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.tz_localize(TIMEZONE)
+        bounds.append((timestamp, is_start))
+    return bounds
+
+
+def _read_dataset(path: str, devices=None, start=None, end=None, columns=None):
+    """
+    Read the partitions of a dataset, only the partitions and row groups that match the filters
+    :param path: str (dataset folder)
+    :param devices: list of Device Names (None reads every device)
+    :param start: start of the time window, inclusive
+    :param end: end of the time window, inclusive
+    :param columns: collection of columns to read (None reads every column)
+    :return df: DataFrame (Device Name first, without the Date key, in storage order)
+    """
+    partitioning = ds.partitioning(pa.schema([('Device Name', pa.string()), ('Date', pa.string())]),
+                                   flavor="hive")
+    dataset = ds.dataset(path, format="parquet", partitioning=partitioning)
+    filters = None
+    if devices is not None:
+        filters = ds.field('Device Name').isin(devices)
+    for timestamp, is_start in _bounds(start, end):
+        # Whole partitions outside the window are skipped through the Date key before any file is opened
+        date_filter = ds.field('Date') >= str(timestamp.date()) if is_start \
+            else ds.field('Date') <= str(timestamp.date())
+        time_filter = ds.field('PT DateTime') >= timestamp if is_start else ds.field('PT DateTime') <= timestamp
+        for expression in [date_filter, time_filter]:
+            filters = expression if filters is None else filters & expression
+    if columns is not None:
+        columns = [column for column in dataset.schema.names if column in columns or column == 'PT DateTime'
+                   or column == 'Device Name']
+    df = dataset.to_table(columns=columns, filter=filters).to_pandas()
+    df['Device Name'] = df['Device Name'].astype(str)
+    return df[['Device Name'] + [column for column in df.columns if column not in ['Device Name', 'Date']]]
+
+
+def _read_deltas(files: list, devices=None, start=None, end=None, columns=None):
+    """
+    Read delta files one by one (devices of different layouts leave different columns), oldest first
+    :param files: list of file locations (see delta_files)
+    :param devices: list of Device Names (None reads every device)
+    :param start: start of the time window, inclusive
+    :param end: end of the time window, inclusive
+    :param columns: collection of columns to read (None reads every column)
+    :return df: DataFrame (rows in file order)
+    """
+    filters = None
+    if devices is not None:
+        filters = ds.field('Device Name').isin(devices)
+    for timestamp, is_start in _bounds(start, end):
+        expression = ds.field('PT DateTime') >= timestamp if is_start else ds.field('PT DateTime') <= timestamp
+        filters = expression if filters is None else filters & expression
+    frames = []
+    for fileloc in files:
+        names = pq.read_schema(fileloc).names
+        frames.append(pq.read_table(fileloc, filters=filters, columns=None if columns is None else [
+            column for column in names if column in columns or column in ['Device Name', 'PT DateTime']]).to_pandas())
+    df = pd.concat(frames, ignore_index=True)
+    df['Device Name'] = df['Device Name'].astype(str)
+    return df
+
+
+def _latest(df):
+    """
+    Keep the last row of every bucket (rows of older files come first)
+    :param df: DataFrame
+    :return df: DataFrame
+    """
+    return df.drop_duplicates([key for key in DELTA_KEYS if key in df.columns], keep='last')
+
+
+def load_results(name: str, devices=None, start=None, end=None, columns=None, results_dir=RESULTS_DIR,
+                 device_column='Device Name'):
+    """
+    Load averaged results, reading only the partitions and row groups that match the filters. Rows of delta files
+    (see append_delta) replace the stored rows of their bucket.
+    :param name: str (frequency name or dataset name)
+    :param devices: str or list of Device Names (None reads every device)
+    :param start: start of the time window (e.g. "9/10/2020 0:00", Pacific time), inclusive
+    :param end: end of the time window (e.g. "9/19/2020 0:00", Pacific time), inclusive
+    :param columns: list of columns to read (None reads every column)
+    :param results_dir: str
+    :param device_column: str (name given back to the partition device column)
+    :return df: DataFrame (PT DateTime as tz-aware datetime)
+    """
+    _require_pyarrow()
+    if isinstance(devices, str):
+        devices = [devices]
+    path = dataset_path(name, results_dir)
+    files = delta_files(name, results_dir)
+    # The bucket keys are read as well when delta rows have to be matched to stored ones
+    read = columns if columns is None or not files else list(columns) + DELTA_KEYS
+    frames = []
+    if os.path.exists(path) or not files:
+        frames.append(_read_dataset(path, devices, start, end, read))
+    if files:
+        frames.append(_read_deltas(files, devices, start, end, read))
+    df = frames[0] if not files else _latest(pd.concat(frames, ignore_index=True))
+    if read is not columns:
+        df = df[[column for column in df.columns if column in columns or column in ['Device Name', 'PT DateTime']]]
+    if not df.empty:
+        df = df.sort_values(['Device Name', 'PT DateTime']).reset_index(drop=True)
+    return df.rename(columns={'Device Name': device_column})
@@ -0,0 +1,10 @@
+"""
+Shared setup of the unit tests: the modules of the Analysis folder are imported the way Analysis.py imports them,
+and the synthetic log writer of the benchmarks is importable.
+Run from the Analysis folder: python -m pytest -q tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
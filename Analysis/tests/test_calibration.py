@@ -0,0 +1,23 @@
+"""
+Tests of the nested least-squares fits of the calibration models (calibration._nested_fits)
+"""
+import numpy as np
+from calibration import _nested_fits
+
+
+def test_nested_fits_match_separate_lstsq():
+    rng = np.random.default_rng(0)
+    x = rng.uniform(0, 3, 500)
+    A = np.column_stack([np.ones_like(x), x, x ** 2, x ** 3])
+    Y = 1 + 2 * x - 0.5 * x ** 2 + rng.normal(scale=0.1, size=500)
+    sizes = [2, 3, 4]
+    for size, solution in zip(sizes, _nested_fits(A, Y, sizes)):
+        np.testing.assert_allclose(solution, np.linalg.lstsq(A[:, :size], Y, rcond=None)[0], rtol=1e-8, atol=1e-10)
+
+
+def test_exact_polynomial_is_recovered():
+    x = np.linspace(0.1, 2, 50)
+    A = np.column_stack([x, x ** 2])
+    solutions = _nested_fits(A, 3 * x - x ** 2, [1, 2])
+    assert solutions[0].shape == (1,)
+    np.testing.assert_allclose(solutions[1], [3, -1], atol=1e-10)
@@ -0,0 +1,50 @@
+"""
+Tests of Largest-Triangle-Three-Buckets (downsample.lttb_indices)
+"""
+import numpy as np
+from downsample import lttb_indices
+
+
+def reference_lttb(x, y, n_out):
+    """
+    Straightforward LTTB, one bucket at a time
+    """
+    n = len(x)
+    edges = np.floor(np.linspace(1, n - 1, n_out - 1)).astype(int)
+    selected = [0]
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i < n_out - 3:
+            cx, cy = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:
+            cx, cy = x[-1], y[-1]
+        a = selected[-1]
+        areas = [abs((x[a] - cx) * (y[k] - y[a]) - (x[a] - x[k]) * (cy - y[a])) for k in range(lo, hi)]
+        selected.append(lo + int(np.argmax(areas)))
+    return np.array(selected + [n - 1])
+
+
+def test_matches_reference():
+    rng = np.random.default_rng(0)
+    x = np.cumsum(rng.uniform(0.5, 1.5, 5000))
+    y = np.cumsum(rng.normal(size=5000))
+    for n_out in (3, 4, 10, 257, 1000):
+        np.testing.assert_array_equal(lttb_indices(x, y, n_out), reference_lttb(x, y, n_out))
+
+
+def test_keeps_ends_and_peak():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.zeros(1000)
+    y[437] = 100
+    selected = lttb_indices(x, y, 20)
+    assert len(selected) == 20
+    assert selected[0] == 0 and selected[-1] == 999
+    assert 437 in selected
+    assert (np.diff(selected) > 0).all()
+
+
+def test_short_input_is_kept_whole():
+    x = np.arange(10, dtype=np.float64)
+    np.testing.assert_array_equal(lttb_indices(x, x, 10), np.arange(10))
+    np.testing.assert_array_equal(lttb_indices(x, x, 50), np.arange(10))
+    np.testing.assert_array_equal(lttb_indices(x, x, 2), np.arange(10))
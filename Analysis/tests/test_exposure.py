@@ -0,0 +1,28 @@
+"""
+Tests of the dose integration of the personal sensor (exposure.trapezoid_dose)
+"""
+import numpy as np
+import pandas as pd
+from exposure import trapezoid_dose
+
+MINUTE = pd.Timedelta(minutes=1).value
+
+
+def test_trapezoids():
+    counted, hours, dose = trapezoid_dose(np.array([0, 30, 90]) * MINUTE, [10.0, 20.0, 20.0], max_gap="1h")
+    assert counted.all()
+    np.testing.assert_allclose(hours, [0.5, 1.0])
+    np.testing.assert_allclose(dose, [7.5, 20.0])
+
+
+def test_gaps_and_missing_readings_are_not_counted():
+    nanoseconds = np.array([0, 1, 2, 100, 101]) * MINUTE
+    counted, hours, dose = trapezoid_dose(nanoseconds, [6.0, np.nan, 6.0, 6.0, 12.0], max_gap="10min")
+    np.testing.assert_array_equal(counted, [False, False, False, True])
+    np.testing.assert_allclose(dose, [0, 0, 0, 9 / 60])
+    np.testing.assert_allclose(hours.sum(), 101 / 60)
+
+
+def test_single_sample():
+    counted, hours, dose = trapezoid_dose(np.array([0]), [5.0])
+    assert len(counted) == len(hours) == len(dose) == 0
@@ -0,0 +1,39 @@
+"""
+Tests of the place lookup of the moving sensor (geofence.PlaceIndex)
+"""
+import numpy as np
+from geofence import NO_FIX, OTHER, PlaceIndex, box_place
+
+
+def names(index, latitudes, longitudes):
+    return [index.names[code] for code in index.locate(latitudes, longitudes)]
+
+
+def test_box_and_circle():
+    index = PlaceIndex([box_place("Home", 47.60, -122.34, 47.61, -122.33),
+                        {'name': "Office", 'latitude': 47.65, 'longitude': -122.30, 'radius': 100.0}])
+    assert names(index, [47.605, 47.6505, 47.652, 47.70], [-122.335, -122.3005, -122.30, -122.30]) \
+        == ["Home", "Office", OTHER, OTHER]
+
+
+def test_polygon():
+    triangle = {'name': "Park", 'polygon': np.array([[-122.30, 47.60], [-122.28, 47.60], [-122.30, 47.62]])}
+    index = PlaceIndex([triangle], cell_size=0.001)
+    assert names(index, [47.605, 47.619], [-122.295, -122.281]) == ["Park", OTHER]
+
+
+def test_earlier_place_wins_where_places_overlap():
+    big = box_place("Campus", 47.60, -122.40, 47.70, -122.30)
+    small = box_place("Lab", 47.64, -122.36, 47.66, -122.34)
+    assert names(PlaceIndex([big, small]), [47.65], [-122.35]) == ["Campus"]
+    assert names(PlaceIndex([small, big]), [47.65, 47.61], [-122.35, -122.31]) == ["Lab", "Campus"]
+
+
+def test_missing_and_zero_positions_have_no_fix():
+    index = PlaceIndex([box_place("Home", 0, 0, 1, 1)])
+    assert names(index, [np.nan, 0.0, 0.5, 0.5], [0.5, 0.0, np.nan, 0.5]) == [NO_FIX, NO_FIX, NO_FIX, "Home"]
+
+
+def test_no_places():
+    index = PlaceIndex([])
+    assert names(index, [47.6, np.nan], [-122.3, -122.3]) == [OTHER, NO_FIX]
@@ -0,0 +1,75 @@
+"""
+Tests of the incremental ingest and the Parquet result store (incremental.py, storage.py): a log read in several
+runs gives the results of one run over the whole log
+"""
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+from incremental import load_watermarks, run_incremental, store_frame
+from ingest import read_device_log
+from preprocessing import get_device_location, reformat
+from rollup import TOTALS_DATASET
+from storage import load_results
+from synthetic import START, outdoor_profile, write_device_log
+
+pytest.importorskip("pyarrow")
+
+FREQS = ["10S", "10Min", "hour"]
+
+
+def write_log(fileloc, days=1.0, seed=0):
+    outdoor = outdoor_profile(START, days, np.random.default_rng(seed))
+    write_device_log(fileloc, "Beta-01", outdoor, "Out", days=days, seed=seed)
+    with open(fileloc, "rb") as f:
+        return f.read().splitlines(keepends=True)
+
+
+def results(results_dir, names=FREQS):
+    return {name: load_results(name, results_dir=str(results_dir)).sort_values(['Device Name', 'PT DateTime'])
+            .reset_index(drop=True) for name in names}
+
+
+def assert_same_results(got, expected):
+    for name in expected:
+        pd.testing.assert_frame_equal(got[name], expected[name], check_dtype=False, rtol=1e-6)
+
+
+def test_resumed_runs_match_one_run(tmp_path):
+    fileloc = str(tmp_path / "Beta-01.txt")
+    lines = write_log(fileloc)
+    run_incremental([fileloc], FREQS, str(tmp_path / "once"))
+    # The first run stops in the middle of a 10-minute bucket; the second one merges the rest into it
+    shutil.copy(fileloc, str(tmp_path / "whole.txt"))
+    with open(fileloc, "wb") as f:
+        f.writelines(lines[:len(lines) // 2 + 3])
+    run_incremental([fileloc], FREQS, str(tmp_path / "resumed"))
+    with open(fileloc, "wb") as f:
+        f.writelines(lines)
+    run_incremental([fileloc], FREQS, str(tmp_path / "resumed"))
+    assert load_watermarks(str(tmp_path / "resumed"))["Beta-01.txt"]["offset"] == len(b"".join(lines))
+    assert_same_results(results(tmp_path / "resumed"), results(tmp_path / "once"))
+
+
+def test_truncated_log_is_read_again(tmp_path):
+    fileloc = str(tmp_path / "Beta-01.txt")
+    write_log(fileloc, days=2.0)
+    run_incremental([fileloc], FREQS, str(tmp_path / "replaced"))
+    write_log(fileloc, days=0.5, seed=1)
+    run_incremental([fileloc], FREQS, str(tmp_path / "replaced"))
+    run_incremental([fileloc], FREQS, str(tmp_path / "fresh"))
+    assert_same_results(results(tmp_path / "replaced"), results(tmp_path / "fresh"))
+
+
+def test_partial_buckets_are_merged(tmp_path):
+    fileloc = str(tmp_path / "Beta-01.txt")
+    write_log(fileloc)
+    device_name, df = read_device_log(fileloc)
+    device_name, df = get_device_location(df, device_name)
+    df = reformat(df, device_name)
+    split = len(df) // 3 + 1
+    store_frame(device_name, df, FREQS, str(tmp_path / "whole"), merge=False)
+    store_frame(device_name, df.iloc[:split], FREQS, str(tmp_path / "parts"), merge=False)
+    store_frame(device_name, df.iloc[split:], FREQS, str(tmp_path / "parts"))
+    assert_same_results(results(tmp_path / "parts", FREQS + [TOTALS_DATASET]),
+                        results(tmp_path / "whole", FREQS + [TOTALS_DATASET]))
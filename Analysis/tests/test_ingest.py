@@ -0,0 +1,73 @@
+"""
+Tests of the raw log readers (ingest.py): both CSV backends return the same rows and values
+"""
+import logging
+import numpy as np
+import pandas as pd
+import pytest
+from ingest import (BETA_COLUMNS, iter_device_log, parse_log_batch, parse_log_bytes, read_device_log,
+                    read_device_log_tail, record_lines)
+
+pytest.importorskip("pyarrow")
+
+HEADER = ", ".join(BETA_COLUMNS)
+RECORD = ("2020/9/10 , 10:00:%02d ,4.20,0,0.00,0.00,310,93,28,3,1,0,1.72,2.29,2.64,1.68,2.25,2.58,16.46,70.63,"
+          "1012.96,2.38")
+
+
+def log_text(seconds=range(6)):
+    return "\n".join(RECORD % second for second in seconds) + "\n"
+
+
+def test_record_lines_drops_restart_and_malformed_lines():
+    data = (log_text([0]) + "Beta-01\n" + HEADER + "\n" + log_text([1]) + (RECORD % 2)[:30] + "\n"
+            + (RECORD % 3) + ",1\n" + "\n" + log_text([4])).encode()
+    records, malformed = record_lines(data, len(BETA_COLUMNS))
+    assert records == log_text([0, 1, 4]).encode()
+    assert malformed == 2
+
+
+def test_record_lines_keeps_clean_data_and_last_line_without_newline():
+    data = log_text().encode()
+    assert record_lines(data, len(BETA_COLUMNS)) == (data, 0)
+    assert record_lines(data[:-1], len(BETA_COLUMNS)) == (data[:-1], 0)
+
+
+@pytest.mark.parametrize("bad_line", ["2020/9/10 , 10:00:50 ,4.20,0", (RECORD % 50) + ",9,9",
+                                      (RECORD % 50).replace("4.20", "4.2x")])
+def test_engines_agree_on_bad_lines(bad_line, caplog):
+    data = (log_text(range(3)) + bad_line + "\n" + log_text(range(3, 6))).encode()
+    with caplog.at_level(logging.WARNING, logger="ingest"):
+        arrow = parse_log_bytes(data, BETA_COLUMNS, "pyarrow")
+        pandas = parse_log_bytes(data, BETA_COLUMNS, "c")
+    pd.testing.assert_frame_equal(arrow, pandas)
+    assert arrow['Battery'].dtype == np.float32 and arrow['Fix'].dtype == pd.Int8Dtype()
+    if "4.2x" in bad_line:
+        assert len(arrow) == 7 and np.isnan(arrow['Battery'].iloc[3])
+    else:
+        assert len(arrow) == 6
+        assert caplog.text.count("skipped 1 malformed lines") == 2
+
+
+def test_file_readers_agree(tmp_path):
+    fileloc = tmp_path / "Beta-01.txt"
+    fileloc.write_text("Beta-01\n" + HEADER + "\n" + log_text(range(20)) + "Beta-01\n" + HEADER + "\n"
+                       + log_text(range(20, 40)))
+    device_name, whole = read_device_log(str(fileloc), "pyarrow")
+    assert device_name == "Beta-01" and len(whole) == 40
+    pd.testing.assert_frame_equal(whole, read_device_log(str(fileloc), "c")[1])
+    chunks = pd.concat([chunk for _, chunk in iter_device_log(str(fileloc), chunk_bytes=500)], ignore_index=True)
+    pd.testing.assert_frame_equal(chunks, whole)
+    _, tail, offset = read_device_log_tail(str(fileloc))
+    pd.testing.assert_frame_equal(tail, whole)
+    assert offset == fileloc.stat().st_size
+
+
+def test_batch_of_logs(caplog):
+    chunks = {"Beta-01": log_text(range(3)).encode(), "Beta-03": b"",
+              "Beta-11": (HEADER + "\n" + (RECORD % 9)[:30] + "\n" + log_text(range(3, 8))).encode()[:-1]}
+    with caplog.at_level(logging.WARNING, logger="ingest"):
+        df, rows = parse_log_batch(chunks, BETA_COLUMNS)
+    assert list(rows) == [3, 0, 5]
+    assert "Beta-11: skipped 1 malformed lines" in caplog.text
+    pd.testing.assert_frame_equal(df, parse_log_bytes(log_text(range(8)).encode(), BETA_COLUMNS))
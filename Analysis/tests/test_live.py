@@ -0,0 +1,90 @@
+"""
+Tests of the live-ingest server (live.py): flushes of many devices give the results of the whole logs
+"""
+import asyncio
+import numpy as np
+import pandas as pd
+import pytest
+from bench_live import device_lines
+from incremental import store_frame
+from ingest import get_layout, parse_log_bytes
+from live import IngestServer
+from preprocessing import get_device_location, get_devices_location, reformat
+from storage import load_results
+from synthetic import START, outdoor_profile
+
+DEVICES = ['Beta-01', 'Breakout-02', 'Beta-99']
+
+
+@pytest.fixture(scope="module")
+def lines():
+    rng = np.random.default_rng(0)
+    outdoor = outdoor_profile(START, 1.0, rng)
+    lines = {device_name: device_lines(device_name, 1500, 10, outdoor, rng) for device_name in DEVICES}
+    # A frozen stretch across several flushes
+    for device_name in lines:
+        frozen = lines[device_name][400].split(b',')[2:]
+        for k in range(400, 700):
+            lines[device_name][k] = b','.join(lines[device_name][k].split(b',')[:2] + frozen)
+    return lines
+
+
+def whole_log(device_name, lines):
+    df = parse_log_bytes(b''.join(lines), get_layout(device_name))
+    device_name, df = get_device_location(df, device_name)
+    return reformat(df, device_name)
+
+
+def test_devices_are_located_at_once(lines):
+    # The Beta layout (Breakout-02 logs fewer columns)
+    batch = {device_name: parse_log_bytes(b''.join(device_lines[:50]), get_layout(device_name))
+             for device_name, device_lines in lines.items() if device_name != 'Breakout-02'}
+    expected = pd.concat([get_device_location(df.copy(), device_name)[1] for device_name, df in batch.items()],
+                         ignore_index=True)
+    names = np.repeat(list(batch), [len(df) for df in batch.values()])
+    got = get_devices_location(pd.concat(batch.values(), ignore_index=True), names)
+    pd.testing.assert_frame_equal(got, expected)
+
+
+def test_flushes_match_whole_logs(lines, tmp_path):
+    pytest.importorskip("pyarrow")
+    server = IngestServer(freqs=["10Min"], results_dir=str(tmp_path / "live"))
+    stored = 0
+    for start in range(0, 1500, 137):
+        # Devices come in any order, and not every device in every flush
+        order = DEVICES if start % 2 else DEVICES[::-1]
+        late = start % 5 == 0
+        stored += server.store({device_name: lines[device_name][start:start + 137] for device_name in order
+                                if not (late and device_name == 'Beta-99')})
+        if late:
+            stored += server.store({'Beta-99': lines['Beta-99'][start:start + 137]})
+    stored += server.store({}, final=True)
+    server.totals.compact()
+    expected = 0
+    for device_name in DEVICES:
+        df = whole_log(device_name, lines[device_name])
+        expected += len(df)
+        store_frame(device_name, df, ["10Min"], str(tmp_path / "whole"))
+    assert stored == expected
+    got, want = (load_results("10Min", results_dir=str(tmp_path / name)).sort_values(['Device Name', 'PT DateTime'])
+                 .reset_index(drop=True) for name in ("live", "whole"))
+    pd.testing.assert_frame_equal(got[want.columns], want, check_dtype=False)
+
+
+def test_tcp_connection(lines):
+    async def send():
+        server = IngestServer()
+        tcp = await asyncio.start_server(server.handle_tcp, "127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection(*tcp.sockets[0].getsockname()[:2])
+        writer.write(b"Beta-01,\nDate,Time,Battery\n" + b"".join(lines['Beta-01'][:20]))
+        await writer.drain()
+        writer.close()
+        await writer.wait_closed()
+        await reader.read()
+        tcp.close()
+        await tcp.wait_closed()
+        return server
+
+    server = asyncio.run(send())
+    assert server.received == server.waiting == 20
+    assert server.buffers['Beta-01'] == lines['Beta-01'][:20]
@@ -0,0 +1,77 @@
+"""
+Tests of the online statistics engine (online.py)
+"""
+import numpy as np
+import pandas as pd
+from online import Ewma, OnlineAggregator, RollingMean
+from qc import QC_COLUMN
+
+TZ = "America/Los_Angeles"
+
+
+def late_order(n, rng):
+    """
+    Record order with every record at most a few places late
+    """
+    return np.argsort(np.arange(n) + rng.uniform(0, 5, size=n), kind='stable')
+
+
+def test_rolling_mean_slots_late_values():
+    rng = np.random.default_rng(0)
+    times = np.arange(500) * 10.0
+    values = rng.normal(10, 2, size=500)
+    in_order, late = RollingMean(600.0), RollingMean(600.0)
+    for t, x in zip(times, values):
+        in_order.add(t, x)
+    for i in late_order(500, rng):
+        late.add(times[i], values[i])
+    late.expire(times[-1])
+    assert len(late.values) == len(in_order.values) == 60
+    assert np.isclose(late.value(), values[-60:].mean()) and np.isclose(in_order.value(), values[-60:].mean())
+
+
+def test_ewma_matches_pandas_in_any_order():
+    rng = np.random.default_rng(1)
+    times = np.cumsum(rng.uniform(5, 30, size=300))
+    values = rng.normal(10, 2, size=300)
+    expected = pd.Series(values).ewm(halflife=pd.Timedelta(seconds=600),
+                                     times=pd.to_datetime(times, unit='s')).mean().iloc[-1]
+    ewma = Ewma(600.0)
+    for i in late_order(300, rng):
+        ewma.add(times[i], values[i])
+    assert np.isclose(ewma.value(), expected)
+
+
+def device_rows(device_name, n=360, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'Device Name': device_name,
+                       'PT DateTime': pd.date_range("2020-09-10 12:00", periods=n, freq="10s", tz=TZ),
+                       'PM2.5_Env': rng.normal(10, 2, size=n), QC_COLUMN: np.zeros(n, dtype=np.uint8)})
+    df.loc[rng.choice(n, size=20, replace=False), QC_COLUMN] = 1
+    df.loc[100, 'PM2.5_Env'] = 900.0
+    df.loc[100, QC_COLUMN] = 1
+    return df
+
+
+def test_flagged_rows_are_skipped():
+    df = pd.concat([device_rows('Beta-01'), device_rows('Beta-03', seed=1)], ignore_index=True)
+    aggregator = OnlineAggregator()
+    assert aggregator.add_frame(df.sample(frac=1, random_state=0)) == (df[QC_COLUMN] == 0).sum()
+    snapshot = aggregator.snapshot().set_index('Device Name')
+    for device_name, rows in df.groupby('Device Name'):
+        good = rows[rows[QC_COLUMN] == 0]
+        recent = good[good['PT DateTime'] > rows['PT DateTime'].iloc[-1] - pd.Timedelta("10min")]
+        assert snapshot.loc[device_name, 'Count'] == len(good)
+        assert np.isclose(snapshot.loc[device_name, 'Mean 10Min'], recent['PM2.5_Env'].mean())
+        assert snapshot.loc[device_name, 'Last'] == good['PM2.5_Env'].iloc[-1]
+        assert snapshot.loc[device_name, 'P95'] < 900
+
+
+def test_raw_records_get_the_single_record_checks():
+    aggregator = OnlineAggregator()
+    record = {'Date': '20/9/10', 'Time': '17:00:10', 'Battery': 4.0, 'PM2.5_Std': 10.0, 'PM2.5_Env': 10.0}
+    assert aggregator.add('Beta-01', record)
+    assert not aggregator.add('Beta-01', dict(record, Battery=3.0))
+    assert not aggregator.add('Beta-01', dict(record, **{'PM2.5_Std': 1500.0}))
+    assert not aggregator.add('Beta-01', dict(record, **{QC_COLUMN: 2}))
+    assert aggregator.devices['Beta-01'].count == 1
@@ -0,0 +1,46 @@
+"""
+Tests of the per-device pipeline (pipeline.run_pipeline): full runs average every row of a log
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from ingest import read_device_log
+from pipeline import run_pipeline
+from preprocessing import get_device_location, reformat
+from rollup import rollup
+from synthetic import START, outdoor_profile, write_device_log
+
+FREQS = ["10S", "1Min", "10Min", "hour"]
+
+
+@pytest.fixture
+def device_log(tmp_path):
+    """
+    One day of Beta-01 whose log ends in a frozen run shorter than the stuck limit of qc.json
+    """
+    fileloc = str(tmp_path / "Beta-01.txt")
+    write_device_log(fileloc, "Beta-01", outdoor_profile(START, 1.0, np.random.default_rng(0)), "In", days=1.0)
+    with open(fileloc) as f:
+        lines = f.readlines()
+    frozen = lines[-60].split(",")[2:]
+    lines[-60:] = [",".join(line.split(",")[:2] + frozen) for line in lines[-60:]]
+    with open(fileloc, "w") as f:
+        f.writelines(lines)
+    return fileloc
+
+
+def whole_log_rollup(fileloc):
+    device_name, df = read_device_log(fileloc)
+    device_name, df = get_device_location(df, device_name)
+    return rollup(reformat(df, device_name), FREQS)
+
+
+@pytest.mark.parametrize("chunk_bytes", [None, 2 ** 16])
+@pytest.mark.parametrize("watermarks", [None, {}])
+def test_full_run_matches_whole_log_rollup(device_log, chunk_bytes, watermarks):
+    expected = whole_log_rollup(device_log)
+    finals = run_pipeline([device_log], FREQS, workers=1, chunk_bytes=chunk_bytes, watermarks=watermarks)
+    for freq in FREQS:
+        pd.testing.assert_frame_equal(finals[freq][0].reset_index(drop=True), expected[freq].reset_index(drop=True))
+    if watermarks is not None:
+        assert not watermarks["Beta-01.txt"]["qc"]["held"]["PT DateTime"]
@@ -0,0 +1,52 @@
+"""
+Tests of the time x device matrix engine (pivot.py) against the pandas reductions it replaces
+"""
+import numpy as np
+import pandas as pd
+from pivot import device_average, nanquantile_rows, pivot_devices
+
+TZ = "America/Los_Angeles"
+
+
+def result_table(seed=0):
+    """
+    Three devices on a 10-minute grid with gaps, the last one at two locations per timestamp
+    """
+    rng = np.random.default_rng(seed)
+    times = pd.date_range("2020-09-10", periods=50, freq="10min", tz=TZ)
+    frames = []
+    for device, keep in (('A', 1.0), ('B', 0.7), ('C', 0.5)):
+        rows = times[rng.random(len(times)) < keep]
+        if device == 'C':
+            rows = rows.repeat(2)
+        frames.append(pd.DataFrame({'Device Name': device, 'PT DateTime': rows,
+                                    'PM2.5_Env': rng.gamma(2.0, 5.0, size=len(rows))}))
+    return pd.concat(frames, ignore_index=True).sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def test_nanquantile_rows_match_pandas():
+    matrix = np.random.default_rng(1).normal(size=(40, 7))
+    matrix[np.random.default_rng(2).random(matrix.shape) < 0.3] = np.nan
+    matrix[5] = np.nan
+    expected = pd.DataFrame(matrix).quantile([0.05, 0.5, 0.95], axis=1).to_numpy()
+    np.testing.assert_allclose(nanquantile_rows(matrix, [0.05, 0.5, 0.95]), expected)
+
+
+def test_pivot_averages_repeated_timestamps():
+    df = result_table()
+    grid, matrix = pivot_devices(df, ['A', 'B', 'C'], 'PM2.5_Env')
+    expected = df.pivot_table(index='PT DateTime', columns='Device Name', values='PM2.5_Env', aggfunc='mean')
+    pd.testing.assert_index_equal(grid, expected.index, check_names=False)
+    np.testing.assert_allclose(matrix, expected[['A', 'B', 'C']].to_numpy())
+
+
+def test_device_average_matches_pandas():
+    df = result_table()
+    got = device_average(df, ['A', 'B', 'C'], 'PM2.5_Env', "9/10/2020 1:00", "9/10/2020 5:00", labels=['a', 'b', 'c'])
+    wide = df.pivot_table(index='PT DateTime', columns='Device Name', values='PM2.5_Env', aggfunc='mean')
+    wide = wide.loc[pd.Timestamp("2020-09-10 01:00", tz=TZ):pd.Timestamp("2020-09-10 05:00", tz=TZ),
+                    ['A', 'B', 'C']]
+    np.testing.assert_allclose(got[['a', 'b', 'c']].to_numpy(), wide.to_numpy())
+    np.testing.assert_allclose(got['Average'], wide.mean(axis=1))
+    np.testing.assert_allclose(got['Q1'], wide.quantile(0.05, axis=1))
+    np.testing.assert_allclose(got['Q3'], wide.quantile(0.95, axis=1))
@@ -0,0 +1,114 @@
+"""
+Tests of the per-row quality control flags (qc.qc_flags and qc.QCStream)
+"""
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from qc import BATTERY, HAMPEL, QC_COLUMN, SATURATED, STUCK, ZERO, QCStream, load_thresholds, qc_flags
+
+PM = ['PM1_Std', 'PM2.5_Std', 'PM10_Std', 'PM1_Env', 'PM2.5_Env', 'PM10_Env']
+COUNTS = ['Dp>0.3', 'Dp>0.5', 'Dp>1.0', 'Dp>2.5', 'Dp>5.0', 'Dp>10.0']
+
+
+@pytest.fixture
+def thresholds():
+    return load_thresholds()
+
+
+def device_log(n=720, period="10s", seed=0):
+    """
+    Reformatted log of one device with noisy readings
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'PT DateTime': pd.date_range("2020-09-10", periods=n, freq=period, tz="America/Los_Angeles")})
+    for column in PM:
+        df[column] = np.round(10 + rng.normal(scale=1.0, size=n), 1)
+    for column in COUNTS:
+        df[column] = rng.integers(100, 2000, size=n).astype(np.float64)
+    df['Battery'] = 4.0
+    return df
+
+
+def test_clean_log(thresholds):
+    assert not qc_flags(device_log(), thresholds).any()
+
+
+def test_clean_air_zeros_are_kept(thresholds):
+    df = device_log()
+    df.loc[100:600, PM] = 0
+    assert not (qc_flags(df, thresholds) & (ZERO | STUCK)).any()
+
+
+def test_dead_sensor_zeros(thresholds):
+    df = device_log()
+    df.loc[100:600, PM + COUNTS] = 0
+    flags = qc_flags(df, thresholds)
+    assert (flags[100:601] & ZERO).all()
+    assert not (flags[:100] & ZERO).any() and not (flags[601:] & ZERO).any()
+
+
+def test_short_zero_run_is_kept(thresholds):
+    df = device_log()
+    df.loc[100:300, PM + COUNTS] = 0
+    assert not (qc_flags(df, thresholds) & ZERO).any()
+
+
+def test_frozen_sensor(thresholds):
+    df = device_log()
+    df.loc[100:400, PM + COUNTS] = df.loc[100, PM + COUNTS].to_numpy()
+    flags = qc_flags(df, thresholds)
+    assert (flags[100:401] & STUCK).all()
+    assert not (flags & ZERO).any()
+
+
+def test_spike_battery_and_saturation(thresholds):
+    df = device_log()
+    df.loc[200, 'PM2.5_Std'] = 300
+    df.loc[300, 'Battery'] = 3.0
+    df.loc[400, 'PM2.5_Std'] = 1500
+    flags = qc_flags(df, thresholds)
+    assert flags[200] & HAMPEL and flags[300] == BATTERY and flags[400] & SATURATED
+    assert np.count_nonzero(flags) == 3
+
+
+def test_stream_matches_whole_log(thresholds):
+    df = device_log(n=2000)
+    df.loc[100:600, PM + COUNTS] = 0
+    df.loc[900:1300, PM + COUNTS] = df.loc[900, PM + COUNTS].to_numpy()
+    df.loc[1500, 'PM2.5_Std'] = 300
+    stream = QCStream(thresholds)
+    parts = []
+    for batch in np.array_split(np.arange(len(df)), 37):
+        stream = QCStream(thresholds, state=json.loads(json.dumps(stream.state())))
+        parts.append(stream.add(df.iloc[batch].reset_index(drop=True)))
+    parts.append(stream.finish())
+    flagged = pd.concat(parts, ignore_index=True)
+    pd.testing.assert_series_equal(flagged['PT DateTime'], df['PT DateTime'])
+    np.testing.assert_array_equal(flagged[QC_COLUMN].to_numpy(), qc_flags(df, thresholds))
+
+
+def test_stream_of_many_devices(thresholds):
+    logs = {}
+    for seed, name in enumerate(['Alpha-01', 'Beta-02', 'Gamma-03']):
+        df = device_log(n=1000, seed=seed)
+        df.loc[100 + 200 * seed:600, PM + COUNTS] = 0
+        df.loc[700 + 50 * seed, 'PM2.5_Std'] = 300
+        df.insert(0, 'Device Name', name)
+        logs[name] = df
+    whole = pd.concat(logs.values(), ignore_index=True)
+    expected = np.concatenate([qc_flags(df, thresholds) for df in logs.values()])
+    np.testing.assert_array_equal(qc_flags(whole, thresholds), expected)
+    # Flushes carry the devices in any order, and a device may come in a flush of its own
+    names = list(logs)
+    stream = QCStream(thresholds)
+    parts = []
+    for flush, batch in enumerate(np.array_split(np.arange(1000), 23)):
+        order = names[flush % 3:] + names[:flush % 3]
+        parts.append(stream.add(pd.concat([logs[name].iloc[batch] for name in order[1:]], ignore_index=True)))
+        parts.append(stream.add(logs[order[0]].iloc[batch].reset_index(drop=True)))
+        stream = QCStream(thresholds, state=json.loads(json.dumps(stream.state())))
+    parts.append(stream.finish())
+    flagged = pd.concat(parts, ignore_index=True).sort_values(['Device Name', 'PT DateTime'], kind='stable')
+    pd.testing.assert_series_equal(flagged['PT DateTime'].reset_index(drop=True), whole['PT DateTime'])
+    np.testing.assert_array_equal(flagged[QC_COLUMN].to_numpy(), expected)
@@ -0,0 +1,40 @@
+"""
+Tests of the indexed result-table query and its caches (query.py)
+"""
+import numpy as np
+import pandas as pd
+from pivot import device_average
+from query import TableQuery, invalidate_table, table_query
+
+TZ = "America/Los_Angeles"
+
+
+def result_table():
+    times = pd.date_range("2020-09-10", periods=4, freq="10min", tz=TZ)
+    return pd.DataFrame({'Device Name': ['B'] * 4 + ['A'] * 4, 'PT DateTime': list(times[::-1]) + list(times),
+                         'PM2.5_Env': [4.0, 3.0, 2.0, 1.0, 10.0, 20.0, 30.0, 40.0]})
+
+
+def test_slices_and_windows():
+    query = TableQuery(result_table())
+    assert query.devices == ['A', 'B']
+    np.testing.assert_array_equal(query.series('B', 'PM2.5_Env'), [1, 2, 3, 4])
+    window = query.series('A', 'PM2.5_Env', "9/10/2020 0:10", "9/10/2020 0:20")
+    np.testing.assert_array_equal(window, [20, 30])
+    assert query.frame('C').empty
+
+
+def test_query_is_built_once_per_table():
+    df = result_table()
+    assert table_query(df) is table_query(df)
+    assert table_query(table_query(df)) is table_query(df)
+
+
+def test_cached_results_are_snapshots_until_invalidated():
+    df = result_table()
+    before = device_average(df, ['A', 'B'], 'PM2.5_Env')
+    df.loc[4, 'PM2.5_Env'] = 1000.0
+    pd.testing.assert_frame_equal(device_average(df, ['A', 'B'], 'PM2.5_Env'), before)
+    invalidate_table(df)
+    after = device_average(df, ['A', 'B'], 'PM2.5_Env')
+    assert after.loc[0, 'A'] == 1000.0 and after.loc[0, 'Average'] == 500.5
@@ -0,0 +1,60 @@
+"""
+Tests of the batch ratio engine (ratios.ratio_table)
+"""
+import numpy as np
+import pandas as pd
+from ratios import RATIO_COLUMN, ratio_table
+
+TIMES = pd.date_range("2020-09-10 10:00", periods=6, freq="10min", tz="America/Los_Angeles")
+
+
+def result_table(values: dict):
+    """
+    :param values: dict of device name -> list of PM2.5_Env readings (None leaves the row out)
+    :return: DataFrame (result table)
+    """
+    rows = [{'Device Name': device, 'PT DateTime': time, 'PM2.5_Env': value}
+            for device, readings in values.items() for time, value in zip(TIMES, readings) if value is not None]
+    return pd.DataFrame(rows)
+
+
+def test_ratio_of_aligned_pair():
+    df = result_table({'In': [1, 2, 3, 4, 5, 6], 'Out': [2, 4, 6, 8, 10, 12]})
+    table = ratio_table(df, [('In', 'Out')], 'PM2.5_Env')
+    assert list(table['PT DateTime']) == list(TIMES)
+    np.testing.assert_allclose(table[RATIO_COLUMN], 0.5)
+    assert (table['Device Name_x'] == 'In').all() and (table['Device Name_y'] == 'Out').all()
+
+
+def test_missing_nan_and_zero_denominators_are_dropped():
+    df = result_table({'In': [1, np.nan, 3, 4, 5, None], 'Out': [2, 4, 0, None, 10, 12]})
+    table = ratio_table(df, [('In', 'Out')], 'PM2.5_Env')
+    assert list(table['PT DateTime']) == [TIMES[0], TIMES[4]]
+    np.testing.assert_allclose(table[RATIO_COLUMN], [0.5, 0.5])
+
+
+def test_pairs_come_out_pair_by_pair():
+    df = result_table({'A': [1] * 6, 'B': [2] * 6, 'C': [4, None, 4, 4, 4, 4]})
+    table = ratio_table(df, [('A', 'C'), ('B', 'C')], 'PM2.5_Env')
+    assert list(zip(table['Device Name_x'], table['Device Name_y'])) == [('A', 'C')] * 5 + [('B', 'C')] * 5
+    np.testing.assert_allclose(table[RATIO_COLUMN], [0.25] * 5 + [0.5] * 5)
+
+
+def test_qc_drops_one_sided_spike():
+    times = pd.date_range("2020-09-10", periods=61, freq="10min", tz="America/Los_Angeles")
+    outdoor = 10 + np.sin(np.arange(61) / 5)
+    indoor = outdoor / 2
+    indoor[30] = 40
+    df = pd.DataFrame({'Device Name': ['In'] * 61 + ['Out'] * 61, 'PT DateTime': list(times) * 2,
+                       'PM2.5_Env': np.r_[indoor, outdoor]})
+    plain = ratio_table(df, [('In', 'Out')], 'PM2.5_Env')
+    checked = ratio_table(df, [('In', 'Out')], 'PM2.5_Env', qc=True)
+    assert times[30] in set(plain['PT DateTime'])
+    assert list(checked['PT DateTime']) == [time for time in times if time != times[30]]
+
+
+def test_no_pairs():
+    table = ratio_table(result_table({'In': [1] * 6}), [], 'PM2.5_Env', 'PM2.5_Std')
+    assert table.empty
+    assert list(table.columns) == ['Device Name_x', 'Device Name_y', 'PT DateTime', 'PM2.5_Env_x', 'PM2.5_Std_y',
+                                   RATIO_COLUMN]
@@ -0,0 +1,42 @@
+"""
+Tests of the device registry (registry.py)
+"""
+import math
+import pandas as pd
+from registry import UNKNOWN, device_by_file, device_info, device_user, processed_devices, registry_frame, user_pairs
+
+
+def users_sheet():
+    return pd.DataFrame({'User': ['Ann', 'Ann', 'Bob'], 'In': ['Beta-19', 'Beta-07', 'Beta-12'],
+                         'Out': ['Beta-01', 'Beta-17', None], 'Location Number': [None, None, 'L2']})
+
+
+def test_device_info():
+    device = device_info('Beta-08')
+    assert device['File'] == 'Beta-08(MEB)' and device['In or Out'] == 'Out'
+    assert math.isclose(device['Latitude'], 47.653598)
+    unknown = device_info('Beta-99')
+    assert unknown['In or Out'] == UNKNOWN and math.isnan(unknown['Latitude']) and not unknown['Skip']
+
+
+def test_device_by_file():
+    assert device_by_file('data/Puget-Bellevue.csv')['Device Name'] == 'Bellevue SE 12th'
+    assert device_by_file('data/Beta-13(MEB IN).txt')['Device Name'] == 'Beta-13'
+    assert device_by_file('data/Beta-03.txt')['Device Name'] == 'Beta-03'
+
+
+def test_processed_devices_skip_and_order():
+    files = processed_devices(users_sheet())
+    assert files[:5] == ['Beta-19', 'Beta-07', 'Beta-12', 'Beta-01', 'Beta-17']
+    assert 'Beta-08(MEB)' in files and 'Beta-04' not in files
+    assert len(files) == len(set(files))
+
+
+def test_users():
+    df_users = users_sheet()
+    assert device_user(df_users, 'In', 'Beta-07') == 'Ann'
+    assert device_user(df_users, 'In', 'Beta-12') == 'L2'
+    assert device_user(df_users, 'Out', 'Breakout-02') == 'Moving Personal'
+    assert device_user(df_users, 'Out', 'Beta-99') == UNKNOWN
+    assert user_pairs(df_users, 'In', 'Out')[0] == ('Beta-19', 'Beta-01')
+    assert registry_frame(df_users).loc['Beta-17', 'User'] == 'Ann'
@@ -0,0 +1,51 @@
+"""
+Tests of the shared regular time grid (resample.RegularGrid)
+"""
+import numpy as np
+import pandas as pd
+from resample import RegularGrid
+
+TZ = "America/Los_Angeles"
+
+
+def result_table():
+    """
+    A: every bucket but 10:20 and 10:30; B: 10:10 twice (averaged), an off-grid row at 10:15, and 10:40
+    """
+    times = pd.date_range("2020-09-10 10:00", periods=6, freq="10min", tz=TZ)
+    a = [(times[k], float(k)) for k in (0, 1, 4, 5)]
+    b = [(times[1], 2.0), (times[1], 4.0), (times[1] + pd.Timedelta("5min"), 100.0), (times[4], 8.0)]
+    rows = [('A', time, value) for time, value in a] + [('B', time, value) for time, value in b]
+    return pd.DataFrame(rows, columns=['Device Name', 'PT DateTime', 'PM2.5_Env'])
+
+
+def test_masks_and_values():
+    grid = RegularGrid(result_table(), "10Min")
+    assert len(grid.index) == 6 and grid.index[0] == pd.Timestamp("2020-09-10 10:00", tz=TZ)
+    np.testing.assert_array_equal(grid.observed('A'), [1, 1, 0, 0, 1, 1])
+    np.testing.assert_array_equal(grid.observed('B'), [0, 1, 0, 0, 1, 0])
+    np.testing.assert_array_equal(grid.observed('C'), np.zeros(6, dtype=bool))
+    np.testing.assert_array_equal(grid.values('A', 'PM2.5_Env'), [0, 1, np.nan, np.nan, 4, 5])
+    np.testing.assert_array_equal(grid.values('B', 'PM2.5_Env'), [np.nan, 3, np.nan, np.nan, 8, np.nan])
+
+
+def test_window():
+    grid = RegularGrid(result_table(), "10Min")
+    start, end = pd.Timestamp("2020-09-10 10:10", tz=TZ), pd.Timestamp("2020-09-10 10:40", tz=TZ)
+    np.testing.assert_array_equal(grid.observed('A', start, end), [1, 0, 0, 1])
+    assert list(grid.series('A', 'PM2.5_Env', start, end).index) == list(grid.index[1:5])
+
+
+def test_gaps_and_coverage():
+    grid = RegularGrid(result_table(), "10Min")
+    gaps = grid.gaps('A')
+    assert len(gaps) == 1
+    assert gaps['Buckets'].iloc[0] == 2 and gaps['Duration'].iloc[0] == pd.Timedelta("20min")
+    assert len(grid.gaps('A', min_buckets=3)) == 0
+    coverage = grid.coverage()
+    assert coverage.loc['A', 'Observed'] == 4 and coverage.loc['B', 'Observed'] == 2
+    assert coverage.loc['B', 'Missing'] == 2 and coverage.loc['A', 'Coverage'] == 4 / 6
+
+
+def test_inferred_frequency():
+    assert RegularGrid(result_table()).freq == pd.Timedelta("10min")
@@ -0,0 +1,49 @@
+"""
+Tests of the multi-resolution rollup (rollup.py) against get_averages
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from ingest import read_device_log
+from preprocessing import get_averages, get_device_location, reformat
+from qc import QC_COLUMN
+from rollup import RollupAccumulator, rollup
+from synthetic import START, outdoor_profile, write_device_log
+
+FREQS = ["10S", "1Min", "10Min", "hour"]
+
+
+@pytest.fixture(scope="module")
+def reformatted(tmp_path_factory):
+    """
+    Two days of one Breakout (UTC clock) and one Beta (Pacific clock), with a few flagged rows
+    """
+    outdoor = outdoor_profile(START, 2.0, np.random.default_rng(0))
+    frames = []
+    for seed, device_name in enumerate(["Breakout-08", "Beta-06"]):
+        fileloc = str(tmp_path_factory.mktemp("logs") / (device_name + ".txt"))
+        write_device_log(fileloc, device_name, outdoor, "In", days=2.0, seed=seed)
+        device_name, df = read_device_log(fileloc)
+        device_name, df = get_device_location(df, device_name)
+        df = reformat(df, device_name)
+        df.loc[df.index[::97], QC_COLUMN] = 1
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+
+@pytest.mark.parametrize("freq", FREQS)
+def test_rollup_matches_get_averages(reformatted, freq):
+    expected = get_averages(reformatted.copy(), freq)
+    got = rollup(reformatted, FREQS)[freq]
+    assert list(got.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(got, expected, check_dtype=False, rtol=1e-5)
+
+
+def test_chunked_rollup_matches_rollup(reformatted):
+    expected = rollup(reformatted, FREQS)
+    accumulator = RollupAccumulator(FREQS)
+    for chunk in np.array_split(np.arange(len(reformatted)), 17):
+        accumulator.add(reformatted.iloc[chunk])
+    finals = accumulator.finish()
+    for freq in FREQS:
+        pd.testing.assert_frame_equal(finals[freq].reset_index(drop=True), expected[freq])
@@ -0,0 +1,60 @@
+"""
+Tests of the timestamp normalization of the raw logs (timestamps.py)
+"""
+import pandas as pd
+from timestamps import garbage_rows, localize_wall_time, normalize_timestamps
+
+
+def wall_times(*values):
+    return pd.Series(pd.to_datetime(list(values)))
+
+
+def utc_offsets(series):
+    return [timestamp.utcoffset() / pd.Timedelta(hours=1) for timestamp in series]
+
+
+def test_repeated_hour_follows_the_row_order():
+    naive = wall_times("2020-11-01 00:59:50", "2020-11-01 01:00:00", "2020-11-01 01:59:50", "2020-11-01 01:00:00",
+                       "2020-11-01 01:59:50", "2020-11-01 02:00:00")
+    local = localize_wall_time(naive)
+    assert local.notna().all()
+    assert utc_offsets(local) == [-7, -7, -7, -8, -8, -8]
+    assert local.is_monotonic_increasing
+
+
+def test_repeated_hourly_value():
+    local = localize_wall_time(wall_times("2020-11-01 00:00", "2020-11-01 01:00", "2020-11-01 01:00",
+                                          "2020-11-01 02:00"))
+    assert utc_offsets(local) == [-7, -7, -8, -8]
+
+
+def test_every_device_is_its_own_sequence():
+    naive = wall_times("2020-11-01 01:10", "2020-11-01 01:50", "2020-11-01 01:05", "2020-11-01 01:40")
+    local = localize_wall_time(naive, keys=["Beta-01", "Beta-01", "Beta-03", "Beta-03"])
+    assert utc_offsets(local) == [-7, -7, -7, -7]
+
+
+def test_skipped_hour_is_shifted_forward():
+    local = localize_wall_time(wall_times("2020-03-08 01:59:50", "2020-03-08 02:30:00"))
+    assert list(local) == [pd.Timestamp("2020-03-08 01:59:50-0800"), pd.Timestamp("2020-03-08 03:00:00-0700")]
+
+
+def test_pacific_rows_of_the_fall_back_hour_are_kept():
+    dates = pd.Series(["2020/11/1"] * 3)
+    local = normalize_timestamps(dates, pd.Series(["01:30:00", "01:10:00", "01:20:00"]))
+    assert utc_offsets(local) == [-7, -8, -8]
+
+
+def test_utc_rows_are_converted():
+    local = normalize_timestamps(pd.Series(["20/9/10", "20/11/1"]), pd.Series(["17:00:10", "09:30:00"]))
+    assert list(local) == [pd.Timestamp("2020-09-10 10:00:10-0700"), pd.Timestamp("2020-11-01 01:30:00-0800")]
+
+
+def test_reset_clock_is_moved_to_2020():
+    local = normalize_timestamps(pd.Series(["05/9/10", "2005/9/10"]), pd.Series(["17:00:10", "17:00:10"]))
+    assert list(local) == [pd.Timestamp("2020-09-10 10:00:10-0700")] * 2
+
+
+def test_garbage_dates():
+    dates = pd.Series(["0/0/0", "20/9/10", "80/1/1", "2020/9/10"])
+    assert list(garbage_rows(dates)) == [True, False, True, False]
@@ -0,0 +1,135 @@
+"""
+This .py file contains the vectorized timestamp normalization for the raw sensor logs.
+"""
+import numpy as np
+import pandas as pd
+
+TIMEZONE = "America/Los_Angeles"
+FREQUENCIES = {"10S": pd.Timedelta(seconds=10), "1Min": pd.Timedelta(minutes=1),
+               "10Min": pd.Timedelta(minutes=10), "hour": pd.Timedelta(hours=1)}
+
+
+def to_timedelta(freq):
+    """
+    Convert a frequency name used by get_averages ("10S", "1Min", "10Min", "hour") to a Timedelta
+    :param freq: str or Timedelta
+    :return: Timedelta
+    """
+    if isinstance(freq, pd.Timedelta):
+        return freq
+    if freq in FREQUENCIES:
+        return FREQUENCIES[freq]
+    return pd.Timedelta(freq)
+
+
+def garbage_rows(dates):
+    """
+    Find rows logged before the clock was set ('0/0/0') or with corrupted dates (containing '80')
+    :param dates: Series of str (Date column)
+    :return mask: boolean Series (True for rows to drop)
+    """
+    return (dates == '0/0/0') | dates.str.contains('80', regex=False).fillna(True)
+
+
+def parse_logger_datetime(dates, times):
+    """
+    Parse the Date and Time columns of a sensor log. Dates are written either with a four-digit year
+    (2020/9/10) or a two-digit year (20/9/10); each form is parsed with its own explicit format.
+    :param dates: Series of str (Date column)
+    :param times: Series of str (Time column)
+    :return: Series of naive datetime64 (NaT where parsing failed)
+    """
+    text = dates + ' ' + times
+    four_digit = dates.str.match(r'\d{4}/').fillna(False)
+    parsed = pd.Series(pd.NaT, index=dates.index, dtype='datetime64[ns]')
+    parsed[four_digit] = pd.to_datetime(text[four_digit], format='%Y/%m/%d %H:%M:%S', errors='coerce')
+    parsed[~four_digit] = pd.to_datetime(text[~four_digit], format='%y/%m/%d %H:%M:%S', errors='coerce')
+    retry = parsed.isna() & text.notna()
+    if retry.any():
+        parsed[retry] = [pd.to_datetime(value, yearfirst=True, errors='coerce') for value in text[retry]]
+    return parsed
+
+
+def localize_wall_time(naive, tz=TIMEZONE, keys=None):
+    """
+    Localize naive wall-clock times logged in row order. The hour repeated when DST ends is resolved from the row
+    order instead of being dropped: its rows are daylight time until the clock steps back (to an earlier or the
+    same wall time), and standard time after. Wall times skipped when DST starts are shifted forward.
+    :param naive: Series of naive datetime64
+    :param tz: str (time zone of the wall clock)
+    :param keys: array (e.g. Device Name; rows of another key start a new sequence; None: one sequence)
+    :return: Series of datetime64[ns, tz]
+    """
+    local = naive.dt.tz_localize(tz, ambiguous='NaT', nonexistent='shift_forward')
+    ambiguous = (local.isna() & naive.notna()).to_numpy()
+    if not ambiguous.any():
+        return local
+    positions = np.flatnonzero(ambiguous)
+    values = naive.to_numpy()[positions].astype(np.int64)
+    new_sequence = np.r_[True, np.diff(positions) != 1]
+    if keys is not None:
+        keys = np.asarray(keys)[positions]
+        new_sequence[1:] |= keys[1:] != keys[:-1]
+    stepped_back = np.r_[False, np.diff(values) <= 0] & ~new_sequence
+    # Steps back so far, counted from the start of every sequence of ambiguous rows
+    steps = np.cumsum(stepped_back)
+    steps -= np.maximum.accumulate(np.where(new_sequence, steps, 0))
+    local[ambiguous] = naive[ambiguous].dt.tz_localize(tz, ambiguous=steps == 0, nonexistent='shift_forward')
+    return local
+
+
+def normalize_timestamps(dates, times, tz=TIMEZONE, keys=None):
+    """
+    Build the tz-aware PT DateTime column. Rows dated '2020/...' were logged in Pacific time; every other row
+    was logged in UTC (GPS time) and is converted with the tz database, so DST is handled; the hour repeated when
+    DST ends is resolved from the row order (see localize_wall_time). Rows from a reset real-time clock (year 2005)
+    are moved to 2020.
+    :param dates: Series of str (Date column, garbage rows already removed)
+    :param times: Series of str (Time column)
+    :param tz: str (target time zone)
+    :param keys: array (Device Name when dates holds the rows of several devices, see localize_wall_time)
+    :return: Series of datetime64[ns, tz]
+    """
+    parsed = parse_logger_datetime(dates, times)
+    reset = parsed.dt.year == 2005
+    if reset.any():
+        parsed[reset] = parsed[reset] + pd.DateOffset(years=15)
+    utc = ~dates.str.contains('2020/', regex=False).fillna(False)
+    result = pd.Series(pd.NaT, index=dates.index, dtype='datetime64[ns, ' + tz + ']')
+    result[utc] = parsed[utc].dt.tz_localize('UTC').dt.tz_convert(tz)
+    pacific = (~utc).to_numpy()
+    result[~utc] = localize_wall_time(parsed[~utc], tz, None if keys is None else np.asarray(keys)[pacific])
+    return result
+
+
+def floor_timestamps(series, freq):
+    """
+    Floor tz-aware timestamps to a bucket frequency. Flooring happens in UTC so buckets stay unambiguous
+    across DST changes (Pacific offsets are whole hours, so hour buckets match local hours).
+    :param series: Series of datetime64[ns, tz]
+    :param freq: frequency name or Timedelta
+    :return: Series of datetime64[ns, tz]
+    """
+    tz = series.dt.tz
+    return series.dt.tz_convert('UTC').dt.floor(to_timedelta(freq)).dt.tz_convert(tz)
+
+
+def am_pm(series):
+    """
+    Compute the AM/PM label of timestamps (only needed for plots)
+    :param series: Series of datetime64
+    :return: Series of str
+    """
+    return pd.Series(np.where(series.dt.hour < 12, 'AM', 'PM'), index=series.index)
+
+
+def to_wall_time(series, tz=TIMEZONE):
+    """
+    Drop the time zone of PT DateTime, keeping the Pacific wall-clock time (for CSV files)
+    :param series: Series of datetime64[ns, tz]
+    :param tz: str
+    :return: Series of naive datetime64
+    """
+    if series.dt.tz is None:
+        return series
+    return series.dt.tz_convert(tz).dt.tz_localize(None)